@@ -0,0 +1,88 @@
+import io
+
+import av
+import numpy as np
+
+# Whisper works on 16 kHz mono float32 samples in the range [-1, 1]
+SAMPLE_RATE = 16000
+
+
+class InvalidAudioError(ValueError):
+    """
+    Raised when an upload cannot be decoded as audio (corrupt, truncated or
+    not an audio file at all): a client error, not a server one.
+    """
+
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decodes an uploaded audio file (any container/codec libav understands)
+    straight from memory into a mono float32 buffer at the given sample rate.
+    Raises InvalidAudioError when libav cannot make sense of it.
+    """
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+    chunks = []
+
+    try:
+        with av.open(io.BytesIO(data), mode="r") as container:
+            if not container.streams.audio:
+                raise InvalidAudioError("Uploaded file does not contain an audio stream.")
+            stream = container.streams.audio[0]
+            for frame in container.decode(stream):
+                for resampled in resampler.resample(frame):
+                    chunks.append(resampled.to_ndarray().reshape(-1))
+            # Flush whatever the resampler is still buffering
+            for resampled in resampler.resample(None):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise InvalidAudioError(f"Could not decode the uploaded audio: {e}") from e
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+
+class StreamDecoder:
+    """
+    Turns audio frames received over a stream into 16 kHz float32 samples.
+    Supports raw little-endian 16-bit PCM ("pcm16") at any sample rate and
+    raw Opus packets ("opus"), one packet per frame.
+    """
+
+    def __init__(self, input_format: str = "pcm16", sample_rate: int = SAMPLE_RATE):
+        if input_format not in ("pcm16", "opus"):
+            raise ValueError(f"Unsupported stream format: {input_format}")
+        self.input_format = input_format
+        self.sample_rate = sample_rate
+        self._resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        self._codec = av.CodecContext.create("opus", "r") if input_format == "opus" else None
+        self._pts = 0
+        # Odd trailing byte of the last pcm16 frame; its sample ends in the next one
+        self._leftover = b""
+
+    def decode(self, chunk: bytes) -> np.ndarray:
+        """
+        Decodes one received frame. May return an empty buffer while the
+        resampler is still filling up. pcm16 frames need not end on a sample
+        boundary: a split sample is completed by the next frame.
+        """
+        if self.input_format == "opus":
+            frames = self._codec.decode(av.Packet(chunk))
+        else:
+            data = self._leftover + chunk
+            usable = len(data) - len(data) % 2
+            self._leftover = data[usable:]
+            pcm = np.frombuffer(data[:usable], dtype="<i2")
+            if self.sample_rate == SAMPLE_RATE:
+                return pcm.astype(np.float32) / 32768.0
+            frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+            frame.sample_rate = self.sample_rate
+            # The resampler needs continuous timestamps to keep its state between chunks
+            frame.pts = self._pts
+            self._pts += pcm.size
+            frames = [frame]
+
+        chunks = [out.to_ndarray().reshape(-1) for frame in frames for out in self._resampler.resample(frame)]
+        if not chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(chunks).astype(np.float32, copy=False)
@@ -0,0 +1,118 @@
+"""
+Measures what the async pooled Gemini client buys over the old blocking
+call pattern, against the local mock Gemini server (no network needed):
+
+    python -m Server.benchmarks.gemini_client_benchmark --requests 50 --latency-ms 300
+
+"blocking" reproduces the previous behaviour: a synchronous POST with a new
+connection per call, made from the event loop, so calls run one after
+another. "async" sends the same calls through GeminiClient concurrently.
+Latency is measured from when all calls arrive together, as a user sees it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(port: int) -> uvicorn.Server:
+    from . import mock_gemini
+
+    server = uvicorn.Server(uvicorn.Config(mock_gemini.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def summarize(name: str, latencies: List[float], wall_seconds: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "client": name,
+        "requests": len(ordered),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ordered) / wall_seconds, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+    }
+
+
+PAYLOAD = {
+    "contents": [{"parts": [{"text": "What can you do?"}]}],
+    "generationConfig": {"temperature": 0.7, "topP": 0.8, "topK": 40, "maxOutputTokens": 256},
+}
+
+
+async def run_blocking(base_url: str, count: int) -> Dict:
+    url = f"{base_url}/models/gemini-1.5-pro:generateContent"
+
+    start = time.perf_counter()
+
+    async def handler() -> float:
+        # What the /chat handler used to do: a blocking call on the event loop
+        httpx.post(url, json=PAYLOAD).raise_for_status()
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*[handler() for _ in range(count)])
+    return summarize("blocking", list(latencies), time.perf_counter() - start)
+
+
+async def run_async(base_url: str, count: int, concurrency: int) -> Dict:
+    from ..gemini_client import GeminiClient
+
+    client = GeminiClient("mock-key", base_url=base_url, max_concurrency=concurrency)
+
+    start = time.perf_counter()
+
+    async def handler() -> float:
+        await client.generate_content(PAYLOAD)
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*[handler() for _ in range(count)])
+    wall = time.perf_counter() - start
+    await client.aclose()
+    return summarize(f"async (concurrency {concurrency})", list(latencies), wall)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Gemini client against a mock server.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["MOCK_GEMINI_LATENCY_MS"] = str(args.latency_ms)
+    port = free_port()
+    server = start_mock_server(port)
+    base_url = f"http://127.0.0.1:{port}/v1beta"
+
+    results = [
+        asyncio.run(run_blocking(base_url, args.requests)),
+        asyncio.run(run_async(base_url, args.requests, args.concurrency)),
+    ]
+    server.should_exit = True
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Measures how many chat messages still fall back to the LLM with the intent
+rules alone and with the rules plus the local classifier:
+
+    python -m Server.benchmarks.intent_classifier_benchmark
+    python -m Server.benchmarks.intent_classifier_benchmark --thresholds 0.4 0.5 0.6 0.7 0.8
+
+Messages are driver phrasings that are not in the training corpus, each
+with the intent it should get (None: it belongs with the LLM). It reports
+the fallback rate, how many messages were routed to the wrong intent
+(including LLM-bound chatter answered locally), training time and
+per-message latency.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..intent_classifier import INTENT_CLASSIFIER_THRESHOLD, IntentClassifier, load_corpus
+from ..intent_router import IntentRouter, asked_for_preference
+from .intent_router_benchmark import DELIVERY_QUESTION, RIDE_QUESTION
+
+ORDER_LIST = [{"sender": "bot", "text": (
+    "Okay, prioritizing best overall score. Here are the top options:\n"
+    "- Order 4: RM12 reward, takes about 20 mins with light traffic.\n"
+    "- Order 9: RM10 reward, takes about 15 mins with moderate traffic.\n"
+    "- Order 2: RM9 reward, takes about 25 mins with heavy traffic.\n"
+    "\nWhich one would you like details on, or say 'accept order number'?"
+)}]
+RIDE_LIST = [{"sender": "bot", "text": (
+    "Okay, prioritizing rides with highest fare. Here are the top options:\n"
+    "- Ride 103: From KLCC to KLIA. Fare ~RM65, Time ~50 mins, Rating 4.8 stars.\n"
+    "- Ride 101: From Bangsar to Mid Valley. Fare ~RM12, Time ~10 mins, Rating 4.5 stars.\n"
+    "\nWhich ride would you like details on, or say 'accept ride number'?"
+)}]
+ORDER_DETAILS = [{"sender": "bot", "text": "Order ID 9: Pickup at Jalan Ipoh, deliver to Sentul.\n\nRecommended."}]
+
+# (message, driver_type, chat_history, expected (intent, id) or None for the LLM)
+Case = Tuple[str, str, List[Dict[str, str]], Optional[Tuple[str, Optional[str]]]]
+CASES: List[Case] = [
+    # Paraphrased requests for suggestions
+    ("got any jobs near me", 'delivery', [], ("suggest_orders", None)),
+    ("anything i could deliver right now", 'delivery', [], ("suggest_orders", None)),
+    ("what's out there for me today", 'delivery', [], ("suggest_orders", None)),
+    ("find me something that pays well", 'delivery', [], ("suggest_orders", None)),
+    ("any parcels waiting", 'delivery', [], ("suggest_orders", None)),
+    ("i'm free, what can i do", 'delivery', [], ("suggest_orders", None)),
+    ("got any jobs near me", 'ride', [], ("suggest_rides", None)),
+    ("anyone around who needs a lift", 'ride', [], ("suggest_rides", None)),
+    ("find me a passenger please", 'ride', [], ("suggest_rides", None)),
+    ("any fares close by", 'ride', [], ("suggest_rides", None)),
+    ("who's waiting for a ride", 'ride', [], ("suggest_rides", None)),
+    ("i'm ready for my next trip", 'ride', [], ("suggest_rides", None)),
+    # Picking from the list the bot just read out
+    ("take the second one", 'delivery', ORDER_LIST, ("accept_order", "9")),
+    ("i'll go with the first one", 'delivery', ORDER_LIST, ("accept_order", "4")),
+    ("grab the last one for me", 'delivery', ORDER_LIST, ("accept_order", "2")),
+    ("tell me more about the third one", 'delivery', ORDER_LIST, ("order_details", "2")),
+    ("what about the first one", 'delivery', ORDER_LIST, ("order_details", "4")),
+    ("ok i'll take it", 'delivery', ORDER_DETAILS, ("accept_order", "9")),
+    ("take the second one", 'ride', RIDE_LIST, ("accept_ride", "101")),
+    ("i'll pick up the first passenger", 'ride', RIDE_LIST, ("accept_ride", "103")),
+    ("more details on the second one", 'ride', RIDE_LIST, ("ride_details", "101")),
+    ("i'll take ride 102", 'ride', [], ("accept_ride", "102")),
+    ("nah skip this one", 'ride', RIDE_LIST, ("reject_ride", None)),
+    ("not interested in this ride", 'ride', [], ("reject_ride", None)),
+    # Already handled by the rules
+    ("accept order 7", 'delivery', [], ("accept_order", "7")),
+    ("suggest a ride", 'ride', [], ("suggest_rides", None)),
+    ("the highest fare", 'ride', RIDE_QUESTION, ("ride_preference", None)),
+    ("minimal traffic", 'delivery', DELIVERY_QUESTION, ("order_preference", None)),
+    # LLM territory
+    ("how do i withdraw my earnings", 'delivery', [], None),
+    ("the customer gave me the wrong address", 'delivery', [], None),
+    ("where's a good place to eat around here", 'delivery', [], None),
+    ("why was my account suspended", 'ride', [], None),
+    ("can i bring my kid along", 'ride', [], None),
+    ("how long is my shift", 'ride', [], None),
+    ("good evening", 'ride', [], None),
+    ("what's the speed limit on the highway", 'ride', [], None),
+    ("remind me to fill up petrol", 'delivery', [], None),
+    ("take the second one", 'delivery', [], None),  # No list to pick from
+]
+
+
+def route(router: IntentRouter, classifier: Optional[IntentClassifier], message: str, driver_type: str,
+          history: List[Dict[str, str]]) -> Optional[Tuple[str, Optional[str]]]:
+    result = router.route(message, driver_type, asked_for_preference(driver_type, history))
+    if result is None and classifier is not None:
+        result = classifier.route(message, driver_type, history)
+    return (result.intent, result.slots.get("id")) if result else None
+
+
+def evaluate(router: IntentRouter, classifier: Optional[IntentClassifier]) -> Dict:
+    fallbacks, missed, wrong = 0, 0, []
+    for message, driver_type, history, expected in CASES:
+        actual = route(router, classifier, message, driver_type, history)
+        if actual is None:
+            fallbacks += 1
+            # A missed local intent only costs an LLM call...
+            missed += expected is not None
+        elif actual != expected:
+            # ...a wrong one answers the driver wrongly
+            wrong.append({"message": message, "driver_type": driver_type, "expected": expected, "routed": actual})
+    return {
+        "llm_fallback_rate": round(fallbacks / len(CASES), 3),
+        "local_intents_missed": missed,
+        "local_intents_expected": sum(1 for case in CASES if case[3] is not None),
+        "misrouted": wrong,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LLM fallback rate with and without the local intent classifier.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[INTENT_CLASSIFIER_THRESHOLD])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    router = IntentRouter()
+    corpus = load_corpus()
+    start = time.perf_counter()
+    classifier = IntentClassifier(corpus)
+    train_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for message, driver_type, history, _ in CASES:
+            classifier.route(message, driver_type, history)
+    classify_us = (time.perf_counter() - start) / (args.repeat * len(CASES)) * 1e6
+
+    results = {
+        "cases": len(CASES),
+        "corpus_phrases": sum(len(phrases) for phrases in corpus.values()),
+        "train_ms": round(train_ms, 1),
+        "classifier_us_per_message": round(classify_us, 1),
+        "rules_only": evaluate(router, None),
+        "with_classifier": {},
+    }
+    for threshold in args.thresholds:
+        classifier.threshold = threshold
+        results["with_classifier"][str(threshold)] = evaluate(router, classifier)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Checks that the table-driven IntentRouter routes exactly like the
+sequential regex chain it replaced, over a corpus of realistic driver
+phrases plus random messages built from the rules' vocabulary (exits
+non-zero on any mismatch), then times both:
+
+    python -m Server.benchmarks.intent_router_benchmark --repeat 200
+
+The router is a refactor with identical output, not a speedup: both cost
+a few microseconds per message, and the overall ratio between them moves
+from 0.6x to 1.2x from run to run. The keyword gate makes messages that
+no rule matches (the ones that go to the LLM) consistently cheaper, about
+3x; routed messages are slightly slower. Timings are the median of
+several rounds.
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..intent_router import IntentRouter, asked_for_preference
+
+RIDE_QUESTION = [{"sender": "bot", "text": "What's most important to you for ride requests: highest fare, shortest time or passenger rating?"}]
+DELIVERY_QUESTION = [{"sender": "bot", "text": "What's most important to you for delivery orders: high reward, shortest time or light traffic?"}]
+
+# (message, driver_type, chat_history)
+CORPUS: List[Tuple[str, str, List[Dict[str, str]]]] = [
+    (message, 'ride', []) for message in [
+        "accept ride 101", "Accept ride ID: 104", "accept ride #105 please", "reject ride",
+        "I want to reject ride now", "suggest a ride", "any good rides around?", "best ride for money",
+        "what rides are available", "which request pays most", "check rides", "check the ride requests quickly",
+        "recommend the fastest ride", "details for 103", "ride 102", "info on ride 105",
+        "how do I use this app", "what can you do", "tell me a joke", "navigate me home",
+        "is there traffic on the federal highway", "I'm taking a break for lunch", "hello", "thanks a lot",
+        "what's the weather like in Bangsar", "top rated passenger rides",
+    ]
+] + [
+    (message, 'ride', RIDE_QUESTION) for message in [
+        "the highest fare", "quick one please", "passenger rating matters", "no preference", "ride 104",
+    ]
+] + [
+    (message, 'delivery', []) for message in [
+        "accept order 7", "accept delivery 12", "Accept order ID #3", "best order", "suggest a delivery order",
+        "any orders with good reward?", "what deliveries are there", "which order is fastest",
+        "give me the best order with light traffic", "order 5", "details for 12", "info on delivery 19",
+        "order 999", "what can you do", "how do I contact support", "where is the nearest petrol station",
+        "I'm done for today", "good morning", "can you recommend a route",
+    ]
+] + [
+    (message, 'delivery', DELIVERY_QUESTION) for message in [
+        "more reward", "minimal traffic", "fast please", "whatever", "order 3",
+    ]
+] + [
+    ("accept ride 101", 'unknown', []), ("best order", 'unknown', []),
+]
+
+
+def legacy_route(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    The rule chain ask_chatbot used before the router, reduced to returning
+    the intent and slots instead of the reply.
+    """
+    user_message_lower = user_message.lower()
+
+    if driver_type == 'ride':
+        accept_match = re.search(r'accept ride(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
+        if accept_match:
+            return "accept_ride", {"id": accept_match.group(1)}
+
+        if re.search(r'\breject ride\b', user_message_lower):
+            return "reject_ride", {}
+
+        is_ride_suggestion_request = (
+            re.search(r'\b(suggest|recommend|available|any|offer|best|top|good)\b.*\b(ride|rides|request|requests)', user_message_lower) or
+            (re.search(r'\b(what|which)\b', user_message_lower) and re.search(r'\b(ride|rides|request|requests)', user_message_lower)) or
+            re.search(r'\bcheck\b.*\b(ride|rides|request|requests)\b', user_message_lower)
+        )
+        if is_ride_suggestion_request:
+            preference = None
+            if re.search(r'\b(fare|money|highest pay|most pay|more fare)\b', user_message_lower):
+                preference = "fare"
+            elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
+                preference = "time"
+            elif re.search(r'\b(rating|passenger|high rating)\b', user_message_lower):
+                preference = "rating"
+            return "suggest_rides", {"preference": preference} if preference else {}
+
+        last_bot_message = chat_history[-1]['text'] if chat_history and chat_history[-1]['sender'] == 'bot' else ''
+        if "what's most important" in last_bot_message.lower() and ("ride requests" in last_bot_message.lower() or "highest fare" in last_bot_message.lower()):
+            preference = None
+            if re.search(r'\b(fare|money|highest pay|most pay|more fare)\b', user_message_lower):
+                preference = "fare"
+            elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
+                preference = "time"
+            elif re.search(r'\b(rating|passenger|high rating)\b', user_message_lower):
+                preference = "rating"
+            if preference:
+                return "ride_preference", {"preference": preference}
+
+        details_match = re.search(r'\b(ride|details for|info on)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
+        if details_match and not accept_match:
+            return "ride_details", {"id": details_match.group(2)}
+
+    elif driver_type == 'delivery':
+        accept_match_inner = re.search(r'accept (?:delivery|order)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
+        if accept_match_inner:
+            return "accept_order", {"id": accept_match_inner.group(1)}
+
+        is_suggestion_request = (
+            re.search(r'\b(best|top|good|suggest|recommend|available|any|offer)\b.*\b(order|delivery)', user_message_lower) or
+            (re.search(r'\b(what|which)\b', user_message_lower) and re.search(r'\b(delivery|deliveries|order)', user_message_lower))
+        )
+        if is_suggestion_request:
+            preference = None
+            if re.search(r'\b(reward|money|highest pay|most pay|more reward)\b', user_message_lower):
+                preference = "reward"
+            elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
+                preference = "time"
+            elif re.search(r'\b(traffic|light traffic|easy drive|less traffic|minimal traffic)\b', user_message_lower):
+                preference = "traffic"
+            return "suggest_orders", {"preference": preference} if preference else {}
+
+        last_bot_message = chat_history[-1]['text'] if chat_history and chat_history[-1]['sender'] == 'bot' else ''
+        if "what's most important" in last_bot_message.lower() and ("delivery orders" in last_bot_message.lower() or "high reward" in last_bot_message.lower()):
+            preference = None
+            if re.search(r'\b(reward|money|highest pay|most pay|more reward)\b', user_message_lower):
+                preference = "reward"
+            elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
+                preference = "time"
+            elif re.search(r'\b(traffic|light traffic|easy drive|less traffic|minimal traffic)\b', user_message_lower):
+                preference = "traffic"
+            if preference:
+                return "order_preference", {"preference": preference}
+
+        details_match = re.search(r'\b(delivery|order|details for|info on)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
+        if details_match:
+            return "order_details", {"id": details_match.group(2)}
+
+    return None
+
+
+def compiled_route(router: IntentRouter, user_message: str, driver_type: str,
+                   chat_history: List[Dict[str, str]]) -> Optional[Tuple[str, Dict[str, str]]]:
+    route = router.route(user_message, driver_type, asked_for_preference(driver_type, chat_history))
+    return (route.intent, route.slots) if route else None
+
+
+def check_parity(router: IntentRouter) -> List[Dict]:
+    mismatches = []
+    for message, driver_type, history in CORPUS:
+        expected = legacy_route(message, driver_type, history)
+        actual = compiled_route(router, message, driver_type, history)
+        if expected != actual:
+            mismatches.append({"message": message, "driver_type": driver_type, "legacy": expected, "router": actual})
+    return mismatches
+
+
+# Words the rules care about, shuffled into random messages for the fuzz parity check
+FUZZ_VOCABULARY = (
+    "accept reject ride rides rideshare request requests order orders delivery deliveries details for info on "
+    "id: # 101 7 what which check suggest recommend best top good any offer available fare money highest pay "
+    "most more time quick fast faster shortest less rating passenger high reward traffic light easy drive "
+    "minimal the a please now"
+).split() + ["\n", "details for", "info on", "accept ride", "accept order", "easy drive"]
+
+
+def fuzz_parity(router: IntentRouter, count: int, seed: int = 1) -> List[Dict]:
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(count):
+        message = " ".join(rng.choice(FUZZ_VOCABULARY) for _ in range(rng.randint(1, 7)))
+        driver_type = rng.choice(['ride', 'delivery'])
+        history = rng.choice([[], RIDE_QUESTION, DELIVERY_QUESTION])
+        expected = legacy_route(message, driver_type, history)
+        actual = compiled_route(router, message, driver_type, history)
+        if expected != actual:
+            mismatches.append({"message": message, "driver_type": driver_type, "legacy": expected, "router": actual})
+    return mismatches
+
+
+def time_per_message(fn, corpus, repeat: int, rounds: int = 7) -> float:
+    # Median of several rounds: the difference is small enough for scheduler noise to flip it
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for message, driver_type, history in corpus:
+                fn(message, driver_type, history)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) / (repeat * len(corpus))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the intent router against the legacy regex chain and time both.")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--fuzz", type=int, default=20000, help="Random messages for the parity check")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    router = IntentRouter()
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    mismatches = check_parity(router) + fuzz_parity(router, args.fuzz)
+    router_fn = lambda *a: compiled_route(router, *a)
+    # Messages no rule matches are the worst case: every pattern is tried before the LLM
+    fallbacks = [(m, d, h) for m, d, h in CORPUS if legacy_route(m, d, h) is None]
+
+    results = {"phrases": len(CORPUS), "fuzzed": args.fuzz, "llm_fallbacks": len(fallbacks),
+               "parity_mismatches": mismatches,
+               "compile_ms": round(compile_ms, 2)}
+    routed = [(m, d, h) for m, d, h in CORPUS if legacy_route(m, d, h) is not None]
+    for name, corpus in (("all", CORPUS), ("routed", routed), ("fallbacks", fallbacks)):
+        legacy = time_per_message(legacy_route, corpus, args.repeat)
+        compiled = time_per_message(router_fn, corpus, args.repeat)
+        results[name] = {
+            "legacy_us_per_message": round(legacy * 1e6, 2),
+            "router_us_per_message": round(compiled * 1e6, 2),
+            "legacy_to_router_ratio": round(legacy / compiled, 2),
+        }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compares knowledge-base read latency of the in-memory stores and the SQLite
+backend with several worker processes reading at once, like uvicorn
+workers serving /chat:
+
+    python -m Server.benchmarks.kb_backend_benchmark --workers 4 --orders 10000
+
+Each worker repeatedly reads the best orders (top 3 by score and by reward)
+and one order by ID. With --write-rate, one more process keeps updating
+orders meanwhile; in memory mode those updates only reach that process's
+own copy, which is the divergence the SQLite backend removes.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from ..knowledge_base import create_stores
+from ..sqlite_store import SQLiteDatabase
+from .order_book_benchmark import make_orders
+
+BACKENDS = {"memory": "indexed", "sqlite": "sqlite"}
+
+
+def open_stores(backend: str, orders: List[Dict[str, Any]], path: str):
+    database = SQLiteDatabase(path) if backend == "sqlite" else None
+    return create_stores(orders, [], BACKENDS[backend], database)
+
+
+def reader(backend: str, count: int, path: str, seconds: float, start_at: float, results) -> None:
+    store, _ = open_stores(backend, make_orders(count), path)
+    rng = random.Random(os.getpid())
+    while time.time() < start_at:
+        time.sleep(0.001)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        store.top("score", 3)
+        store.top("reward", 3)
+        store.get(rng.randrange(count))
+        latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+def writer(backend: str, count: int, path: str, seconds: float, start_at: float, rate: float, results) -> None:
+    orders = make_orders(count)
+    store, _ = open_stores(backend, orders, path)
+    rng = random.Random(0)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    writes = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        store.upsert(dict(orders[rng.randrange(count)], reward=rng.randint(3, 20)))
+        writes += 1
+        # Pace to the target rate
+        ahead = writes / rate - (time.perf_counter() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+    results.put(writes)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_backend(backend: str, args) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    results, writes = context.Queue(), context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.db")
+        open_stores(backend, make_orders(args.orders), path)  # Create and seed once
+
+        start_at = time.time() + 2 + args.workers * 0.5  # Let every process finish loading first
+        processes = [
+            context.Process(target=reader, args=(backend, args.orders, path, args.seconds, start_at, results))
+            for _ in range(args.workers)
+        ]
+        if args.write_rate:
+            processes.append(context.Process(
+                target=writer, args=(backend, args.orders, path, args.seconds, start_at, args.write_rate, writes)
+            ))
+        for process in processes:
+            process.start()
+        latencies = sorted(value for _ in range(args.workers) for value in results.get())
+        written = writes.get() if args.write_rate else 0
+        for process in processes:
+            process.join()
+
+    return {
+        "backend": backend,
+        "workers": args.workers,
+        "orders": args.orders,
+        "reads_per_second": round(len(latencies) / args.seconds),
+        "writes_per_second": round(written / args.seconds),
+        "latency_us": {
+            "mean": round(statistics.fmean(latencies) * 1e6, 1),
+            "p50": round(percentile(latencies, 0.50) * 1e6, 1),
+            "p95": round(percentile(latencies, 0.95) * 1e6, 1),
+            "p99": round(percentile(latencies, 0.99) * 1e6, 1),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark in-memory vs SQLite knowledge-base reads across workers.")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-rate", type=float, default=200.0, help="Order updates per second during the run (0: none)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends:
+        results.append(bench_backend(backend, args))
+        print(json.dumps(results[-1], indent=2), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
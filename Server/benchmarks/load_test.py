@@ -0,0 +1,350 @@
+"""
+Offline load test for /transcribe and /chat, plus microbenchmarks of the
+chat hot path. Starts the mock Gemini server and the FastAPI app (uvicorn
+in a subprocess), so it needs no network or API key:
+
+    python -m Server.benchmarks.load_test --concurrency 8 --chat-requests 400 --transcribe-requests 40 --output run.json
+    python -m Server.benchmarks.load_test --compare baseline.json run.json
+
+/chat traffic cycles through the intent router corpus. Results are broken
+down by route: "local" (answered by the rules) or "llm" (sent to Gemini;
+the reply cache is off unless --reply-cache). /transcribe traffic cycles
+through synthetic speech-like clips of several lengths and noise levels,
+sent with language=en, language=ms and without a language (detection);
+the transcription cache is off unless --transcription-cache, so repeated
+clips measure Whisper rather than cache hits.
+The synthetic clips carry no real words or language; pass --audio-dir
+with .wav/.mp3/.m4a clips to load-test on real recordings.
+
+Use --url to load-test a server that is already running instead.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import wave
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from ..audio_processing import SAMPLE_RATE
+from .denoise_benchmark import mix_noise, synthetic_speech
+from .gemini_client_benchmark import free_port, start_mock_server
+from .intent_router_benchmark import CORPUS
+
+# (label, seconds, SNR in dB; None = clean)
+AUDIO_FIXTURES = [
+    ("2s-clean", 2.0, None),
+    ("2s-snr10", 2.0, 10.0),
+    ("6s-snr10", 6.0, 10.0),
+    ("6s-snr0", 6.0, 0.0),
+    ("15s-snr5", 15.0, 5.0),
+]
+# None: no language sent, so the server detects it
+FIXTURE_LANGUAGES = ["en", "ms", None]
+SERVER_START_TIMEOUT_SECONDS = 300  # Loading Whisper in every worker can take a while
+
+
+# --- Fixtures ---
+
+def wav_bytes(samples: np.ndarray) -> bytes:
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def make_audio_fixtures(audio_dir: Optional[str]) -> List[Tuple[str, str, bytes]]:
+    """
+    Returns (label, filename, data) clips.
+    """
+    if audio_dir:
+        names = sorted(name for name in os.listdir(audio_dir) if name.lower().endswith((".wav", ".mp3", ".m4a")))
+        clips = []
+        for name in names:
+            with open(os.path.join(audio_dir, name), "rb") as f:
+                clips.append((os.path.splitext(name)[0], name, f.read()))
+        return clips
+
+    rng = np.random.default_rng(0)
+    clips = []
+    for label, seconds, snr in AUDIO_FIXTURES:
+        clean = synthetic_speech(seconds, rng)
+        samples = clean if snr is None else mix_noise(clean, snr, rng)
+        clips.append((label, f"{label}.wav", wav_bytes(samples)))
+    return clips
+
+
+def chat_route(message: str, driver_type: str, history: List[Dict[str, str]]) -> str:
+    from ..chatbot import answer_locally
+
+    return "local" if answer_locally(message, driver_type, history) is not None else "llm"
+
+
+# --- Server processes ---
+
+def start_app(port: int, gemini_url: str, args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["GEMINI_BASE_URL"] = gemini_url
+    env["REPLY_CACHE_ENABLED"] = "1" if args.reply_cache else "0"
+    env["TRANSCRIPTION_CACHE_ENABLED"] = "1" if args.transcription_cache else "0"
+    env.setdefault("REPLY_CACHE_PATH", "")
+    command = [sys.executable, "-m", "uvicorn", "Server.server:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning", "--workers", str(args.server_workers)]
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + SERVER_START_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} (see --server-log)")
+        try:
+            # Wait for the model warm-up too, so it does not count as request latency
+            if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1.0).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+
+# --- Load generation ---
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / wall_seconds, 2),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+    }
+
+
+async def drive(count: int, concurrency: int, send: Callable[[httpx.AsyncClient, int], Any],
+                label: Callable[[int], str], timeout: float) -> Dict[str, Any]:
+    """
+    Sends `count` requests with at most `concurrency` in flight. send(client, i)
+    issues request i; label(i) names its group in the breakdown.
+    """
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    next_request = 0
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal next_request
+        while next_request < count:
+            i = next_request
+            next_request += 1
+            group = label(i)
+            start = time.perf_counter()
+            try:
+                response = await send(client, i)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.setdefault(group, []).append(time.perf_counter() - start)
+            else:
+                errors[group] = errors.get(group, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        wall = time.perf_counter() - start
+
+    groups = sorted(set(latencies) | set(errors))
+    return {
+        "all": summarize([value for values in latencies.values() for value in values], sum(errors.values()), wall),
+        "by_route": {group: summarize(latencies.get(group, []), errors.get(group, 0), wall) for group in groups},
+    }
+
+
+async def load_chat(base_url: str, args) -> Dict[str, Any]:
+    routes = [chat_route(*entry) for entry in CORPUS]
+
+    def send(client: httpx.AsyncClient, i: int):
+        message, driver_type, history = CORPUS[i % len(CORPUS)]
+        return client.post(f"{base_url}/chat", json={
+            "message": message, "driver_type": driver_type, "chat_history": history,
+        })
+
+    return await drive(args.chat_requests, args.concurrency, send, lambda i: routes[i % len(CORPUS)], args.timeout)
+
+
+async def load_transcribe(base_url: str, args) -> Dict[str, Any]:
+    clips = make_audio_fixtures(args.audio_dir)
+    cases = [(clip, language) for clip in clips for language in FIXTURE_LANGUAGES]
+
+    def send(client: httpx.AsyncClient, i: int):
+        (label, filename, data), language = cases[i % len(cases)]
+        params = {"language": language} if language else {}
+        return client.post(f"{base_url}/transcribe", params=params, files={"file": (filename, data)})
+
+    def label(i: int) -> str:
+        (clip_label, _, _), language = cases[i % len(cases)]
+        return f"{clip_label}/{language or 'detect'}"
+
+    return await drive(args.transcribe_requests, args.concurrency, send, label, args.timeout)
+
+
+# --- Microbenchmarks ---
+
+def time_per_call(fn: Callable[[], Any], repeat: int, rounds: int = 5) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def run_microbenchmarks(repeat: int) -> Dict[str, float]:
+    """
+    Microseconds per call for the chat hot path, in this process.
+    """
+    from ..chatbot import ask_chatbot, create_prompt
+    from ..knowledge_base import calculate_order_score, get_suggested_orders, order_store
+
+    local = [entry for entry in CORPUS if chat_route(*entry) == "local"]
+    orders = list(order_store)
+    history = [{"sender": "user", "text": "Any good orders?"}, {"sender": "bot", "text": "Order 11 pays RM13."}] * 3
+    loop = asyncio.new_event_loop()
+
+    def route_all() -> None:
+        for entry in local:
+            loop.run_until_complete(ask_chatbot(*entry))
+
+    def score_all() -> None:
+        for order in orders:
+            calculate_order_score(order)
+
+    benchmarks = {
+        # Per message; only locally answered messages, so no LLM call is timed
+        "ask_chatbot_local_us": (route_all, len(local)),
+        "create_prompt_us": (lambda: create_prompt("Where should I wait for orders?", "delivery", history), 1),
+        "get_suggested_orders_us": (lambda: get_suggested_orders("reward"), 1),
+        "calculate_order_score_us": (score_all, len(orders)),
+    }
+    results = {name: round(time_per_call(fn, repeat) / per_call * 1e6, 2) for name, (fn, per_call) in benchmarks.items()}
+    loop.close()
+    return results
+
+
+# --- Comparing runs ---
+
+def compare(baseline_path: str, current_path: str) -> None:
+    """
+    Prints current/baseline ratios for every latency and microbenchmark
+    figure; above 1.0 is slower.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, encoding="utf-8") as f:
+        current = json.load(f)
+
+    def flatten(result: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+        flat = {}
+        for key, value in result.items():
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{key}."))
+            elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_us")):
+                flat[prefix + key] = value
+        return flat
+
+    old, new = flatten(baseline.get("results", {})), flatten(current.get("results", {}))
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        print(f"{key:56s} {old[key]:>10} -> {new[key]:>10}  x{ratio:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test /transcribe and /chat and microbenchmark the chat path.")
+    parser.add_argument("--url", help="Test this running server instead of starting one (and the mock Gemini)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chat-requests", type=int, default=400)
+    parser.add_argument("--transcribe-requests", type=int, default=60)
+    parser.add_argument("--audio-dir", help="Use these audio clips instead of the synthetic ones")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--reply-cache", action="store_true", help="Leave the LLM reply cache on")
+    parser.add_argument("--transcription-cache", action="store_true", help="Leave the transcription cache on")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--server-log", help="Write the started server's output to this file")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--micro-repeat", type=int, default=200)
+    parser.add_argument("--skip", nargs="*", choices=["chat", "transcribe", "micro"], default=[])
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two saved runs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # The chatbot module is imported here too (route labels, microbenchmarks) and wants a key
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+
+    mock_server = app_process = None
+    base_url = args.url
+    if not base_url:
+        os.environ["MOCK_GEMINI_LATENCY_MS"] = str(args.gemini_latency_ms)
+        mock_port = free_port()
+        mock_server = start_mock_server(mock_port)
+        port = free_port()
+        app_process = start_app(port, f"http://127.0.0.1:{mock_port}/v1beta", args)
+        base_url = f"http://127.0.0.1:{port}"
+
+    results: Dict[str, Any] = {}
+    try:
+        if "chat" not in args.skip:
+            results["chat"] = asyncio.run(load_chat(base_url, args))
+            print(json.dumps({"chat": results["chat"]}, indent=2), flush=True)
+        if "transcribe" not in args.skip:
+            results["transcribe"] = asyncio.run(load_transcribe(base_url, args))
+            print(json.dumps({"transcribe": results["transcribe"]}, indent=2), flush=True)
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        if mock_server is not None:
+            mock_server.should_exit = True
+
+    if "micro" not in args.skip:
+        results["micro"] = run_microbenchmarks(args.micro_repeat)
+        print(json.dumps({"micro": results["micro"]}, indent=2), flush=True)
+
+    if args.output:
+        run = {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key != "compare"},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
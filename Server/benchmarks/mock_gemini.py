@@ -0,0 +1,80 @@
+"""
+A local stand-in for the Gemini generateContent API, for offline benchmarks.
+
+    MOCK_GEMINI_LATENCY_MS=800 uvicorn Server.benchmarks.mock_gemini:app --port 8081
+    GEMINI_BASE_URL=http://127.0.0.1:8081/v1beta uvicorn Server.server:app
+
+MOCK_GEMINI_ERROR_RATE makes that share of calls answer 503 (or 429), to
+exercise the client's retry policy. streamGenerateContent (alt=sse) sends
+the reply word by word, with the latency split into time-to-first-token and
+the rest spread across the words.
+"""
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_GEMINI_LATENCY_MS = float(os.getenv("MOCK_GEMINI_LATENCY_MS", "800"))
+MOCK_GEMINI_JITTER_MS = float(os.getenv("MOCK_GEMINI_JITTER_MS", "100"))
+MOCK_GEMINI_ERROR_RATE = float(os.getenv("MOCK_GEMINI_ERROR_RATE", "0"))
+# Share of the latency spent before the first streamed token
+MOCK_GEMINI_FIRST_TOKEN_SHARE = float(os.getenv("MOCK_GEMINI_FIRST_TOKEN_SHARE", "0.3"))
+
+MOCK_REPLY = "Sure. You can ask me for the best order or ride. Say 'accept order' followed by its number to take it."
+
+app = FastAPI()
+app.state.calls = 0
+
+
+async def simulated_latency() -> None:
+    delay = MOCK_GEMINI_LATENCY_MS + random.uniform(-MOCK_GEMINI_JITTER_MS, MOCK_GEMINI_JITTER_MS)
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+
+def mock_error() -> JSONResponse:
+    status = random.choice([429, 503])
+    return JSONResponse(status_code=status, content={"error": {"code": status, "message": "mock error"}})
+
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    app.state.calls += 1
+    await request.json()
+    await simulated_latency()
+
+    if random.random() < MOCK_GEMINI_ERROR_RATE:
+        return mock_error()
+
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": MOCK_REPLY}], "role": "model"},
+            "finishReason": "STOP",
+        }],
+        "modelVersion": model,
+    }
+
+
+@app.post("/v1beta/models/{model}:streamGenerateContent")
+async def stream_generate_content(model: str, request: Request):
+    app.state.calls += 1
+    await request.json()
+    if random.random() < MOCK_GEMINI_ERROR_RATE:
+        return mock_error()
+
+    words = MOCK_REPLY.split(" ")
+    first_token_delay = MOCK_GEMINI_LATENCY_MS * MOCK_GEMINI_FIRST_TOKEN_SHARE / 1000
+    word_delay = MOCK_GEMINI_LATENCY_MS * (1 - MOCK_GEMINI_FIRST_TOKEN_SHARE) / 1000 / len(words)
+
+    async def events():
+        await asyncio.sleep(first_token_delay)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(word_delay)
+            text = word if i == 0 else f" {word}"
+            chunk = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}], "modelVersion": model}
+            yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
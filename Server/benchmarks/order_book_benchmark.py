@@ -0,0 +1,116 @@
+"""
+Compares the three ways of ranking orders at 1k, 100k and 1M orders:
+
+    python -m Server.benchmarks.order_book_benchmark --sizes 1000 100000 1000000
+
+- dict: the original path, calculate_order_score per order plus sorted()
+- indexed: RecordStore, sorted rankings maintained on every change
+- columnar: ColumnarRecordStore, vectorized scoring and argpartition top-k
+
+For each it reports the build time, the best-order / top-3 query time per
+ranking and the cost of updating one order, and checks that all three
+return the same top orders.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from ..knowledge_base import ORDER_RANKINGS, TRAFFIC_SORT_ORDER, calculate_order_score, create_stores
+
+TOP_K = 3
+
+# The sort each ranking replaced, as in the original get_suggested_orders
+DICT_SORTS = {
+    "reward": lambda orders: sorted(orders, key=lambda o: o.get("reward", 0), reverse=True),
+    "time": lambda orders: sorted(orders, key=lambda o: o.get("time_estimate", float('inf'))),
+    "traffic": lambda orders: sorted(orders, key=lambda o: TRAFFIC_SORT_ORDER.get(o.get("traffic_condition", "heavy"), 2)),
+    "score": lambda orders: sorted(orders, key=calculate_order_score, reverse=True),
+}
+
+
+def make_orders(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "order_id": i,
+            "pickup_location": "Pickup",
+            "delivery_location": "Dropoff",
+            "reward": rng.randint(3, 20),
+            "time_estimate": rng.randint(5, 60),
+            "traffic_condition": rng.choice(("light", "moderate", "heavy")),
+            "priority": rng.choice(("high", "medium", "low")),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int = 1) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_size(count: int, repeat: int) -> Dict[str, Any]:
+    orders = make_orders(count)
+    # Fewer repeats for the slow full sorts at large sizes
+    dict_repeat = max(1, repeat // 10) if count >= 100000 else repeat
+    result: Dict[str, Any] = {"orders": count}
+
+    dict_top = {name: [o["order_id"] for o in sort(orders)[:TOP_K]] for name, sort in DICT_SORTS.items()}
+    result["dict"] = {
+        "build_ms": 0.0,
+        "query_ms": {name: round(timed(lambda: sort(orders)[:TOP_K], dict_repeat) * 1000, 3)
+                     for name, sort in DICT_SORTS.items()},
+        # Changing an order costs nothing up front; every query pays instead
+        "update_us": 0.0,
+    }
+
+    mismatches = []
+    for backend in ("indexed", "columnar"):
+        start = time.perf_counter()
+        store, _ = create_stores(orders, [], backend)
+        build = time.perf_counter() - start
+
+        for name in ORDER_RANKINGS:
+            ids = [o["order_id"] for o in store.top(name, TOP_K)]
+            if ids != dict_top[name]:
+                mismatches.append({"backend": backend, "ranking": name, "expected": dict_top[name], "got": ids})
+
+        rng = random.Random(1)
+        updates = [dict(orders[rng.randrange(count)], reward=rng.randint(3, 20)) for _ in range(200)]
+        update = timed(lambda: [store.upsert(order) for order in updates]) / len(updates)
+
+        result[backend] = {
+            "build_ms": round(build * 1000, 1),
+            "query_ms": {name: round(timed(lambda: store.top(name, TOP_K), repeat) * 1000, 3) for name in ORDER_RANKINGS},
+            "update_us": round(update * 1e6, 2),
+        }
+
+    result["mismatches"] = mismatches
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark dict, indexed and columnar order ranking.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.sizes:
+        results.append(bench_size(count, args.repeat))
+        print(json.dumps(results[-1], indent=2), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,24 @@
-import requests
+import httpx
 import re
 import json
+import logging
 import os
 import random
+import time
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from .knowledge_base import (
-    get_knowledge_base_context, get_conversation_guideline, 
+    get_knowledge_base_context, get_conversation_guideline,
     get_order_recommendation, get_suggested_orders, 
-    get_ride_request_details, get_suggested_rides
+    get_ride_request_details, get_suggested_rides, get_knowledge_base_version
 )
+from .gemini_client import GeminiClient
+from .intent_router import intent_router, asked_for_preference
+from .intent_classifier import get_intent_classifier
+from .reply_cache import ReplyCache, make_reply_key
+from .observability import CHAT_REPLIES, INTENT_ROUTES, PROMPT_TOKENS, record_stage, stage
+
+logger = logging.getLogger(__name__)
 
 # Construct the path to the .env file relative to this script
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,24 +28,61 @@ load_dotenv(dotenv_path=dotenv_path) # Load environment variables from the speci
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables. Make sure it's set in your .env file.")
+    # Local commands still work; LLM fallbacks get the error reply until the key is set
+    logger.warning("GEMINI_API_KEY not found in environment variables. Make sure it's set in your .env file.")
 
-def create_prompt(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> str:
+# One shared client so every fallback reuses the same pooled connection
+gemini_client = GeminiClient(GEMINI_API_KEY or "")
+# Repeated fallback questions are answered from here instead of a new API call
+reply_cache = ReplyCache()
+
+# --- Prompt size (override with environment variables) ---
+# Tokens of chat history sent to the LLM; older turns are compacted, then dropped
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+# The newest turns are always kept verbatim (if they fit the budget)
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "4"))
+# Older turns are cut to this many characters
+HISTORY_COMPACT_CHARS = int(os.getenv("HISTORY_COMPACT_CHARS", "120"))
+CHARS_PER_TOKEN = 4  # Rough estimate for English/Malay text; good enough for budgeting
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def format_history(chat_history: List[Dict[str, str]], token_budget: int = HISTORY_TOKEN_BUDGET) -> str:
     """
-    Creates a well-structured prompt with context, instructions, and chat history,
-    tailored to the driver type ('ride' or 'delivery').
+    Formats chat history newest-first into a token budget: the last
+    HISTORY_RECENT_TURNS turns verbatim, older ones shortened to
+    HISTORY_COMPACT_CHARS, and whatever no longer fits is dropped.
     """
-    knowledge_context = get_knowledge_base_context(driver_type)
+    lines: List[str] = []
+    used = 0
+    for age, msg in enumerate(reversed(chat_history)):
+        sender = str(msg.get('sender', 'unknown')).capitalize()
+        text = str(msg.get('text', ''))
+        if age >= HISTORY_RECENT_TURNS and len(text) > HISTORY_COMPACT_CHARS:
+            text = text[:HISTORY_COMPACT_CHARS].rstrip() + "..."
+        line = f"{sender}: {text}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+
+    omitted = len(chat_history) - len(lines)
+    if omitted:
+        lines.append(f"({omitted} earlier messages omitted)")
+    return "\n".join(reversed(lines))
 
-    # Format the recent chat history
-    history_str = "\nRecent Conversation History:\n"
-    if chat_history:
-        for msg in chat_history:
-            sender = msg.get('sender', 'unknown').capitalize()
-            text = msg.get('text', '')
-            history_str += f"{sender}: {text}\n"
-    else:
-        history_str += "(No history provided)\n"
+# driver_type -> (knowledge-base version, prompt prefix)
+_prompt_prefixes: Dict[str, Tuple[int, str]] = {}
+
+def build_prompt_prefix(driver_type: str) -> str:
+    """
+    Builds the fixed part of the prompt (role, knowledge base, instructions)
+    for a driver type. It only depends on the knowledge base, so it is
+    identical across requests.
+    """
+    knowledge_context = get_knowledge_base_context(driver_type)
 
     # Tailor the initial instruction based on driver type
     if driver_type == 'ride':
@@ -52,14 +98,13 @@ def create_prompt(user_message: str, driver_type: str, chat_history: List[Dict[s
         capabilities_focus = "Handle ride requests or delivery orders as applicable."
         interaction_mode = "Respond to ride or delivery commands and general queries."
 
-    prompt = f"""You are a Grab Driver Assistant AI powered by Gemini.
+    return f"""You are a Grab Driver Assistant AI powered by Gemini.
 {role_description}
 
 **Strictly use the following Knowledge Base Information and Available Order/Ride Data when responding to requests about orders or rides. Do not invent details.**
 
 Knowledge Base Information:
 {knowledge_context}
-{history_str}
 
 Instructions:
 1. Act as a helpful assistant for the specified driver type ({driver_type}).
@@ -70,176 +115,279 @@ Instructions:
 6. If unsure about a command or if the request cannot be fulfilled with the provided data, ask for clarification using appropriate guidelines. **Do not make up information.**
 7. {interaction_mode}
 8. Keep responses short.
+"""
+
+def get_prompt_prefix(driver_type: str) -> str:
+    """
+    Returns the prompt prefix for a driver type, rebuilt only when the
+    knowledge-base version changes.
+    """
+    if driver_type not in ('ride', 'delivery'):
+        # The prefix embeds driver_type, so arbitrary values are not cached
+        return build_prompt_prefix(driver_type)
+    version = get_knowledge_base_version()
+    cached = _prompt_prefixes.get(driver_type)
+    if cached is None or cached[0] != version:
+        cached = (version, build_prompt_prefix(driver_type))
+        _prompt_prefixes[driver_type] = cached
+    return cached[1]
+
+def create_prompt(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> str:
+    """
+    Creates a well-structured prompt with context, instructions, and chat history,
+    tailored to the driver type ('ride' or 'delivery'). The fixed prefix comes
+    first and per-request text (history, message) is appended after it, so
+    every request for a driver type shares the same leading tokens.
+    """
+    history = format_history(chat_history) if chat_history else ""
+    history_str = f"\nRecent Conversation History:\n{history or '(No history provided)'}\n"
 
+    return f"""{get_prompt_prefix(driver_type)}{history_str}
 Driver Message: {user_message}
 
 Please provide a helpful and concise response based **only** on the provided history, knowledge base, and driver message:"""
-    
-    return prompt
 
-def ask_chatbot(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> str:
+def build_payload(prompt: str) -> Dict:
+    return {
+        "contents": [
+            {
+                "parts": [{"text": prompt}]
+            }
+        ],
+        "generationConfig": {
+            "temperature": 0.7,
+            "topP": 0.8,
+            "topK": 40,
+            "maxOutputTokens": 256
+        }
+    }
+
+def log_prompt_size(prompt: str, chat_history: List[Dict[str, str]], usage: Optional[Dict] = None) -> None:
+    # Gemini's own count when the response has one, else our estimate
+    counted = (usage or {}).get("promptTokenCount")
+    tokens = counted or estimate_tokens(prompt)
+    PROMPT_TOKENS.observe(tokens)
+    logger.info("LLM prompt: %s tokens, %d chars, %d history turns received.",
+                tokens if counted else f"~{tokens}", len(prompt), len(chat_history or []))
+
+async def generate_llm_reply(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Asks Gemini for a reply. Returns None when the call fails, so the
+    failure is not cached.
+    """
+    with stage("prompt_build"):
+        prompt = create_prompt(user_message, driver_type, chat_history)
+        payload = build_payload(prompt)
+
+    try:
+        # Awaited, so other requests keep being served during the round-trip
+        with stage("gemini"):
+            data = await gemini_client.generate_content(payload)
+        log_prompt_size(prompt, chat_history, data.get("usageMetadata"))
+        if data.get("candidates") and data["candidates"][0].get("content", {}).get("parts"):
+            reply = data["candidates"][0]["content"]["parts"][0].get("text", "")
+            # Check if the LLM itself failed to understand despite history
+            if "sorry" in reply.lower() and "understand" in reply.lower():
+                 logger.warning("LLM indicated confusion despite history context.")
+                 # Optionally return a more specific error or the LLM's confusion
+                 # return get_conversation_guideline("clarification") 
+            return reply.strip()
+        else:
+            logger.warning("Unexpected API response structure.")
+            return None
+    except httpx.HTTPError as api_err:
+        logger.error("Error calling Gemini API: %s", api_err)
+        return None
+
+def answer_locally(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Answers ride/delivery commands from the knowledge base without the LLM.
+    The rules go first; the classifier catches paraphrases they miss.
+    Returns None when neither recognises the message.
+    """
+    with stage("intent_routing"):
+        route = intent_router.route(user_message, driver_type, asked_for_preference(driver_type, chat_history))
+    via = "rule"
+    # Never trains here: until the classifier is ready, unmatched messages go to the LLM
+    intent_classifier = get_intent_classifier(wait=False) if route is None else None
+    if intent_classifier is not None:
+        with stage("intent_classifier"):
+            route = intent_classifier.route(user_message, driver_type, chat_history)
+        via = "classifier"
+    if route is None:
+        INTENT_ROUTES.inc(via="none")
+        return None
+    INTENT_ROUTES.inc(via=via)
+    with stage("kb_lookup"):
+        return answer_intent(*route)
+
+def answer_intent(intent: str, slots: Dict[str, str]) -> Optional[str]:
+    """
+    Builds the reply for a routed intent from the knowledge base.
+    """
+    # --- Ride Hailing Logic (Only for ride drivers) ---
+    if intent == "accept_ride":
+        return get_conversation_guideline("ride_accepted_id").format(ride_id=int(slots["id"]))
+
+    if intent == "reject_ride":
+        return get_conversation_guideline("ride_rejected")
+
+    if intent == "suggest_rides":
+        # If preference found, use it. Otherwise, use default.
+        effective_preference = slots.get("preference", "default")
+        logger.debug("Handling ride suggestion request locally with preference: %s", effective_preference)
+        return get_suggested_rides(effective_preference)
+
+    if intent == "ride_preference":
+        # The driver is *responding* to our "what's most important" question
+        logger.debug("Handling ride preference locally: %s", slots['preference'])
+        return get_suggested_rides(slots["preference"])
+
+    if intent == "ride_details":
+        return get_ride_request_details(int(slots["id"]))
+
+    # --- Delivery Order Logic (Only for delivery drivers) ---
+    if intent == "accept_order":
+        return get_conversation_guideline("delivery_accepted").format(order_id=int(slots["id"]))
+
+    if intent == "suggest_orders":
+        effective_preference = slots.get("preference", "default")
+        logger.debug("Handling delivery suggestion request locally with preference: %s", effective_preference)
+        return get_suggested_orders(effective_preference)
 
+    if intent == "order_preference":
+        logger.debug("Handling preference locally: %s", slots['preference'])
+        return get_suggested_orders(slots["preference"])
+
+    if intent == "order_details":
+        recommendation = get_order_recommendation(int(slots["id"]))
+        if "Order not found" in recommendation:
+            return "Sorry, I couldn't find details for that delivery ID."
+        return recommendation
+
+    return None
+
+async def ask_chatbot(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> str:
+    reply, _ = await answer_chatbot(user_message, driver_type, chat_history)
+    return reply
+
+async def answer_chatbot(user_message: str, driver_type: str, chat_history: List[Dict[str, str]]) -> Tuple[str, str]:
+    """
+    ask_chatbot that also says where the reply came from: local, cache,
+    llm or error.
+    """
     try:
-        user_message_lower = user_message.lower()
-
-        # --- Ride Hailing Logic (Only for ride drivers) ---
-        if driver_type == 'ride':
-            preference_handled_locally = False # Flag for ride preference
-
-            # 1. Check for accepting a specific ride
-            accept_match = re.search(r'accept ride(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
-            if accept_match:
-                ride_id = int(accept_match.group(1))
-                return get_conversation_guideline("ride_accepted_id").format(ride_id=ride_id)
-
-            # 2. Check for rejecting a ride (keep simple)
-            if re.search(r'\breject ride\b', user_message_lower):
-                return get_conversation_guideline("ride_rejected")
-
-            # 3. Check for ride suggestion requests (best, suggest, what, etc.)
-            is_ride_suggestion_request = (
-                re.search(r'\b(suggest|recommend|available|any|offer|best|top|good)\b.*\b(ride|rides|request|requests)', user_message_lower) or
-                (re.search(r'\b(what|which)\b', user_message_lower) and re.search(r'\b(ride|rides|request|requests)', user_message_lower)) or
-                re.search(r'\bcheck\b.*\b(ride|rides|request|requests)\b', user_message_lower) # Treat 'check' as suggestion
-            )
-            if is_ride_suggestion_request:
-                # Check for preferences mentioned in the initial request
-                preference = None
-                if re.search(r'\b(fare|money|highest pay|most pay|more fare)\b', user_message_lower):
-                    preference = "fare"
-                elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
-                    preference = "time"
-                elif re.search(r'\b(rating|passenger|high rating)\b', user_message_lower):
-                    preference = "rating"
-                
-                # If preference found, use it. Otherwise, use default.
-                effective_preference = preference if preference else "default"
-                print(f"Handling ride suggestion request locally with preference: {effective_preference}") 
-                return get_suggested_rides(effective_preference)
-
-            # 4. Check if user is *responding* with a ride preference
-            last_bot_message = chat_history[-1]['text'] if chat_history and chat_history[-1]['sender'] == 'bot' else ''
-            if "what's most important" in last_bot_message.lower() and ("ride requests" in last_bot_message.lower() or "highest fare" in last_bot_message.lower()): # Check if last question was about rides
-                preference = None
-                if re.search(r'\b(fare|money|highest pay|most pay|more fare)\b', user_message_lower):
-                    preference = "fare"
-                elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
-                    preference = "time"
-                elif re.search(r'\b(rating|passenger|high rating)\b', user_message_lower):
-                    preference = "rating"
-
-                if preference:
-                    print(f"Handling ride preference locally: {preference}")
-                    preference_handled_locally = True
-                    return get_suggested_rides(preference)
-
-            # 5. Check for specific ride details request
-            details_match = re.search(r'\b(ride|details for|info on)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
-            if details_match and not accept_match: # Ensure not an accept command
-                ride_id = int(details_match.group(2))
-                return get_ride_request_details(ride_id)
-            
-            # If ride logic specific rules didn't match and preference wasn't handled, fall through to LLM
-            if preference_handled_locally:
-                 print("Warning: Ride preference handled locally flag set, but fallback reached unexpectedly.")
-
-        # --- Delivery Order Logic (Only for delivery drivers) ---
-        elif driver_type == 'delivery':
-            accept_match_inner = re.search(r'accept (?:delivery|order)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
-            if accept_match_inner:
-                order_id = int(accept_match_inner.group(1))
-                return get_conversation_guideline("delivery_accepted").format(order_id=order_id)
-
-            # --- Suggestion Logic --- 
-            # Combine checks for any suggestion request
-            is_suggestion_request = (
-                re.search(r'\b(best|top|good|suggest|recommend|available|any|offer)\b.*\b(order|delivery)', user_message_lower) or
-                (re.search(r'\b(what|which)\b', user_message_lower) and re.search(r'\b(delivery|deliveries|order)', user_message_lower))
-            )
-            if is_suggestion_request:
-                # Check if preference is mentioned
-                preference = None
-                if re.search(r'\b(reward|money|highest pay|most pay|more reward)\b', user_message_lower):
-                    preference = "reward"
-                elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
-                    preference = "time"
-                elif re.search(r'\b(traffic|light traffic|easy drive|less traffic|minimal traffic)\b', user_message_lower):
-                    preference = "traffic"
-                
-                # If preference found, use it. Otherwise, use default.
-                effective_preference = preference if preference else "default"
-                print(f"Handling delivery suggestion request locally with preference: {effective_preference}") 
-                return get_suggested_orders(effective_preference) # Handle suggestion with specific or default preference
-
-            # Check if user is *responding* with a preference (Less likely now, but keep for robustness)
-            last_bot_message = chat_history[-1]['text'] if chat_history and chat_history[-1]['sender'] == 'bot' else ''
-            if "what's most important" in last_bot_message.lower() and ("delivery orders" in last_bot_message.lower() or "high reward" in last_bot_message.lower()):
-                 preference = None
-                 if re.search(r'\b(reward|money|highest pay|most pay|more reward)\b', user_message_lower):
-                     preference = "reward"
-                 elif re.search(r'\b(time|quick|fast|shortest|less time|faster)\b', user_message_lower):
-                     preference = "time"
-                 elif re.search(r'\b(traffic|light traffic|easy drive|less traffic|minimal traffic)\b', user_message_lower):
-                     preference = "traffic"
-                 
-                 if preference:
-                     print(f"Handling preference locally: {preference}")
-                     preference_handled_locally = True # Set flag
-                     return get_suggested_orders(preference) # Handle preference response locally
-
-            # Check for specific delivery order details request
-            details_match = re.search(r'\b(delivery|order|details for|info on)(?:\s*id)?[:#]?\s*(\d+)', user_message_lower)
-            if details_match:
-                order_id = int(details_match.group(2))
-                recommendation = get_order_recommendation(order_id)
-                if "Order not found" in recommendation:
-                    return "Sorry, I couldn't find details for that delivery ID."
-                return recommendation
-            # Need flag for delivery preference handled locally if adding it to elif block
-            # if preference_handled_locally: ... 
+        reply = answer_locally(user_message, driver_type, chat_history)
+        if reply is not None:
+            CHAT_REPLIES.inc(source="local")
+            return reply, "local"
 
         # --- Fallback to Gemini API --- 
         # Check if any specific logic was hit (which would have returned already)
         # If we reach here, none of the specific rules matched.
-        print(f"No specific rule matched for '{user_message}'. Falling back to LLM.")
-        prompt = create_prompt(user_message, driver_type, chat_history) # Pass history 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={GEMINI_API_KEY}"
-        payload = {
-            "contents": [
-                {
-                    "parts": [{"text": prompt}]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topP": 0.8,
-                "topK": 40,
-                "maxOutputTokens": 256
-            }
-        }
-        headers = {
-            'Content-Type': 'application/json'
-        }
+        logger.debug("No specific rule matched for %r. Falling back to LLM.", user_message)
+        key = make_reply_key(user_message, driver_type, chat_history, get_knowledge_base_version())
+        called = False
+
+        def compute():
+            nonlocal called
+            called = True
+            return generate_llm_reply(user_message, driver_type, chat_history)
+
+        reply = await reply_cache.get_or_compute(key, compute)
+        if reply is None:
+            CHAT_REPLIES.inc(source="error")
+            return get_conversation_guideline("error"), "error"
+        source = "llm" if called else "cache"
+        CHAT_REPLIES.inc(source=source)
+        return reply, source
+
+    except Exception:
+        logger.exception("Error in ask_chatbot")
+        CHAT_REPLIES.inc(source="error")
+        return "Sorry, I encountered an unexpected issue. Please try again.", "error"
+
+# A sentence ends at . ! or ? followed by whitespace; TTS can speak each one as it arrives
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+MIN_CHUNK_CHARS = 20  # Avoid sending "Sure." style fragments on their own
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    """
+    Splits off the complete sentences at the start of a buffer, merging
+    very short ones. Returns (sentences, remaining text).
+    """
+    parts = SENTENCE_END.split(buffer)
+    rest = parts.pop()
+    sentences, current = [], ""
+    for part in parts:
+        current = f"{current} {part}" if current else part
+        if len(current) >= MIN_CHUNK_CHARS:
+            sentences.append(current)
+            current = ""
+    if current:
+        rest = f"{current} {rest}" if rest else current
+    return sentences, rest
+
+async def stream_chatbot(user_message: str, driver_type: str,
+                         chat_history: List[Dict[str, str]]) -> AsyncIterator[Dict[str, str]]:
+    """
+    Streaming variant of ask_chatbot. Yields {"type": "chunk", "text"} events
+    a sentence at a time as Gemini produces them, then a {"type": "done"}
+    event with the full reply and where it came from (local, cache or llm).
+    Local and cached answers arrive as a single chunk.
+    """
+    try:
+        reply = answer_locally(user_message, driver_type, chat_history)
+    except Exception:
+        logger.exception("Error in stream_chatbot")
+        reply = "Sorry, I encountered an unexpected issue. Please try again."
+    if reply is not None:
+        CHAT_REPLIES.inc(source="local")
+        yield {"type": "chunk", "text": reply}
+        yield {"type": "done", "reply": reply, "source": "local"}
+        return
+
+    logger.debug("No specific rule matched for %r. Streaming from LLM.", user_message)
+    key = make_reply_key(user_message, driver_type, chat_history, get_knowledge_base_version())
+    reply = reply_cache.lookup(key)
+    if reply is not None:
+        CHAT_REPLIES.inc(source="cache")
+        yield {"type": "chunk", "text": reply}
+        yield {"type": "done", "reply": reply, "source": "cache"}
+        return
+
+    with stage("prompt_build"):
+        prompt = create_prompt(user_message, driver_type, chat_history)
+        payload = build_payload(prompt)
+    log_prompt_size(prompt, chat_history)
+    buffer, full_reply = "", ""
+    complete = False
+    gemini_start = time.perf_counter()
+    try:
+        async for fragment in gemini_client.stream_generate_content(payload):
+            full_reply += fragment
+            sentences, buffer = split_sentences(buffer + fragment)
+            for sentence in sentences:
+                yield {"type": "chunk", "text": sentence}
+        complete = True
+    except (httpx.HTTPError, ValueError) as api_err:
+        # If part of the reply was already spoken, finish with what arrived
+        logger.error("Error streaming from Gemini API: %s", api_err)
+
+    # The whole stream, including time the client took to read each chunk
+    record_stage("gemini", time.perf_counter() - gemini_start)
+    full_reply = full_reply.strip()
+    if not full_reply:
+        # The call failed before any text, or Gemini finished without any (e.g. a blocked prompt)
+        CHAT_REPLIES.inc(source="error")
+        error_reply = get_conversation_guideline("error")
+        yield {"type": "chunk", "text": error_reply}
+        yield {"type": "done", "reply": error_reply, "source": "error"}
+        return
 
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status() 
-            data = response.json()
-            if data.get("candidates") and data["candidates"][0].get("content", {}).get("parts"):
-                reply = data["candidates"][0]["content"]["parts"][0].get("text", "")
-                # Check if the LLM itself failed to understand despite history
-                if "sorry" in reply.lower() and "understand" in reply.lower():
-                     print("Warning: LLM indicated confusion despite history context.")
-                     # Optionally return a more specific error or the LLM's confusion
-                     # return get_conversation_guideline("clarification") 
-                return reply.strip()
-            else:
-                print("Warning: Unexpected API response structure.")
-                return get_conversation_guideline("error")
-        except requests.exceptions.RequestException as api_err:
-            print(f"Error calling Gemini API: {api_err}")
-            return get_conversation_guideline("error")
-
-    except Exception as e:
-        print(f"Error in ask_chatbot: {str(e)}") 
-        return "Sorry, I encountered an unexpected issue. Please try again."
\ No newline at end of file
+    CHAT_REPLIES.inc(source="llm")
+    if buffer.strip():
+        yield {"type": "chunk", "text": buffer.strip()}
+    if complete:
+        reply_cache.put(key, full_reply)
+    yield {"type": "done", "reply": full_reply, "source": "llm"}
@@ -0,0 +1,160 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# A ranking is a list of (column, descending) pairs, most significant first
+Ranking = List[Tuple[str, bool]]
+# A computed column is a vectorized function of the stored columns
+ComputedColumn = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+COMPACT_MIN_DEAD_ROWS = 1024
+
+
+class ColumnarRecordStore:
+    """
+    Column-oriented alternative to RecordStore: each numeric field is a
+    NumPy array, derived columns (the order score) are computed with one
+    vectorized expression, and top-k uses argpartition instead of keeping
+    sorted indexes. Cheaper to build and update than RecordStore at very
+    large sizes; each top-k query is O(n) instead of O(k).
+
+    Rows stay in insertion order (removed rows are tombstoned, then
+    compacted in order), so ties rank in insertion order like RecordStore.
+    """
+
+    def __init__(self, id_field: str, columns: Dict[str, Callable[[Dict[str, Any]], float]],
+                 rankings: Dict[str, Ranking], computed: Optional[Dict[str, ComputedColumn]] = None,
+                 records: Optional[List[Dict[str, Any]]] = None):
+        self.id_field = id_field
+        self._column_fns = columns
+        self._computed_fns = computed or {}
+        self._rankings = rankings
+        self._records: List[Optional[Dict[str, Any]]] = []
+        self._row_of: Dict[Any, int] = {}
+        self._size = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._allocate(0)
+        if records:
+            self.load(records)
+
+    def _allocate(self, capacity: int) -> None:
+        names = list(self._column_fns) + list(self._computed_fns)
+        columns = {name: np.zeros(capacity, dtype=np.float64) for name in names}
+        alive = np.zeros(capacity, dtype=bool)
+        for name, column in self._columns.items():
+            columns[name][:self._size] = column[:self._size]
+        alive[:self._size] = self._alive[:self._size]
+        self._columns, self._alive = columns, alive
+
+    def _view(self, rows: slice) -> Dict[str, np.ndarray]:
+        return {name: column[rows] for name, column in self._columns.items()}
+
+    def _compute(self, rows: slice) -> None:
+        view = self._view(rows)
+        for name, fn in self._computed_fns.items():
+            self._columns[name][rows] = fn(view)
+
+    def load(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Bulk-loads records, extracting and scoring all columns at once.
+        """
+        if self._size:
+            for record in records:
+                self.upsert(record)
+            return
+
+        latest = {record[self.id_field]: record for record in records}
+        count = len(latest)
+        self._records = list(latest.values())
+        self._row_of = {record_id: row for row, record_id in enumerate(latest)}
+        self._columns = {
+            name: np.fromiter((fn(record) for record in self._records), dtype=np.float64, count=count)
+            for name, fn in self._column_fns.items()
+        }
+        self._columns.update({name: np.zeros(count, dtype=np.float64) for name in self._computed_fns})
+        self._alive = np.ones(count, dtype=bool)
+        self._size = count
+        self._compute(slice(0, count))
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """
+        Inserts a record, or replaces the one with the same ID in place.
+        All-or-nothing: a record whose columns cannot be extracted raises
+        and leaves the store as it was.
+        """
+        record_id = record[self.id_field]
+        values = {name: float(fn(record)) for name, fn in self._column_fns.items()}
+        row = self._row_of.get(record_id)
+        if row is None:
+            if self._size == self._alive.size:
+                self._allocate(max(16, self._size * 2))
+            row = self._size
+            self._size += 1
+            self._row_of[record_id] = row
+            self._records.append(record)
+        else:
+            self._records[row] = record
+
+        for name, value in values.items():
+            self._columns[name][row] = value
+        self._alive[row] = True
+        self._compute(slice(row, row + 1))
+
+    def remove(self, record_id: Any) -> bool:
+        row = self._row_of.pop(record_id, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._records[row] = None
+        dead = self._size - len(self._row_of)
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead * 2 >= self._size:
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._columns = {name: column[keep] for name, column in self._columns.items()}
+        self._records = [self._records[row] for row in keep]
+        self._row_of = {record[self.id_field]: row for row, record in enumerate(self._records)}
+        self._size = keep.size
+        self._alive = np.ones(self._size, dtype=bool)
+
+    def get(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        row = self._row_of.get(record_id)
+        return None if row is None else self._records[row]
+
+    def computed(self, record_id: Any, name: str) -> Any:
+        return float(self._columns[name][self._row_of[record_id]])
+
+    def top(self, ranking: str, count: int) -> List[Dict[str, Any]]:
+        """
+        Returns the best `count` records for a ranking. argpartition finds
+        the k-th best primary key in O(n); every row at least that good
+        (ties included) is then sorted exactly, so the result is the same
+        as a full stable sort.
+        """
+        if count <= 0 or not self._row_of:
+            return []
+        keys = [
+            (-self._columns[name][:self._size] if descending else self._columns[name][:self._size])
+            for name, descending in self._rankings[ranking]
+        ]
+        primary = np.where(self._alive[:self._size], keys[0], np.inf)
+
+        if count < len(self._row_of):
+            kth = np.partition(primary, count - 1)[count - 1]
+            candidates = np.flatnonzero((primary <= kth) & self._alive[:self._size])
+        else:
+            candidates = np.flatnonzero(self._alive[:self._size])
+
+        # lexsort is stable and candidates are in row (insertion) order, so ties keep that order
+        order = np.lexsort([key[candidates] for key in reversed(keys)])
+        return [self._records[row] for row in candidates[order[:count]]]
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Insertion order
+        return (record for record in self._records if record is not None)
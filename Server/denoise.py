@@ -0,0 +1,140 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+# --- Spectral gating noise suppression (pure NumPy, works on 16 kHz buffers) ---
+
+N_FFT = 512  # 32 ms frames at 16 kHz
+HOP = N_FFT // 2
+# sqrt-Hann for both analysis and synthesis overlap-adds back to unity at 50% overlap
+WINDOW = np.sqrt(np.hanning(N_FFT + 1)[:-1]).astype(np.float32)
+
+NOISE_FRAME_FRACTION = 0.1  # Quietest share of frames used as the noise profile
+GATE_THRESHOLD = 1.5  # fast: keep bins at least this many times above the noise floor
+OVER_SUBTRACTION = 1.5  # full: how aggressively the noise power is subtracted
+GAIN_FLOOR = 0.1  # Never mute a bin completely (-20 dB); avoids "musical noise"
+FREQ_SMOOTH_BINS = 5  # full: gain smoothing across neighbouring bins
+TIME_SMOOTH_FRAMES = 3  # full: causal gain smoothing over the last few frames
+NOISE_HISTORY_FRAMES = 3 * 16000 // HOP  # Streaming: noise profile comes from the last ~3 s
+
+DENOISE_MODES = ("off", "fast", "full")
+DEFAULT_DENOISE_MODE = os.getenv("DENOISE_MODE", "fast")
+
+
+def estimate_noise_profile(magnitudes: np.ndarray) -> np.ndarray:
+    """
+    Estimates the per-bin noise magnitude as the mean spectrum of the
+    quietest frames. magnitudes has shape (frames, bins).
+    """
+    count = max(1, int(magnitudes.shape[0] * NOISE_FRAME_FRACTION))
+    energy = magnitudes.sum(axis=1)
+    quietest = np.argpartition(energy, count - 1)[:count]
+    return magnitudes[quietest].mean(axis=0)
+
+
+class SpectralGate:
+    """
+    STFT spectral gating that can run over a whole buffer or over a stream
+    of chunks. "fast" applies a hard gate against the noise floor; "full"
+    uses a soft spectral-subtraction gain smoothed over frequency and time.
+
+    Output lags input by HOP samples; call flush() at the end of a stream.
+    """
+
+    def __init__(self, mode: str = DEFAULT_DENOISE_MODE, noise_profile: Optional[np.ndarray] = None):
+        if mode not in ("fast", "full"):
+            raise ValueError(f"Unsupported denoise mode: {mode}")
+        self.mode = mode
+        self.noise = noise_profile
+        # A profile measured over the whole clip is kept as is; streams learn and track their own
+        self.adaptive = noise_profile is None
+        self._pending = np.zeros(HOP, dtype=np.float32)  # Leading pad so the first frame is complete
+        self._tail = np.zeros(HOP, dtype=np.float32)  # Second half of the previous output frame
+        self._gain_history: Optional[np.ndarray] = None
+        self._noise_history = np.zeros((0, N_FFT // 2 + 1), dtype=np.float32)
+        self._skip = HOP  # Output samples that belong to the leading pad
+
+    def _gains(self, magnitudes: np.ndarray) -> np.ndarray:
+        noise = self.noise[np.newaxis, :]
+        if self.mode == "fast":
+            return np.where(magnitudes > GATE_THRESHOLD * noise, 1.0, GAIN_FLOOR).astype(np.float32)
+
+        # Spectral subtraction gain, then smooth across frequency...
+        power_ratio = np.square(noise) / np.maximum(np.square(magnitudes), 1e-12)
+        gains = np.clip(1.0 - OVER_SUBTRACTION * power_ratio, GAIN_FLOOR, 1.0)
+        padded = np.pad(gains, ((0, 0), (FREQ_SMOOTH_BINS // 2, FREQ_SMOOTH_BINS // 2)), mode="edge")
+        gains = np.lib.stride_tricks.sliding_window_view(padded, FREQ_SMOOTH_BINS, axis=1).mean(axis=-1)
+
+        # ...and over the last few frames (causal, so streaming gives the same result)
+        if self._gain_history is None:
+            self._gain_history = np.repeat(gains[:1], TIME_SMOOTH_FRAMES - 1, axis=0)
+        stacked = np.concatenate([self._gain_history, gains])
+        self._gain_history = stacked[-(TIME_SMOOTH_FRAMES - 1):]
+        windows = np.lib.stride_tricks.sliding_window_view(stacked, TIME_SMOOTH_FRAMES, axis=0)
+        return windows.mean(axis=-1).astype(np.float32)
+
+    def _update_noise(self, magnitudes: np.ndarray) -> None:
+        if not self.adaptive:
+            return
+        # Same estimate as for whole clips, over a rolling window of recent frames
+        self._noise_history = np.concatenate([self._noise_history, magnitudes])[-NOISE_HISTORY_FRAMES:]
+        self.noise = estimate_noise_profile(self._noise_history)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Denoises the next chunk and returns every output sample that is complete.
+        """
+        self._pending = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+        if self._pending.size < N_FFT:
+            return np.zeros(0, dtype=np.float32)
+
+        frame_count = (self._pending.size - N_FFT) // HOP + 1
+        frames = np.lib.stride_tricks.sliding_window_view(self._pending, N_FFT)[::HOP][:frame_count]
+        spectrum = np.fft.rfft(frames * WINDOW, axis=1)
+        magnitudes = np.abs(spectrum)
+
+        self._update_noise(magnitudes)
+        output_frames = np.fft.irfft(spectrum * self._gains(magnitudes), n=N_FFT, axis=1) * WINDOW
+
+        # Overlap-add: each HOP block is the second half of one frame plus the first half of the next
+        first_halves, second_halves = output_frames[:, :HOP], output_frames[:, HOP:]
+        blocks = first_halves.copy()
+        blocks[0] += self._tail
+        blocks[1:] += second_halves[:-1]
+        self._tail = second_halves[-1].astype(np.float32)
+        self._pending = self._pending[frame_count * HOP:]
+
+        output = blocks.reshape(-1).astype(np.float32)
+        if self._skip:
+            skipped = min(self._skip, output.size)
+            output, self._skip = output[skipped:], self._skip - skipped
+        return output
+
+    def flush(self) -> np.ndarray:
+        """
+        Returns the samples still held back at the end of a stream.
+        """
+        remaining = self._pending.size - HOP
+        output = self.process(np.zeros(N_FFT, dtype=np.float32))
+        return output[:max(0, remaining) + HOP]
+
+
+def denoise_audio(samples: np.ndarray, mode: str = DEFAULT_DENOISE_MODE) -> np.ndarray:
+    """
+    Denoises a whole in-memory 16 kHz buffer and returns a buffer of the
+    same length. mode is one of DENOISE_MODES.
+    """
+    if mode not in DENOISE_MODES:
+        raise ValueError(f"Unsupported denoise mode: {mode}")
+    if mode == "off" or samples.size < N_FFT:
+        return samples
+
+    # With the whole clip available, take the noise profile from all of it up front
+    padded = np.pad(samples.astype(np.float32, copy=False), (HOP, HOP))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP]
+    noise = estimate_noise_profile(np.abs(np.fft.rfft(frames * WINDOW, axis=1)))
+
+    gate = SpectralGate(mode, noise_profile=noise)
+    output = np.concatenate([gate.process(samples), gate.flush()])
+    return output[:samples.size]
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from .observability import GEMINI_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration (override with environment variables) ---
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+# Point this at Server/benchmarks/mock_gemini.py to run offline
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "3"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "20"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_SECONDS = float(os.getenv("GEMINI_BACKOFF_SECONDS", "0.5"))
+GEMINI_MAX_BACKOFF_SECONDS = float(os.getenv("GEMINI_MAX_BACKOFF_SECONDS", "8"))
+# Calls in flight at once; the rest wait their turn instead of stampeding the API
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiNotConfigured(httpx.HTTPError):
+    """
+    Raised instead of calling the API when no GEMINI_API_KEY is set, so
+    callers treat it like any other failed call.
+    """
+
+
+class GeminiClient:
+    """
+    Async Gemini client that keeps one pooled HTTP/2 connection open across
+    requests, with explicit timeouts, jittered exponential backoff on
+    429/5xx and transport errors, and a cap on concurrent calls.
+    """
+
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL, base_url: str = GEMINI_BASE_URL,
+                 max_concurrency: int = GEMINI_MAX_CONCURRENCY, max_retries: int = GEMINI_MAX_RETRIES):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if not self.api_key:
+            raise GeminiNotConfigured("GEMINI_API_KEY is not set.")
+        # Created lazily so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(GEMINI_READ_TIMEOUT, connect=GEMINI_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=GEMINI_MAX_CONNECTIONS,
+                                    max_keepalive_connections=GEMINI_MAX_CONNECTIONS),
+                headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """
+        Honours Retry-After when the API sends one, otherwise uses
+        "full jitter" exponential backoff.
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), GEMINI_MAX_BACKOFF_SECONDS)
+        return random.uniform(0, min(GEMINI_MAX_BACKOFF_SECONDS, GEMINI_BACKOFF_SECONDS * 2 ** attempt))
+
+    async def generate_content(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Calls models/{model}:generateContent and returns the parsed JSON.
+        Raises httpx.HTTPError once retries are exhausted.
+        """
+        client = self._get_client()
+        url = f"{self.base_url}/models/{self.model}:generateContent"
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = await client.post(url, json=payload)
+                except httpx.TransportError:
+                    if last_attempt:
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                    logger.warning("Gemini API returned %d, retrying (attempt %d).", response.status_code, attempt + 1)
+                    GEMINI_RETRIES.inc(status=response.status_code)
+                    await asyncio.sleep(self._backoff(attempt, response))
+                    continue
+
+                response.raise_for_status()
+                return response.json()
+
+    async def stream_generate_content(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Calls models/{model}:streamGenerateContent over SSE and yields text
+        fragments as the model emits them. Retries only happen before the
+        first fragment, so nothing is ever sent twice.
+        """
+        client = self._get_client()
+        url = f"{self.base_url}/models/{self.model}:streamGenerateContent"
+        started = False
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    async with client.stream("POST", url, params={"alt": "sse"}, json=payload) as response:
+                        if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                            logger.warning("Gemini API returned %d, retrying (attempt %d).",
+                                           response.status_code, attempt + 1)
+                            GEMINI_RETRIES.inc(status=response.status_code)
+                            await asyncio.sleep(self._backoff(attempt, response))
+                            continue
+                        response.raise_for_status()
+
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = json.loads(line[len("data:"):])
+                            for candidate in data.get("candidates", [])[:1]:
+                                for part in candidate.get("content", {}).get("parts", []):
+                                    if part.get("text"):
+                                        started = True
+                                        yield part["text"]
+                        return
+                except httpx.TransportError:
+                    if last_attempt or started:
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from .knowledge_base import order_store, ride_store
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration (override with environment variables) ---
+# Lifetime of an ingested record unless it carries its own ttl_seconds (<= 0: never expires)
+INGEST_DEFAULT_TTL_SECONDS = float(os.getenv("INGEST_DEFAULT_TTL_SECONDS", "900"))
+# Records applied between yields to the event loop, so /chat keeps being served during big feeds
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+INGEST_EXPIRE_INTERVAL_SECONDS = float(os.getenv("INGEST_EXPIRE_INTERVAL_SECONDS", "5"))
+MAX_REPORTED_ERRORS = 20
+
+# Feed fields that control ingestion and are not stored with the record
+CONTROL_FIELDS = ("type", "ttl_seconds", "expires_at", "deleted")
+# Fields the knowledge base reads, with their types; a new record must have them all,
+# an update may send any subset. The stores rank on the numbers, so a "12" must not get in.
+NUMBER = "number"
+TEXT = "string"
+FIELD_TYPES = {
+    "order": {"pickup_location": TEXT, "delivery_location": TEXT, "reward": NUMBER, "time_estimate": NUMBER,
+              "traffic_condition": TEXT, "priority": TEXT},
+    "ride": {"pickup_location": TEXT, "destination": TEXT, "estimated_fare": NUMBER, "time_estimate": NUMBER,
+             "traffic_condition": TEXT, "passenger_rating": NUMBER},
+}
+REQUIRED_FIELDS = {kind: tuple(types) for kind, types in FIELD_TYPES.items()}
+
+
+def has_type(value: Any, expected: str) -> bool:
+    if expected == NUMBER:
+        # bool is an int subclass; NaN and infinities do not sort
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    return isinstance(value, str)
+
+
+def type_errors(kind: str, fields: Dict[str, Any]) -> List[str]:
+    """
+    Describes every known field of a feed record that has the wrong type.
+    """
+    return [
+        f"{name} must be a {expected}"
+        for name, expected in FIELD_TYPES.get(kind, {}).items()
+        if name in fields and not has_type(fields[name], expected)
+    ]
+
+
+class FeedIngestor:
+    """
+    Applies batches of order/ride records from a live feed to the stores.
+
+    Each record is an order (has "order_id") or a ride (has "ride_id"),
+    optionally with "type", "ttl_seconds", "expires_at" (epoch seconds) or
+    "deleted": true. A record for a known ID is merged into the stored one,
+    so a feed can send only the fields that changed; a field of the wrong
+    type rejects the whole record. Expiry times go on a min-heap; a
+    record's heap entry is ignored if the record was since refreshed or
+    removed, so expiring never scans the stores. Stores with tracks_expiry
+    (SQLite) keep the deadline with the record instead.
+    """
+
+    def __init__(self, stores: Dict[str, Any], default_ttl_seconds: float = INGEST_DEFAULT_TTL_SECONDS):
+        self.stores = stores
+        self.default_ttl_seconds = default_ttl_seconds
+        # (expires_at, kind, id); _expiry holds the current deadline per record
+        self._heap: List[Tuple[float, str, Any]] = []
+        self._expiry: Dict[Tuple[str, Any], float] = {}
+        self.expired_total = 0
+
+    def _kind(self, record: Dict[str, Any]) -> Optional[str]:
+        kind = record.get("type")
+        if kind in self.stores:
+            return kind
+        for kind, store in self.stores.items():
+            if store.id_field in record:
+                return kind
+        return None
+
+    def apply(self, record: Dict[str, Any], now: float, stats: Dict[str, Any]) -> None:
+        kind = self._kind(record) if isinstance(record, dict) else None
+        store = self.stores.get(kind)
+        if store is None or record.get(store.id_field) is None:
+            reject(stats, "no order_id/ride_id")
+            return
+        try:
+            self._apply(kind, store, record, now, stats)
+        except (TypeError, ValueError) as e:
+            reject(stats, str(e))
+
+    def _apply(self, kind: str, store: Any, record: Dict[str, Any], now: float, stats: Dict[str, Any]) -> None:
+
+        record_id = record[store.id_field]
+        if isinstance(record_id, bool) or not isinstance(record_id, (int, str)):
+            reject(stats, f"{store.id_field} must be an integer or a string")
+            return
+        if record.get("deleted"):
+            if store.remove(record_id):
+                stats["removed"] += 1
+            self._expiry.pop((kind, record_id), None)
+            return
+
+        if record.get("expires_at") is not None:
+            expires_at = float(record["expires_at"])
+        else:
+            ttl = record.get("ttl_seconds")
+            ttl = self.default_ttl_seconds if ttl is None else float(ttl)
+            expires_at = now + ttl if ttl > 0 else None
+
+        fields = {key: value for key, value in record.items() if key not in CONTROL_FIELDS}
+        # Checked before the store is touched: a bad value must not reach its indexes
+        errors = type_errors(kind, fields)
+        if errors:
+            reject(stats, f"{kind} {record_id}: {', '.join(errors)}")
+            return
+        existing = store.get(record_id)
+        if existing is not None:
+            fields = {**existing, **fields}
+        else:
+            missing = [name for name in REQUIRED_FIELDS.get(kind, ()) if name not in fields]
+            if missing:
+                reject(stats, f"new {kind} {record_id} is missing {', '.join(missing)}")
+                return
+        if getattr(store, "tracks_expiry", False):
+            # The deadline is stored with the record, where every worker sees it
+            store.upsert(fields, expires_at=expires_at)
+            stats["upserted"] += 1
+            return
+        store.upsert(fields)
+        stats["upserted"] += 1
+        if expires_at is None:
+            self._expiry.pop((kind, record_id), None)
+        else:
+            self._expiry[(kind, record_id)] = expires_at
+            heapq.heappush(self._heap, (expires_at, kind, record_id))
+
+    def ingest(self, records: Iterable[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Upserts/removes a batch of records and expires what is due, in one
+        go. Returns counts. From the event loop, large feeds should go
+        through ingest_feed instead.
+        """
+        now = time.time() if now is None else now
+        stats = new_stats()
+        for record in records:
+            stats["received"] += 1
+            self.apply(record, now, stats)
+        stats["expired"] = self.expire(now)
+        return stats
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Removes records whose deadline has passed. Costs O(log n) per
+        expired (or stale) heap entry; stores that track expiry themselves
+        delete theirs in one statement.
+        """
+        now = time.time() if now is None else now
+        expired = sum(store.expire(now) for store in self.stores.values() if getattr(store, "tracks_expiry", False))
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, kind, record_id = heapq.heappop(self._heap)
+            if self._expiry.get((kind, record_id)) != expires_at:
+                continue  # Refreshed, made permanent or removed since this entry was pushed
+            del self._expiry[(kind, record_id)]
+            if self.stores[kind].remove(record_id):
+                expired += 1
+        self.expired_total += expired
+        return expired
+
+    def pending(self) -> int:
+        tracked = sum(store.expiring() for store in self.stores.values() if getattr(store, "tracks_expiry", False))
+        return len(self._expiry) + tracked
+
+
+def new_stats() -> Dict[str, Any]:
+    return {"received": 0, "upserted": 0, "removed": 0, "rejected": 0, "expired": 0, "errors": []}
+
+
+def reject(stats: Dict[str, Any], reason: str) -> None:
+    stats["rejected"] += 1
+    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+        stats["errors"].append(f"Record {stats['received']}: {reason}.")
+
+
+feed_ingestor = FeedIngestor({"order": order_store, "ride": ride_store})
+# One feed is applied at a time; readers are never locked out
+_ingest_lock = asyncio.Lock()
+
+
+def ingest_records(records: Iterable[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Python entry point for feeds: upserts orders/rides (or removes those
+    marked "deleted") and expires stale ones.
+    """
+    return feed_ingestor.ingest(records, now)
+
+
+async def ingest_feed(body: AsyncIterator[bytes], chunk_size: int = INGEST_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Applies a JSON-lines feed as it streams in (one order or ride per line),
+    yielding to the event loop every `chunk_size` records so /chat requests
+    are served in between. Each record is applied atomically, so readers
+    never see a half-updated store.
+    """
+    async with _ingest_lock:
+        stats = new_stats()
+        pending = b""
+        applied = 0
+        async for data in body:
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            now = time.time()
+            for line in lines:
+                if not line.strip():
+                    continue
+                stats["received"] += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    reject(stats, f"invalid JSON ({e})")
+                    continue
+                feed_ingestor.apply(record, now, stats)
+                applied += 1
+                if applied % chunk_size == 0:
+                    await asyncio.sleep(0)
+                    now = time.time()
+        if pending.strip():
+            stats["received"] += 1
+            try:
+                feed_ingestor.apply(json.loads(pending), time.time(), stats)
+            except ValueError as e:
+                reject(stats, f"invalid JSON ({e})")
+        stats["expired"] = feed_ingestor.expire()
+        return stats
+
+
+async def expire_periodically(interval: float = INGEST_EXPIRE_INTERVAL_SECONDS) -> None:
+    """
+    Background task that drops expired orders/rides even when no feed is arriving.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = feed_ingestor.expire()
+        except Exception:
+            # Keep expiring on the next tick; the failing entry has already left the heap
+            logger.exception("Expiring live-feed records failed")
+            continue
+        if expired:
+            logger.info("Expired %d orders/rides from the live feed.", expired)
@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .intent_router import INTENT_RULES, PREFERENCES, PREFERENCE_INTENTS, Route
+from .reply_cache import normalize_message
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration (override with environment variables) ---
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "1") != "0"
+# Messages the classifier is less sure about than this still go to the LLM
+INTENT_CLASSIFIER_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.5"))
+# Accepting acts on the driver's behalf, so it needs a surer prediction
+INTENT_CLASSIFIER_ACCEPT_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_ACCEPT_THRESHOLD", "0.75"))
+INTENT_CORPUS_PATH = os.getenv(
+    "INTENT_CORPUS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_corpus.json")
+)
+
+# Label for corpus phrases that should go to the LLM
+OTHER_INTENT = "other"
+NGRAM_RANGE = (2, 4)
+TRAIN_EPOCHS = 300
+LEARNING_RATE = 2.0
+L2_PENALTY = 1e-4
+
+# Intents that act on one order/ride and need to know which
+ID_INTENTS = {"accept_ride", "ride_details", "accept_order", "order_details"}
+ACCEPT_INTENTS = {"accept_ride", "accept_order"}
+ORDINALS = {
+    "first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3,
+    "fourth": 4, "4th": 4, "fifth": 5, "5th": 5, "last": -1,
+}
+_ORDINAL = re.compile(r"\b(" + "|".join(ORDINALS) + r")\b")
+_NUMBER = re.compile(r"\b(\d+)\b")
+_DIGITS = re.compile(r"\d+")
+# "do not accept order 7", "I accepted the wrong order": about accepting, but not a request to
+_NOT_A_REQUEST = re.compile(
+    r"\b(?:not|no|never|cancel|undo|wrong|mistake|accepted|took|taken|grabbed)\b"
+    r"|\b(?:don|didn|won|wouldn|shouldn|can|couldn)['’]?t\b"
+)
+# Items of a get_suggested_orders/rides list, and the header of a details reply, per driver type
+_ID_NOUNS = {"delivery": "Order", "ride": "Ride"}
+_LISTED_ID = {driver_type: re.compile(rf"^- {noun} (\d+):", re.MULTILINE) for driver_type, noun in _ID_NOUNS.items()}
+_DETAILED_ID = {driver_type: re.compile(rf"^{noun} ID (\d+):", re.MULTILINE) for driver_type, noun in _ID_NOUNS.items()}
+
+
+class Prediction(NamedTuple):
+    intent: str
+    confidence: float
+
+
+def load_corpus(path: str = INTENT_CORPUS_PATH) -> Dict[str, List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def char_ngrams(message: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    """
+    Character n-grams of the normalized message, padded so word starts and
+    ends count. Digits collapse to "0": "order 7" and "order 12" look alike.
+    """
+    text = f" {_DIGITS.sub('0', normalize_message(message))} "
+    low, high = ngram_range
+    return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+
+class IntentClassifier:
+    """
+    Character n-gram TF-IDF features and a multinomial logistic regression,
+    trained with NumPy from a phrase corpus when the server starts (tens of
+    milliseconds). It catches paraphrases the IntentRouter rules miss ("got
+    any jobs near me", "take the second one"). Only intents the driver type
+    can use compete; a prediction below the threshold, or the "other"
+    label, leaves the message to the LLM. Accepting an order or ride
+    takes a surer prediction and is never done for a negated or past-tense
+    message.
+    """
+
+    def __init__(self, corpus: Dict[str, List[str]], threshold: float = INTENT_CLASSIFIER_THRESHOLD,
+                 accept_threshold: float = INTENT_CLASSIFIER_ACCEPT_THRESHOLD):
+        self.threshold = threshold
+        self.accept_threshold = accept_threshold
+        self.labels = sorted(corpus)
+        rule_driver_types = {rule.intent: rule.driver_type for rule in INTENT_RULES}
+        # driver_type -> label indexes that may compete for its messages
+        self._allowed: Dict[str, np.ndarray] = {}
+        for driver_type in set(rule_driver_types.values()):
+            self._allowed[driver_type] = np.array([
+                i for i, label in enumerate(self.labels)
+                if label == OTHER_INTENT or rule_driver_types.get(label) == driver_type
+            ])
+
+        phrases = [(phrase, i) for i, label in enumerate(self.labels) for phrase in corpus[label]]
+        self.vocabulary: Dict[str, int] = {}
+        for phrase, _ in phrases:
+            for gram in set(char_ngrams(phrase)):
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+        document_frequency = np.zeros(len(self.vocabulary))
+        for phrase, _ in phrases:
+            document_frequency[[self.vocabulary[gram] for gram in set(char_ngrams(phrase))]] += 1
+        # Smoothed IDF, as in scikit-learn's TfidfVectorizer
+        self.idf = np.log((1 + len(phrases)) / (1 + document_frequency)) + 1
+
+        features = np.stack([self.vectorize(phrase) for phrase, _ in phrases])
+        targets = np.zeros((len(phrases), len(self.labels)))
+        targets[np.arange(len(phrases)), [label for _, label in phrases]] = 1
+        self.weights, self.bias = self._train(features, targets)
+        # driver_type -> (weights, bias) of just its labels, for predict()
+        self._models = {
+            driver_type: (np.ascontiguousarray(self.weights[:, allowed]), self.bias[allowed])
+            for driver_type, allowed in self._allowed.items()
+        }
+
+    def features(self, message: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sparse sublinear TF-IDF vector, L2-normalized, as (indexes, values).
+        N-grams never seen in the corpus carry no weight and are dropped.
+        """
+        counts: Dict[int, int] = {}
+        for gram in char_ngrams(message):
+            index = self.vocabulary.get(gram)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        indexes = np.fromiter(counts, dtype=np.intp, count=len(counts))
+        values = (1 + np.log(np.fromiter(counts.values(), dtype=float, count=len(counts)))) * self.idf[indexes]
+        norm = np.linalg.norm(values)
+        return indexes, values / norm if norm else values
+
+    def vectorize(self, message: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        indexes, values = self.features(message)
+        vector[indexes] = values
+        return vector
+
+    @staticmethod
+    def _train(features: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Full-batch gradient descent on the softmax cross-entropy with an L2
+        penalty. Starting from zero, the weights stay a combination of the
+        training vectors (weights = features.T @ coefficients), so the steps
+        run on the small phrase-by-phrase Gram matrix instead of the n-gram
+        vocabulary: same result, a fraction of the work.
+        """
+        gram = features @ features.T
+        coefficients = np.zeros_like(targets)
+        bias = np.zeros(targets.shape[1])
+        for _ in range(TRAIN_EPOCHS):
+            probabilities = _softmax(gram @ coefficients + bias)
+            error = (probabilities - targets) / len(features)
+            coefficients -= LEARNING_RATE * (error + L2_PENALTY * coefficients)
+            bias -= LEARNING_RATE * error.sum(axis=0)
+        return features.T @ coefficients, bias
+
+    def predict(self, message: str, driver_type: str) -> Optional[Prediction]:
+        """
+        The most likely intent among those available to the driver type,
+        with its probability. None for driver types without intents.
+        """
+        model = self._models.get(driver_type)
+        if model is None:
+            return None
+        weights, bias = model
+        indexes, values = self.features(message)
+        probabilities = _softmax(values @ weights[indexes] + bias)
+        best = int(np.argmax(probabilities))
+        return Prediction(self.labels[self._allowed[driver_type][best]], float(probabilities[best]))
+
+    def route(self, message: str, driver_type: str,
+              chat_history: Optional[List[Dict[str, str]]] = None) -> Optional[Route]:
+        """
+        Same contract as IntentRouter.route: a Route with slots, or None when
+        the message should go to the LLM. Order/ride intents get their ID
+        from a number in the message, or from an ordinal ("the second one")
+        or "that one" resolved against the list or details the bot sent last.
+        """
+        prediction = self.predict(message, driver_type)
+        if prediction is None or prediction.intent == OTHER_INTENT or prediction.confidence < self.threshold:
+            return None
+        if prediction.intent in ACCEPT_INTENTS and (
+            prediction.confidence < self.accept_threshold or _NOT_A_REQUEST.search(message.lower())
+        ):
+            return None
+
+        slots: Dict[str, str] = {}
+        if prediction.intent in ID_INTENTS:
+            record_id = resolve_reference(message, driver_type, chat_history)
+            if record_id is None:
+                return None
+            slots["id"] = record_id
+        if prediction.intent in PREFERENCE_INTENTS:
+            message_lower = message.lower()
+            for preference, pattern in PREFERENCES[driver_type]:
+                if re.search(pattern, message_lower):
+                    slots["preference"] = preference
+                    break
+        return Route(prediction.intent, slots)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def resolve_reference(message: str, driver_type: str,
+                      chat_history: Optional[List[Dict[str, str]]]) -> Optional[str]:
+    """
+    The order/ride ID a message refers to: an explicit number, else the
+    n-th item of the list in the bot's last message, else the only ID that
+    message was about. Only orders count for delivery drivers and only
+    rides for ride drivers. None when it cannot be told.
+    """
+    number = _NUMBER.search(message)
+    if number:
+        return number.group(1)
+
+    last_bot_message = next(
+        (turn.get("text", "") for turn in reversed(chat_history or []) if turn.get("sender") == "bot"), ""
+    )
+    if driver_type not in _ID_NOUNS:
+        return None
+    listed = _LISTED_ID[driver_type].findall(last_bot_message)
+    ordinal = _ORDINAL.search(message.lower())
+    if ordinal:
+        position = ORDINALS[ordinal.group(1)]
+        if listed and position <= len(listed):
+            return listed[position - 1] if position > 0 else listed[-1]
+        return None
+
+    mentioned = listed or _DETAILED_ID[driver_type].findall(last_bot_message)
+    return mentioned[0] if len(mentioned) == 1 else None
+
+
+_intent_classifier: Optional[IntentClassifier] = None
+# Held while training, so concurrent callers never train twice
+_build_lock = threading.Lock()
+
+
+def get_intent_classifier(wait: bool = True) -> Optional[IntentClassifier]:
+    """
+    The shared classifier, trained once (the server's warm-up does it
+    before traffic arrives). With wait=False it never blocks: until the
+    training is done it returns None and starts it in a background thread,
+    so a request skips the classifier instead of training on the event
+    loop. None when INTENT_CLASSIFIER_ENABLED=0.
+    """
+    if _intent_classifier is not None or not INTENT_CLASSIFIER_ENABLED:
+        return _intent_classifier
+    if not wait:
+        if not _build_lock.locked():
+            threading.Thread(target=_build_in_background, name="intent-classifier", daemon=True).start()
+        return None
+    _build()
+    return _intent_classifier
+
+
+def _build() -> None:
+    global _intent_classifier
+    with _build_lock:
+        if _intent_classifier is None:
+            _intent_classifier = IntentClassifier(load_corpus())
+
+
+def _build_in_background() -> None:
+    try:
+        _build()
+    except Exception:
+        logger.exception("Training the intent classifier failed")
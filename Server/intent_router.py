@@ -0,0 +1,180 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# --- Declarative intent table ---
+# Rules are tried in order and the first match wins, exactly like the old
+# if/elif chain in ask_chatbot. A rule matches when ALL of its patterns are
+# found somewhere in the lowercased message. Named groups become slots.
+# Rules with requires_context only apply right after the bot asked the
+# driver what matters most to them (see asked_for_preference).
+# keywords are plain substrings at least one of which any match contains;
+# messages with none of them (most LLM-bound chatter) skip the regex
+# entirely. Keep them in sync with the patterns: the parity check in
+# Server/benchmarks/intent_router_benchmark.py catches drift.
+
+RIDE_TARGETS = r'(ride|rides|request|requests)'
+ORDER_TARGETS = r'(order|delivery)'
+
+
+class IntentRule(NamedTuple):
+    intent: str
+    driver_type: str
+    patterns: Tuple[str, ...]
+    keywords: Tuple[str, ...]
+    requires_context: bool = False
+
+
+class Route(NamedTuple):
+    intent: str
+    slots: Dict[str, str]
+
+
+# Preferences in priority order: the first one mentioned in this list wins
+PREFERENCES: Dict[str, List[Tuple[str, str]]] = {
+    'ride': [
+        ("fare", r'\b(fare|money|highest pay|most pay|more fare)\b'),
+        ("time", r'\b(time|quick|fast|shortest|less time|faster)\b'),
+        ("rating", r'\b(rating|passenger|high rating)\b'),
+    ],
+    'delivery': [
+        ("reward", r'\b(reward|money|highest pay|most pay|more reward)\b'),
+        ("time", r'\b(time|quick|fast|shortest|less time|faster)\b'),
+        ("traffic", r'\b(traffic|light traffic|easy drive|less traffic|minimal traffic)\b'),
+    ],
+}
+
+# Words in the bot's previous message showing it asked for a preference
+PREFERENCE_QUESTION_HINTS: Dict[str, Tuple[str, ...]] = {
+    'ride': ("ride requests", "highest fare"),
+    'delivery': ("delivery orders", "high reward"),
+}
+
+
+def _any_preference(driver_type: str) -> str:
+    return "|".join(f"(?:{pattern})" for _, pattern in PREFERENCES[driver_type])
+
+
+RIDE_PREFERENCE_KEYWORDS = ("fare", "money", "pay", "time", "quick", "fast", "shortest", "rating", "passenger")
+DELIVERY_PREFERENCE_KEYWORDS = ("reward", "money", "pay", "time", "quick", "fast", "shortest", "traffic", "easy drive")
+
+INTENT_RULES: List[IntentRule] = [
+    # --- Ride hailing ---
+    IntentRule("accept_ride", 'ride', (r'accept ride(?:\s*id)?[:#]?\s*(?P<id>\d+)',), ("accept ride",)),
+    IntentRule("reject_ride", 'ride', (r'\breject ride\b',), ("reject ride",)),
+    IntentRule("suggest_rides", 'ride', (rf'\b(suggest|recommend|available|any|offer|best|top|good)\b.*\b{RIDE_TARGETS}',), ("ride", "request")),
+    IntentRule("suggest_rides", 'ride', (r'\b(what|which)\b', rf'\b{RIDE_TARGETS}'), ("ride", "request")),
+    IntentRule("suggest_rides", 'ride', (rf'\bcheck\b.*\b{RIDE_TARGETS}\b',), ("ride", "request")),
+    IntentRule("ride_preference", 'ride', (_any_preference('ride'),), RIDE_PREFERENCE_KEYWORDS, requires_context=True),
+    IntentRule("ride_details", 'ride', (r'\b(ride|details for|info on)(?:\s*id)?[:#]?\s*(?P<id>\d+)',), ("ride", "details for", "info on")),
+
+    # --- Delivery orders ---
+    IntentRule("accept_order", 'delivery', (r'accept (?:delivery|order)(?:\s*id)?[:#]?\s*(?P<id>\d+)',), ("accept delivery", "accept order")),
+    IntentRule("suggest_orders", 'delivery', (rf'\b(best|top|good|suggest|recommend|available|any|offer)\b.*\b{ORDER_TARGETS}',), ("order", "deliver")),
+    IntentRule("suggest_orders", 'delivery', (r'\b(what|which)\b', r'\b(delivery|deliveries|order)'), ("order", "deliver")),
+    IntentRule("order_preference", 'delivery', (_any_preference('delivery'),), DELIVERY_PREFERENCE_KEYWORDS, requires_context=True),
+    IntentRule("order_details", 'delivery', (r'\b(delivery|order|details for|info on)(?:\s*id)?[:#]?\s*(?P<id>\d+)',), ("order", "deliver", "details for", "info on")),
+]
+
+_SLOT_GROUP = re.compile(r'\(\?P<(\w+)>')
+
+
+# Intents whose reply depends on the driver's stated preference
+PREFERENCE_INTENTS = {"suggest_rides", "ride_preference", "suggest_orders", "order_preference"}
+
+# rule group -> (intent, {slot: group}, [(preference, group)])
+RuleGroups = Dict[str, Tuple[str, Dict[str, str], List[Tuple[str, str]]]]
+
+
+def _compile_rules(rules: List[Tuple[int, IntentRule]]) -> Tuple["re.Pattern", RuleGroups]:
+    """
+    Compiles rules into one anchored pattern of lookahead alternatives.
+    Alternatives are tried in table order at position 0, so a single
+    match() call returns the highest-priority rule that applies. Each
+    lookahead starts with a lazy scan (dot-all only for the scan itself),
+    so it finds the same leftmost match re.search would, slots included.
+    Preference intents also pick up the preference in the same pass.
+    """
+    alternatives = []
+    groups: RuleGroups = {}
+    for index, rule in rules:
+        rule_group = f"r{index}"
+        slots: Dict[str, str] = {}
+
+        def rename(match: "re.Match") -> str:
+            slots[match.group(1)] = f"{rule_group}_{match.group(1)}"
+            return f"(?P<{slots[match.group(1)]}>"
+
+        pattern = "".join(f"(?=(?s:.*?)(?:{_SLOT_GROUP.sub(rename, p)}))" for p in rule.patterns)
+
+        preferences: List[Tuple[str, str]] = []
+        if rule.intent in PREFERENCE_INTENTS:
+            # Optional, and in priority order: the empty group of the first preference present is set
+            preferences = [(name, f"{rule_group}_pref_{name}") for name, _ in PREFERENCES[rule.driver_type]]
+            pattern += "(?:" + "|".join(
+                f"(?=(?s:.*?)(?:{p}))(?P<{group}>)"
+                for (_, p), (_, group) in zip(PREFERENCES[rule.driver_type], preferences)
+            ) + ")?"
+
+        alternatives.append(f"(?P<{rule_group}>{pattern})")
+        groups[rule_group] = (rule.intent, slots, preferences)
+    return re.compile("|".join(alternatives)), groups
+
+
+class IntentRouter:
+    """
+    Classifies a driver message in one regex pass per driver type, using
+    INTENT_RULES compiled once at startup. Returns the intent and its slots
+    (an "id", and a "preference" for suggestion/preference intents).
+    """
+
+    def __init__(self, rules: List[IntentRule] = INTENT_RULES):
+        # (driver_type, asked_preference) -> (keyword gate, rule pattern, groups)
+        self._matchers: Dict[Tuple[str, bool], Tuple["re.Pattern", "re.Pattern", RuleGroups]] = {}
+        for driver_type in {rule.driver_type for rule in rules}:
+            for with_context in (False, True):
+                applicable = [
+                    (i, rule) for i, rule in enumerate(rules)
+                    if rule.driver_type == driver_type and (with_context or not rule.requires_context)
+                ]
+                keywords = sorted({keyword for _, rule in applicable for keyword in rule.keywords})
+                gate = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+                self._matchers[(driver_type, with_context)] = (gate, *_compile_rules(applicable))
+
+    def route(self, message: str, driver_type: str, asked_preference: bool = False) -> Optional[Route]:
+        """
+        Returns the Route for a message, or None when no rule applies (the
+        message should go to the LLM).
+        """
+        compiled = self._matchers.get((driver_type, asked_preference))
+        if compiled is None:
+            return None
+        gate, pattern, groups = compiled
+        message_lower = message.lower()
+        if gate.search(message_lower) is None:
+            return None
+        match = pattern.match(message_lower)
+        if match is None:
+            return None
+
+        intent, slot_groups, preferences = groups[match.lastgroup]
+        slots = {slot: match.group(group) for slot, group in slot_groups.items()}
+        for preference, group in preferences:
+            if match.group(group) is not None:
+                slots["preference"] = preference
+                break
+        return Route(intent, slots)
+
+
+def asked_for_preference(driver_type: str, chat_history: Optional[List[Dict[str, str]]]) -> bool:
+    """
+    True when the bot's last message asked the driver what matters most
+    (fare/reward, time, ...), so a bare "the fastest one" is a preference.
+    """
+    if not chat_history or chat_history[-1].get('sender') != 'bot':
+        return False
+    last_bot_message = chat_history[-1].get('text', '').lower()
+    hints = PREFERENCE_QUESTION_HINTS.get(driver_type, ())
+    return "what's most important" in last_bot_message and any(hint in last_bot_message for hint in hints)
+
+
+intent_router = IntentRouter()
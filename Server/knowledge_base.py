@@ -1,5 +1,22 @@
+import logging
+import os
 import re
-from typing import Dict, List, Any
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from .columnar_store import ColumnarRecordStore
+from .record_store import RecordStore
+from .sqlite_store import SQLiteDatabase, SQLiteRecordStore
+
+logger = logging.getLogger(__name__)
+
+# "memory": each worker keeps its own copy, seeded from KNOWLEDGE_BASE below.
+# "sqlite": orders, rides and the knowledge-base sections live in KB_SQLITE_PATH,
+# shared by all workers and kept across restarts (seeded from KNOWLEDGE_BASE once).
+KB_BACKEND = os.getenv("KB_BACKEND", "memory")
+KB_SQLITE_PATH = os.getenv("KB_SQLITE_PATH", "knowledge_base.db")
 
 # Knowledge Base
 KNOWLEDGE_BASE: Dict[str, Any] = {
@@ -69,7 +86,76 @@ KNOWLEDGE_BASE: Dict[str, Any] = {
     ]
 }
 
+# Sections kept in the SQLite kv table in "sqlite" mode (orders/rides have their own tables)
+KB_SECTIONS = ("general_info", "faqs", "conversation_guidelines")
+
+# Bumped on every knowledge-base change; caches include it in their keys
+_knowledge_base_version = 0
+# driver_type -> (version, context), rebuilt only after the knowledge base changes
+_context_cache: Dict[str, Tuple[int, str]] = {}
+
+kb_database = SQLiteDatabase(KB_SQLITE_PATH) if KB_BACKEND == "sqlite" else None
+
+def _sync_from_database() -> None:
+    """
+    In "sqlite" mode, reloads the sections into KNOWLEDGE_BASE when another
+    worker (or a restart) has a newer version than this process last saw.
+    """
+    global _knowledge_base_version
+    version = kb_database.get_meta("kb_version", 0)
+    if version != _knowledge_base_version:
+        KNOWLEDGE_BASE.update(kb_database.load_sections())
+        _knowledge_base_version = version
+        _context_cache.clear()
+
+def get_knowledge_base_version() -> int:
+    if kb_database is not None:
+        _sync_from_database()
+    return _knowledge_base_version
+
+def bump_knowledge_base_version() -> int:
+    """
+    Marks the knowledge base as changed. Call after editing KNOWLEDGE_BASE
+    directly so cached replies and prompt context built from the old data
+    are not served.
+    """
+    global _knowledge_base_version
+    if kb_database is not None:
+        with kb_database.transaction():
+            version = kb_database.get_meta("kb_version", 0) + 1
+            kb_database.set_meta("kb_version", version)
+        _sync_from_database()
+        return _knowledge_base_version
+    _knowledge_base_version += 1
+    _context_cache.clear()
+    return _knowledge_base_version
+
+if kb_database is not None:
+    with kb_database.transaction():
+        if kb_database.claim_seed("kv"):
+            for section in KB_SECTIONS:
+                for key, value in KNOWLEDGE_BASE[section].items():
+                    kb_database.set_section_key(section, key, value)
+            kb_database.set_meta("kb_version", 1)
+    _sync_from_database()
+
 def get_knowledge_base_context(driver_type: str) -> str:
+    """
+    Returns the knowledge base context for a driver type, formatted once per
+    knowledge-base version instead of on every request.
+    """
+    if driver_type not in ('ride', 'delivery'):
+        # Unknown types get the generic context; don't let arbitrary input grow the cache
+        driver_type = ''
+    version = get_knowledge_base_version()
+    cached = _context_cache.get(driver_type)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    context = build_knowledge_base_context(driver_type)
+    _context_cache[driver_type] = (version, context)
+    return context
+
+def build_knowledge_base_context(driver_type: str) -> str:
     """
     Formats the relevant knowledge base sections into a string context 
     based on the driver type ('ride' or 'delivery').
@@ -120,6 +206,24 @@ def get_knowledge_base_context(driver_type: str) -> str:
 
     return context
 
+# Commands the chatbot answers locally, used to bias speech recognition toward them
+VOICE_COMMANDS = [
+    "accept ride", "reject ride", "suggest a ride", "check rides", "details for ride",
+    "accept order", "accept delivery", "suggest a delivery order", "best order", "details for order",
+    "highest fare", "highest reward", "shortest time", "light traffic", "passenger rating",
+]
+MAX_PROMPT_IDS = 20  # Keep the prompt well inside Whisper's prompt budget
+
+def get_voice_command_prompt() -> str:
+    """
+    Builds a short Whisper prompt with the voice commands and current
+    order/ride IDs, so a small model leans toward what drivers actually say.
+    """
+    ride_ids = [str(r["ride_id"]) for r in islice(ride_store, MAX_PROMPT_IDS)]
+    order_ids = [str(o["order_id"]) for o in islice(order_store, MAX_PROMPT_IDS)]
+    commands = ", ".join(command.capitalize() for command in VOICE_COMMANDS)
+    return f"{commands}. Ride {', '.join(ride_ids)}. Order {', '.join(order_ids)}."
+
 def get_conversation_guideline(key: str) -> str:
     """
     Retrieves a specific conversation guideline.
@@ -133,7 +237,14 @@ def update_knowledge_base(category: str, key: str, value: str) -> bool:
     try:
         if category in KNOWLEDGE_BASE:
             if isinstance(KNOWLEDGE_BASE[category], dict):
+                if kb_database is not None and category in KB_SECTIONS:
+                    # Persisted, and picked up by the other workers through the version
+                    with kb_database.transaction():
+                        kb_database.set_section_key(category, key, value)
+                        bump_knowledge_base_version()
+                    return True
                 KNOWLEDGE_BASE[category][key] = value
+                bump_knowledge_base_version()
                 return True
         return False
     except Exception:
@@ -156,24 +267,102 @@ def calculate_order_score(order: dict) -> float:
     return round(score, 2)
 
 
-def get_best_order() -> str:
+# --- Indexed order/ride stores ---
+# KNOWLEDGE_BASE["orders"] / ["ride_requests"] are only the seed data: live
+# orders and rides are added, changed and removed through these stores.
+
+TRAFFIC_SORT_ORDER = {"light": 0, "moderate": 1, "heavy": 2}
+
+# Smaller keys rank first; ties keep insertion order, like the stable sorts they replace
+ORDER_RANKINGS = {
+    "reward": lambda o, c: (-o.get("reward", 0),),
+    "time": lambda o, c: (o.get("time_estimate", float('inf')),),
+    "traffic": lambda o, c: (TRAFFIC_SORT_ORDER.get(o.get("traffic_condition", "heavy"), 2),),
+    "score": lambda o, c: (-c["score"],),
+}
+RIDE_RANKINGS = {
+    "fare": lambda r, c: (-r.get("estimated_fare", 0),),
+    "time": lambda r, c: (r.get("time_estimate", float('inf')),),
+    "rating": lambda r, c: (-r.get("passenger_rating", 0),),
+    "default": lambda r, c: (-r.get("estimated_fare", 0), -r.get("passenger_rating", 0)),
+}
+
+# Columnar layout for the same rankings: numeric fields as NumPy columns,
+# the score as one vectorized expression, top-k by argpartition
+TRAFFIC_POINTS = {"light": 3, "moderate": 2, "heavy": 1}
+PRIORITY_POINTS = {"high": 2, "medium": 1, "low": 0}
+
+ORDER_COLUMNS = {
+    "reward": lambda o: o.get("reward", 0),
+    "time_estimate": lambda o: o.get("time_estimate", float('inf')),
+    "traffic_rank": lambda o: TRAFFIC_SORT_ORDER.get(o.get("traffic_condition", "heavy"), 2),
+    "traffic_points": lambda o: TRAFFIC_POINTS.get(o.get("traffic_condition", "moderate"), 2),
+    "priority_points": lambda o: PRIORITY_POINTS.get(o.get("priority", "medium"), 1),
+}
+ORDER_COLUMN_RANKINGS = {
+    "reward": [("reward", True)],
+    "time": [("time_estimate", False)],
+    "traffic": [("traffic_rank", False)],
+    "score": [("score", True)],
+}
+RIDE_COLUMNS = {
+    "estimated_fare": lambda r: r.get("estimated_fare", 0),
+    "time_estimate": lambda r: r.get("time_estimate", float('inf')),
+    "passenger_rating": lambda r: r.get("passenger_rating", 0),
+}
+RIDE_COLUMN_RANKINGS = {
+    "fare": [("estimated_fare", True)],
+    "time": [("time_estimate", False)],
+    "rating": [("passenger_rating", True)],
+    "default": [("estimated_fare", True), ("passenger_rating", True)],
+}
+
+def score_order_columns(columns: Dict[str, np.ndarray]) -> np.ndarray:
     """
-    Finds the order with the highest score and returns a recommendation.
+    calculate_order_score for a whole column set at once.
     """
-    best_order = None
-    highest_score = float('-inf')
+    time = np.where(np.isinf(columns["time_estimate"]), 0, columns["time_estimate"])
+    reward_score = (columns["reward"] / 15) * 10
+    time_penalty = np.minimum(time / 5, 5)
+    return np.round(columns["traffic_points"] + columns["priority_points"] + reward_score - time_penalty, 2)
+
+# "indexed" keeps sorted rankings (O(k) top-k, best for frequent queries);
+# "columnar" uses NumPy columns (fast bulk loads/updates, O(n) top-k);
+# "sqlite" is selected by KB_BACKEND=sqlite
+ORDER_STORE_BACKEND = "sqlite" if KB_BACKEND == "sqlite" else os.getenv("ORDER_STORE_BACKEND", "indexed")
+
+def create_stores(orders: List[Dict[str, Any]], rides: List[Dict[str, Any]], backend: str = ORDER_STORE_BACKEND,
+                  database: Optional[SQLiteDatabase] = None):
+    if backend == "sqlite":
+        # Seeded with orders/rides only the first time the database is created
+        database = database or kb_database or SQLiteDatabase(KB_SQLITE_PATH)
+        return (
+            SQLiteRecordStore(database, "orders", "order_id", ORDER_COLUMNS, ORDER_COLUMN_RANKINGS,
+                              computed={"score": calculate_order_score}, records=orders),
+            SQLiteRecordStore(database, "ride_requests", "ride_id", RIDE_COLUMNS, RIDE_COLUMN_RANKINGS,
+                              records=rides),
+        )
+    if backend == "columnar":
+        return (
+            ColumnarRecordStore("order_id", ORDER_COLUMNS, ORDER_COLUMN_RANKINGS,
+                                computed={"score": score_order_columns}, records=orders),
+            ColumnarRecordStore("ride_id", RIDE_COLUMNS, RIDE_COLUMN_RANKINGS, records=rides),
+        )
+    return (
+        RecordStore("order_id", ORDER_RANKINGS, computed={"score": calculate_order_score}, records=orders),
+        RecordStore("ride_id", RIDE_RANKINGS, records=rides),
+    )
 
-    for order in KNOWLEDGE_BASE["orders"]:
-        score = calculate_order_score(order)
-        if score > highest_score:
-            highest_score = score
-            best_order = order
+order_store, ride_store = create_stores(KNOWLEDGE_BASE["orders"], KNOWLEDGE_BASE.get("ride_requests", []))
 
-        """
-        return f"Best Order ID: {best_order['order_id']}\nPickup: {best_order['pickup_location']} → Delivery: {best_order['delivery_location']}"
-        """
 
-    
+def get_best_order() -> str:
+    """
+    Finds the order with the highest score and returns a recommendation.
+    """
+    top = order_store.top("score", 1)
+    best_order = top[0] if top else None
+
     if best_order:
         recommendation = get_order_recommendation(best_order["order_id"])
         return (
@@ -193,19 +382,15 @@ def get_order_recommendation(order_id: int) -> str:
     """
     Provides a recommendation based on the order's score.
     """
-    print(f"Hello1")
-
     # Retrieve the order from the knowledge base
-    order = next((order for order in KNOWLEDGE_BASE["orders"] if order["order_id"] == order_id), None)
-
-    # Debug: Print out the retrieved order
-    print(f"Debug1 — Retrieved order for ID {order_id}: {order}")
+    order = order_store.get(order_id)
+    logger.debug("Retrieved order for ID %s: %s", order_id, order)
     
     if not order:
         return "Order not found."
     
-    # Calculate the order score
-    score = calculate_order_score(order)
+    # Score cached by the store when the order was added/changed
+    score = order_store.computed(order_id, "score")
 
     # Common info to include in all responses
     info = (
@@ -234,31 +419,26 @@ def get_suggested_orders(preference: str, count: int = 3) -> str:
     Sorts orders based on preference and returns a concise, comparative list 
     of top orders.
     """
-    orders = KNOWLEDGE_BASE["orders"]
-    if not orders:
-        return "No orders available right now."
-
-    # --- Sorting Logic (remains the same) ---
-    sorted_orders = []
+    # --- Ranking lookup (kept sorted by the store) ---
     pref_desc = ""
     if preference == "reward":
-        sorted_orders = sorted(orders, key=lambda o: o.get("reward", 0), reverse=True)
+        ranking = "reward"
         pref_desc = "highest reward"
     elif preference == "time":
-        sorted_orders = sorted(orders, key=lambda o: o.get("time_estimate", float('inf')))
+        ranking = "time"
         pref_desc = "shortest time"
     elif preference == "traffic":
-        traffic_sort_map = {"light": 0, "moderate": 1, "heavy": 2}
-        sorted_orders = sorted(orders, key=lambda o: traffic_sort_map.get(o.get("traffic_condition", "heavy"), 2))
+        ranking = "traffic"
         pref_desc = "lightest traffic"
     else:
-        sorted_orders = sorted(orders, key=calculate_order_score, reverse=True)
+        ranking = "score"
         pref_desc = "best overall score"
 
-    top_orders = sorted_orders[:count]
+    top_orders = order_store.top(ranking, count)
 
     if not top_orders:
-        return "Couldn't find orders matching that preference."
+        # Only when the store is empty; no separate length check (a COUNT(*) in SQLite mode)
+        return "No orders available right now."
 
     # --- Build Comparative Response --- 
     response = f"Okay, prioritizing {pref_desc}. Here are the top options:\n"
@@ -284,8 +464,8 @@ def get_suggested_orders(preference: str, count: int = 3) -> str:
             elif preference == "time":
                 if time > prev_order['time_estimate']: response += f" (Takes a bit longer than Order {prev_order['order_id']})"
             elif preference == "traffic":
-                 prev_traffic_val = traffic_sort_map.get(prev_order['traffic_condition'], 2)
-                 curr_traffic_val = traffic_sort_map.get(traffic, 2)
+                 prev_traffic_val = TRAFFIC_SORT_ORDER.get(prev_order['traffic_condition'], 2)
+                 curr_traffic_val = TRAFFIC_SORT_ORDER.get(traffic, 2)
                  if curr_traffic_val > prev_traffic_val: response += f" (Slightly heavier traffic than Order {prev_order['order_id']})"
         # Add more comparisons if needed
         response += "\n" # Newline for next order
@@ -300,7 +480,7 @@ def get_ride_request_details(ride_id: int) -> str:
     """
     Provides details for a specific ride request.
     """
-    ride = next((r for r in KNOWLEDGE_BASE.get("ride_requests", []) if r["ride_id"] == ride_id), None)
+    ride = ride_store.get(ride_id)
     
     if not ride:
         return "Ride request not found."
@@ -329,31 +509,25 @@ def get_suggested_rides(preference: str, count: int = 3) -> str:
     Sorts ride requests based on preference and returns a concise, comparative list 
     of top rides.
     """
-    rides = KNOWLEDGE_BASE.get("ride_requests", [])
-    if not rides:
-        return "No ride requests available right now."
-
-    # --- Sorting Logic for Rides ---
-    sorted_rides = []
+    # --- Ranking lookup (kept sorted by the store) ---
     pref_desc = ""
     if preference == "fare":
-        sorted_rides = sorted(rides, key=lambda r: r.get("estimated_fare", 0), reverse=True)
+        ranking = "fare"
         pref_desc = "highest fare"
     elif preference == "time":
-        sorted_rides = sorted(rides, key=lambda r: r.get("time_estimate", float('inf')))
+        ranking = "time"
         pref_desc = "shortest time"
     elif preference == "rating":
-        sorted_rides = sorted(rides, key=lambda r: r.get("passenger_rating", 0), reverse=True)
+        ranking = "rating"
         pref_desc = "highest passenger rating"
-    else: # Default to a balanced score (e.g., fare/time * rating?)
-        # Simple default: fare first, then rating
-        sorted_rides = sorted(rides, key=lambda r: (r.get('estimated_fare', 0), r.get('passenger_rating', 0)), reverse=True)
+    else: # Default: fare first, then rating
+        ranking = "default"
         pref_desc = "best overall (fare & rating)"
 
-    top_rides = sorted_rides[:count]
+    top_rides = ride_store.top(ranking, count)
 
     if not top_rides:
-        return "Couldn't find rides matching that preference."
+        return "No ride requests available right now."
 
     # --- Build Comparative Response --- 
     response = f"Okay, prioritizing rides with {pref_desc}. Here are the top options:\n"
@@ -0,0 +1,69 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# --- Configuration (override with environment variables) ---
+# How long a detected language is trusted for one driver/session
+LANGUAGE_CACHE_TTL_SECONDS = float(os.getenv("LANGUAGE_CACHE_TTL_SECONDS", str(4 * 60 * 60)))
+# Detections less certain than this are not remembered
+LANGUAGE_MIN_PROBABILITY = float(os.getenv("LANGUAGE_MIN_PROBABILITY", "0.7"))
+# A decode with the cached language scoring below this triggers a fresh detection next time
+LANGUAGE_REDETECT_LOGPROB = float(os.getenv("LANGUAGE_REDETECT_LOGPROB", "-1.0"))
+LANGUAGE_CACHE_MAX_ENTRIES = int(os.getenv("LANGUAGE_CACHE_MAX_ENTRIES", "10000"))
+
+
+class LanguageCache:
+    """
+    Remembers the spoken language per driver/session so later requests can
+    skip Whisper's language-identification pass. Entries expire after a TTL,
+    and are dropped as soon as decoding with the cached language looks poor
+    (e.g. the driver switched language). Oldest entries are evicted first.
+    """
+
+    def __init__(self, ttl_seconds: float = LANGUAGE_CACHE_TTL_SECONDS,
+                 min_probability: float = LANGUAGE_MIN_PROBABILITY,
+                 redetect_logprob: float = LANGUAGE_REDETECT_LOGPROB,
+                 max_entries: int = LANGUAGE_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.min_probability = min_probability
+        self.redetect_logprob = redetect_logprob
+        self.max_entries = max_entries
+        # key -> (language, probability, expires_at)
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """
+        Returns the cached language for a driver/session, if still valid.
+        """
+        if not key or key not in self._entries:
+            return None
+        language, _, expires_at = self._entries[key]
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return language
+
+    def record(self, key: Optional[str], result: Dict[str, Any], used_cached: bool) -> None:
+        """
+        Updates the cache from a transcription result: stores a confident
+        detection, or invalidates a cached language that decoded badly.
+        """
+        if not key:
+            return
+        if used_cached:
+            logprob = result.get("avg_logprob")
+            if logprob is not None and logprob < self.redetect_logprob:
+                self._entries.pop(key, None)
+            return
+
+        language, probability = result.get("language"), result.get("language_probability")
+        if language and probability is not None and probability >= self.min_probability:
+            self._entries[key] = (language, probability, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
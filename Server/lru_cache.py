@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class SingleFlightLRUCache(Generic[V]):
+    """
+    LRU cache bounded by an entry count and/or a byte budget, with an
+    optional TTL. get_or_compute() is single-flight: concurrent callers
+    with the same key share one compute(), which runs as its own task so
+    callers that go away do not cancel it for the rest. Failures and None
+    results are not cached.
+
+    Subclasses size entries (entry_size) and can count lookups elsewhere
+    too (count), e.g. in Prometheus.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, enabled: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # key -> (value, size in bytes, expires_at or None); wall-clock time so entries can be persisted
+        self._entries: "OrderedDict[str, Tuple[V, int, Optional[float]]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def entry_size(self, key: str, value: V) -> int:
+        return 0
+
+    def count(self, outcome: str) -> None:
+        """
+        Records a lookup outcome: "hit", "miss" or "coalesced".
+        """
+        if outcome == "hit":
+            self.hits += 1
+        elif outcome == "miss":
+            self.misses += 1
+        else:
+            self.coalesced += 1
+
+    def get(self, key: str) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._entries[key]
+            self.bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: V, expires_at: Optional[float] = None) -> None:
+        """
+        Stores a value (expiring after the TTL unless expires_at is given)
+        and evicts least recently used entries past the limits.
+        """
+        if not self.enabled:
+            return
+        size = self.entry_size(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if expires_at is None and self.ttl_seconds is not None:
+            expires_at = time.time() + self.ttl_seconds
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._entries[key] = (value, size, expires_at)
+        self.bytes += size
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def lookup(self, key: str) -> Optional[V]:
+        """
+        get() that counts towards the hit-rate metrics, for callers that
+        fill the cache themselves with put() (e.g. streamed replies).
+        """
+        if not self.enabled:
+            return None
+        value = self.get(key)
+        self.count("miss" if value is None else "hit")
+        return value
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[V]]]) -> Optional[V]:
+        """
+        Returns the cached value, or awaits compute() once for all
+        concurrent callers with the same key.
+        """
+        if not self.enabled:
+            return await compute()
+
+        value = self.get(key)
+        if value is not None:
+            self.count("hit")
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.count("coalesced")
+        else:
+            self.count("miss")
+            task = asyncio.get_running_loop().create_task(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded: the first caller going away must not cancel the work the others wait on
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        if task.cancelled():
+            return
+        # Retrieved here so a failure nobody is still waiting for is not logged as unhandled
+        if task.exception() is None and task.result() is not None:
+            self.put(key, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "evictions": self.evictions,
+            # Share of lookups answered without computing again
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,267 @@
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import logging.handlers
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# --- Configuration (override with environment variables) ---
+# DEBUG adds per-lookup detail; WARNING drops the per-request timing lines
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Seconds; spans a cached local reply (~1 ms) to a long transcription (~30 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Set per request by RequestMetricsMiddleware; asyncio tasks inherit them
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+_stage_timings_var: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+
+logger = logging.getLogger(__name__)
+
+
+# --- Prometheus metrics ---
+
+INF_BUCKET = 'le="+Inf"'
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):  # Larger values only count toward +Inf
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, INF_BUCKET)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format registry (no client library needed).
+    Metrics are per process: with several uvicorn workers, Prometheus
+    scrapes whichever worker answers, so run one worker per scrape target
+    or aggregate in the query.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ["method", "route", "status"],
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds",
+    "Time spent per processing stage (upload_read, decode, denoise, vad, whisper_encode, whisper_decode, "
+    "whisper_fallback, transcribe_queue, intent_routing, intent_classifier, kb_lookup, prompt_build, gemini).",
+    ["stage"],
+)
+CHAT_REPLIES = registry.counter("chat_replies_total", "Chat replies by where they came from.", ["source"])
+INTENT_ROUTES = registry.counter(
+    "intent_routes_total", "Chat messages by what recognised the intent: rule, classifier or none (LLM fallback).", ["via"]
+)
+TRANSCRIPTION_CACHE_LOOKUPS = registry.counter(
+    "transcription_cache_lookups_total", "Uploads by transcription cache outcome (hit, miss, coalesced).", ["result"]
+)
+STARTUP_SECONDS = registry.histogram(
+    "startup_duration_seconds", "Process startup phases (import, warm_up, ready), observed once per process.", ["phase"]
+)
+PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "Tokens per Gemini prompt (Gemini's count when it reports one, else an estimate).",
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 4096, 8192),
+)
+GEMINI_RETRIES = registry.counter("gemini_retries_total", "Gemini calls retried after a retryable status.",
+                                  ["status"])
+
+
+# --- Stage timing ---
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Adds a stage duration to the histogram and to the current request's timings.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _stage_timings_var.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+# --- Request IDs and logging ---
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+# Writes the queued Server.* log records; started by configure_logging
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Sends the Server.* loggers to stderr, tagged with the request ID. The
+    event loop only puts records on a queue; a listener thread formats and
+    writes them, so a slow or blocked stderr never stalls requests.
+    """
+    global _log_listener
+    root = logging.getLogger("Server")
+    if any(isinstance(f, RequestIdFilter) for handler in root.handlers for f in handler.filters):
+        return
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    # On the queue side: the request ID lives in a contextvar of the logging task, not of the listener thread
+    queue_handler.addFilter(RequestIdFilter())
+    _log_listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _log_listener.start()
+    # Flush what is still queued on shutdown
+    atexit.register(_log_listener.stop)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: gives each request an ID (the client's X-Request-ID,
+    or a new one), echoes it in the response, records the request duration
+    up to the last body byte (so streamed responses count in full), and
+    logs one line with the per-stage timings.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        timings: Dict[str, float] = {}
+        timings_token = _stage_timings_var.set(timings)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            # The matched route template, so /chat/session/{session_id} is one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "method": scope["method"], "route": route, "status": status,
+                    "total_ms": round(elapsed * 1000, 2),
+                    "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+                }))
+            _stage_timings_var.reset(timings_token)
+            request_id_var.reset(id_token)
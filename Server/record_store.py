@@ -0,0 +1,124 @@
+import bisect
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# A ranking key maps (record, computed values) to a sort key; smaller sorts first
+RankingKey = Callable[[Dict[str, Any], Dict[str, Any]], Tuple]
+
+
+class RecordStore:
+    """
+    Keeps records (orders, ride requests) indexed by ID, with derived values
+    such as the order score computed once per change, and one sorted index
+    per ranking. Inserts, updates and removals adjust the indexes with a
+    binary search, so a top-k query is a slice instead of a full sort.
+
+    Ties keep insertion order (like a stable sort over the original list):
+    each index entry is (key, sequence, id), and an update keeps the
+    record's sequence number.
+    """
+
+    def __init__(self, id_field: str, rankings: Dict[str, RankingKey],
+                 computed: Optional[Dict[str, Callable[[Dict[str, Any]], Any]]] = None,
+                 records: Optional[List[Dict[str, Any]]] = None):
+        self.id_field = id_field
+        self._ranking_keys = rankings
+        self._computed_fns = computed or {}
+        self._records: Dict[Any, Dict[str, Any]] = {}
+        self._computed: Dict[Any, Dict[str, Any]] = {}
+        self._seq: Dict[Any, int] = {}
+        self._entries: Dict[Any, Dict[str, Tuple]] = {}
+        self._indexes: Dict[str, List[Tuple]] = {name: [] for name in rankings}
+        self._next_seq = 0
+        if records:
+            self.load(records)
+
+    def load(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Bulk-loads records. Into an empty store this sorts each index once
+        rather than inserting one by one.
+        """
+        if self._records:
+            for record in records:
+                self.upsert(record)
+            return
+
+        # A repeated ID replaces the earlier record but keeps its position
+        latest = {record[self.id_field]: record for record in records}
+        # Every key first, so a bad record fails the load without leaving it half done
+        prepared = [(record_id, record, *self._keys(record)) for record_id, record in latest.items()]
+        for record_id, record, computed, keys in prepared:
+            self._seq[record_id] = self._next_seq
+            self._next_seq += 1
+            self._index(record_id, record, computed, keys, keep_sorted=False)
+        for index in self._indexes.values():
+            index.sort()
+
+    def _keys(self, record: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Tuple]]:
+        """
+        The computed values and the sort key of every ranking for a record.
+        Raises (e.g. TypeError for a mistyped field) before anything in the
+        store has been touched.
+        """
+        computed = {name: fn(record) for name, fn in self._computed_fns.items()}
+        keys = {name: key(record, computed) for name, key in self._ranking_keys.items()}
+        return computed, keys
+
+    def _index(self, record_id: Any, record: Dict[str, Any], computed: Dict[str, Any],
+               keys: Dict[str, Tuple], keep_sorted: bool = True) -> None:
+        self._records[record_id] = record
+        self._computed[record_id] = computed
+        entries = {}
+        for name, key in keys.items():
+            entry = (key, self._seq[record_id], record_id)
+            if keep_sorted:
+                bisect.insort(self._indexes[name], entry)
+            else:
+                self._indexes[name].append(entry)
+            entries[name] = entry
+        self._entries[record_id] = entries
+
+    def _unindex(self, record_id: Any) -> None:
+        for name, entry in self._entries.pop(record_id).items():
+            index = self._indexes[name]
+            del index[bisect.bisect_left(index, entry)]
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """
+        Inserts a record, or replaces the one with the same ID (keeping its
+        place among ties). All-or-nothing: a record whose keys cannot be
+        computed raises and leaves the store as it was.
+        """
+        record_id = record[self.id_field]
+        computed, keys = self._keys(record)
+        if record_id in self._records:
+            self._unindex(record_id)
+        else:
+            self._seq[record_id] = self._next_seq
+            self._next_seq += 1
+
+        self._index(record_id, record, computed, keys)
+
+    def remove(self, record_id: Any) -> bool:
+        if record_id not in self._records:
+            return False
+        self._unindex(record_id)
+        del self._records[record_id]
+        del self._computed[record_id]
+        del self._seq[record_id]
+        return True
+
+    def get(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        return self._records.get(record_id)
+
+    def computed(self, record_id: Any, name: str) -> Any:
+        return self._computed[record_id][name]
+
+    def top(self, ranking: str, count: int) -> List[Dict[str, Any]]:
+        return [self._records[entry[-1]] for entry in self._indexes[ranking][:count]]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Insertion order
+        return iter(self._records.values())
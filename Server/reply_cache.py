@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+from .lru_cache import SingleFlightLRUCache
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration (override with environment variables) ---
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "1") != "0"
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "2000"))
+REPLY_CACHE_TTL_SECONDS = float(os.getenv("REPLY_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+# Only the last few turns of history can change the answer to a repeated question
+REPLY_CACHE_HISTORY_TURNS = int(os.getenv("REPLY_CACHE_HISTORY_TURNS", "2"))
+# Set to a file path to keep the cache across restarts
+REPLY_CACHE_PATH = os.getenv("REPLY_CACHE_PATH", "")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """
+    Lowercases, drops punctuation and collapses whitespace, so "What can
+    you do?" and "what can you do" share an entry.
+    """
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+def make_reply_key(message: str, driver_type: str, chat_history: Optional[List[Dict[str, str]]],
+                   kb_version: int, history_turns: int = REPLY_CACHE_HISTORY_TURNS) -> str:
+    """
+    Builds the cache key from the normalized message, driver type, the tail
+    of the history and the knowledge-base version (so edits to the KB never
+    serve stale answers).
+    """
+    tail = (chat_history or [])[-history_turns:] if history_turns > 0 else []
+    parts = [
+        normalize_message(message),
+        driver_type,
+        str(kb_version),
+        *(f"{turn.get('sender', '')}:{normalize_message(turn.get('text', ''))}" for turn in tail),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ReplyCache(SingleFlightLRUCache[str]):
+    """
+    LRU + TTL cache for LLM fallback replies. Identical requests already in
+    flight share one upstream call (single-flight), and hit/miss counters
+    show how many API calls it saves. Optionally persisted as JSON.
+    """
+
+    def __init__(self, max_entries: int = REPLY_CACHE_MAX_ENTRIES, ttl_seconds: float = REPLY_CACHE_TTL_SECONDS,
+                 path: str = REPLY_CACHE_PATH, enabled: bool = REPLY_CACHE_ENABLED):
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds, enabled=enabled)
+        self.path = path
+        if self.enabled and self.path:
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load reply cache from %s: %s", self.path, e)
+            return
+        now = time.time()
+        for key, reply, expires_at in stored:
+            if expires_at > now:
+                self.put(key, reply, expires_at)
+
+    def save(self) -> None:
+        if not (self.enabled and self.path):
+            return
+        now = time.time()
+        entries = [[key, reply, expires_at] for key, (reply, _, expires_at) in self._entries.items() if expires_at > now]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save reply cache to %s: %s", self.path, e)
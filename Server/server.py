@@ -1,23 +1,55 @@
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
+import json
 import os
-import whisper  # Import the local whisper model
-from tempfile import NamedTemporaryFile
-from pydub import AudioSegment
+import time
+
+# Startup timing covers the imports below
+IMPORT_STARTED = time.perf_counter()
 
-import subprocess  # ⬅ Add this at the top
-import uuid  # ⬅ Optional: for generating unique filenames
+import asyncio
+import logging
 
-from .chatbot import ask_chatbot  # <- chatbot function
-from pydantic import BaseModel
-from typing import List, Dict, Optional # Added List, Dict, Optional
+from fastapi import FastAPI, File, Form, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
+from .audio_processing import InvalidAudioError
+from .transcriber import TranscriptionPool, TranscriptionQueueFull, RETRY_AFTER_SECONDS, WHISPER_WARMUP
+from .streaming import StreamingSession
+from .denoise import DEFAULT_DENOISE_MODE, DENOISE_MODES
+from .vad import VAD_ENABLED
+from .language_cache import LanguageCache
+from .transcription_cache import TranscriptionCache, make_transcription_key
+from .session_store import SessionStore
+from .observability import STARTUP_SECONDS, RequestMetricsMiddleware, configure_logging, registry, stage
+from .ingest import ingest_feed, expire_periodically, feed_ingestor
+from .chatbot import ask_chatbot, answer_chatbot, stream_chatbot, gemini_client, reply_cache  # <- chatbot function
+from .knowledge_base import get_conversation_guideline
+from .intent_classifier import get_intent_classifier
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, AsyncIterator, List, Dict, Optional # Added List, Dict, Optional
+
+# --- /chat request limits (override with environment variables) ---
+CHAT_MAX_BODY_BYTES = int(os.getenv("CHAT_MAX_BODY_BYTES", str(64 * 1024)))
+CHAT_MAX_MESSAGE_CHARS = int(os.getenv("CHAT_MAX_MESSAGE_CHARS", "2000"))
+# Only the tail fits the prompt's history budget anyway
+CHAT_MAX_HISTORY_TURNS = int(os.getenv("CHAT_MAX_HISTORY_TURNS", "50"))
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# When set, /kb/ingest requires it in the X-Ingest-Key header
+INGEST_API_KEY = os.getenv("INGEST_API_KEY")
+
+# A failed warm-up is retried after this many seconds, doubling up to the maximum
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
 
 # Define the request format for /chat endpoint
 class ChatRequest(BaseModel):
-    message: str
-    driver_type: str
-    chat_history: Optional[List[Dict[str, str]]] = None
+    message: str = Field(..., max_length=CHAT_MAX_MESSAGE_CHARS)
+    driver_type: str = Field(..., max_length=32)
+    chat_history: Optional[List[Dict[str, str]]] = Field(None, max_length=CHAT_MAX_HISTORY_TURNS)
+    # Session mode: the server keeps the history, so chat_history can be omitted
+    session_id: Optional[str] = Field(None, max_length=128)
 
 
 # Initialize FastAPI app
@@ -44,116 +76,395 @@ allow_origins=[
 ]
 
 
-# Load the Whisper model
-model = whisper.load_model("base")  # You can change "base" to another model like "small", "medium", etc.
+class ChatBodyLimitMiddleware:
+    """
+    ASGI middleware: rejects /chat bodies over max_bytes with 413 before they
+    are parsed. Content-Length is checked up front; bodies sent without one
+    (chunked) are counted as they arrive, and reading stops as soon as they
+    pass the limit. An accepted body is replayed to the endpoint as received.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/chat"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        messages, received = [], 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            received += len(message.get("body", b""))
+            if received > self.max_bytes:
+                await self._reject(scope, receive, send)
+                return
+            if not message.get("more_body", False):
+                break
+
+        async def replay():
+            # Later calls (e.g. disconnect checks while streaming) go to the server
+            return messages.pop(0) if messages else await receive()
+
+        await self.app(scope, replay, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"error": f"Request body exceeds {self.max_bytes} bytes."})
+        await response(scope, receive, send)
+
+app.add_middleware(ChatBodyLimitMiddleware, max_bytes=CHAT_MAX_BODY_BYTES)
+
+# Outermost, so request IDs and timings cover the whole request
+app.add_middleware(RequestMetricsMiddleware)
+
+# Whisper runs in a pool of worker processes, each with its own preloaded model.
+# Set WHISPER_MODEL / WHISPER_WORKERS / WHISPER_QUEUE_SIZE to tune it.
+transcription_pool = TranscriptionPool()
+
+# Language detected per driver/session, so repeat requests skip Whisper's detection pass
+language_cache = LanguageCache()
+transcription_cache = TranscriptionCache()
+
+# Per-session chat history for clients that send a session_id instead of chat_history
+session_store = SessionStore()
+
+def get_chat_history(request: ChatRequest) -> List[Dict[str, str]]:
+    if request.session_id:
+        return session_store.history(request.session_id)
+    return request.chat_history if request.chat_history is not None else []
+
+def remember_turn(request: ChatRequest, reply: str) -> None:
+    if request.session_id:
+        session_store.append(request.session_id, "user", request.message)
+        session_store.append(request.session_id, "bot", reply)
+
+# What /readyz reports; filled in as the process starts
+startup_state: Dict[str, Any] = {"status": "warming_up", "import_seconds": round(time.perf_counter() - IMPORT_STARTED, 3)}
+
+async def warm_up() -> None:
+    """
+    Loads Whisper in every worker (with a dummy inference) and trains the
+    intent classifier in the background, so the server answers / and
+    /healthz right away and /readyz once the first real requests will be fast.
+    A failed attempt is retried with exponential backoff; until one
+    succeeds /readyz stays 503 and reports the attempts and the last error.
+    """
+    start = time.perf_counter()
+    delay = WARMUP_RETRY_SECONDS
+    transcription_warm = not WHISPER_WARMUP
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if not transcription_warm:
+                startup_state["transcription"] = await transcription_pool.warm_up()
+                transcription_warm = True
+            await asyncio.to_thread(get_intent_classifier)
+            break
+        except Exception as e:
+            logger.exception("Warm-up attempt %d failed; retrying in %.0fs", attempt, delay)
+            startup_state.update(attempts=attempt, error=str(e))
+            if not transcription_warm:
+                # A worker that died leaves the process pool broken; start from fresh ones
+                transcription_pool.restart_workers()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    startup_state.pop("error", None)
+    startup_state["warm_up_seconds"] = round(time.perf_counter() - start, 3)
+    startup_state["ready_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    startup_state["status"] = "ready"
+    for phase in ("import", "warm_up", "ready"):
+        STARTUP_SECONDS.observe(startup_state[f"{phase}_seconds"], phase=phase)
+    logger.info("Ready %.2fs after import started (imports %.2fs, warm-up %.2fs).",
+                startup_state["ready_seconds"], startup_state["import_seconds"], startup_state["warm_up_seconds"])
+
+@app.on_event("startup")
+async def start_warm_up():
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+
+@app.on_event("startup")
+async def start_feed_expiry():
+    # Ingested orders/rides are dropped once their TTL passes, even without new feed traffic
+    app.state.expiry_task = asyncio.create_task(expire_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    app.state.warm_up_task.cancel()
+    app.state.expiry_task.cancel()
+    transcription_pool.shutdown()
+    await gemini_client.aclose()
+    reply_cache.save()
+
+def invalid_denoise_response() -> JSONResponse:
+    return JSONResponse(status_code=400, content={"error": f"denoise must be one of {', '.join(DENOISE_MODES)}"})
+
+def invalid_audio_response(error: InvalidAudioError) -> JSONResponse:
+    # A corrupt or non-audio upload is the client's problem, not a server error
+    return JSONResponse(status_code=400, content={"error": str(error)})
+
+def queue_full_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Transcription is busy, please retry shortly."},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+async def run_transcription(file: UploadFile, language: Optional[str], denoise: str, vad: bool,
+                            cascade: Optional[bool], driver_id: Optional[str], session_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Reads an upload and transcribes it, reusing and updating the language
+    detected earlier for this driver/session. Raises InvalidAudioError when
+    the upload cannot be decoded.
+    """
+    logger.debug("Language: %s", language)
+
+    # Without an explicit language, reuse the one detected earlier for this driver/session
+    cache_key = driver_id or session_id
+    cached_language = None if language else language_cache.get(cache_key)
+    language_source = "request" if language else ("cache" if cached_language else "detected")
+
+    with stage("upload_read"):
+        data = await file.read()
+    # Retried uploads of the same clip with the same settings reuse (or join) one inference
+    effective_language = language or cached_language
+    effective_cascade = transcription_pool.cascade if cascade is None else cascade
+    models = (transcription_pool.model_name, transcription_pool.draft_model_name if effective_cascade else "")
+    key = make_transcription_key(data, effective_language, denoise, vad, effective_cascade, models)
+    # Decoding, noise reduction, VAD trimming and Whisper all run in a worker process
+    result = await transcription_cache.get_or_compute(
+        key, lambda: transcription_pool.transcribe(data, effective_language, denoise, vad, effective_cascade)
+    )
+    if not language:
+        language_cache.record(cache_key, result, used_cached=cached_language is not None)
+
+    # The transcription result, which model tier answered,
+    # and how much of the audio actually needed decoding
+    return {
+        "transcription": result['text'],
+        "tier": result['tier'],
+        "language": result['language'],
+        "language_source": language_source,
+        "audio_seconds": result['audio_seconds'],
+        "decoded_seconds": result['decoded_seconds'],
+    }
 
 # Endpoint to process audio and get transcription
 @app.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...), language: str = None):
-
+async def transcribe_audio(file: UploadFile = File(...), language: str = None,
+                           denoise: str = DEFAULT_DENOISE_MODE, vad: bool = VAD_ENABLED,
+                           cascade: Optional[bool] = None, driver_id: str = None, session_id: str = None):
+    if denoise not in DENOISE_MODES:
+        return invalid_denoise_response()
 
-    # print("filename:", file.filename)
-    # print("content_type:", file.content_type)
-    # return {"message": "received", "filename": file.filename}
-
-
-    temp_file_path = None
-    wav_file_path = None
     try:
-        # Save the uploaded audio file temporarily
-        with NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(await file.read())
-            temp_file_path = temp_file.name
-        
-        # Convert the audio file to a format that Whisper can handle (WAV)
-        audio = AudioSegment.from_file(temp_file_path)
-        wav_file_path = temp_file_path + ".wav"
-        audio.export(wav_file_path, format="wav")
-
-        # === Noise Reduction using RNNoise ===
-        # Generate temporary filenames
-        input_raw_path = wav_file_path + ".raw"
-        output_raw_path = wav_file_path + "_denoised.raw"
-        denoised_wav_path = wav_file_path.replace(".wav", "_denoised.wav")
-
-        # Path to ffmpeg executable - use from PATH
-        ffmpeg_path = r"C:\Users\USER\Documents\UMHakathon\ffmpeg-master-latest-win64-gpl-shared\ffmpeg-master-latest-win64-gpl-shared\bin\ffmpeg.exe"
+        return JSONResponse(content=await run_transcription(file, language, denoise, vad, cascade, driver_id, session_id))
 
-        # 1. Convert WAV to raw PCM (s16le, 48kHz, mono)
-        subprocess.run([
-            ffmpeg_path, "-y", "-i", wav_file_path,
-            "-f", "s16le", "-ar", "48000", "-ac", "1", input_raw_path
-        ], check=True)
+    except TranscriptionQueueFull:
+        return queue_full_response()
 
-        if not os.path.exists(input_raw_path) or os.path.getsize(input_raw_path) == 0:
-            raise Exception("Conversion to raw PCM failed: input.raw is missing or empty.")
+    except InvalidAudioError as e:
+        return invalid_audio_response(e)
 
-
-        print("filename:", file.filename)
-
-        # 2. Apply RNNoise
-        rnnoise_exe = r"C:/Users/USER/RNNoise/rnnoise/examples/rnnoise_demo.exe"
-
-        try:
-            subprocess.run(
-                [rnnoise_exe, input_raw_path, output_raw_path],
-                check=True,
-                cwd=r"C:/Users/USER/RNNoise/rnnoise"
-            )
-        except subprocess.CalledProcessError as e:
-            print("RNNoise execution failed:", e)
-            raise Exception("Noise reduction failed.") from e
-
-        print("content_type:", file.content_type)
-
-        if not os.path.exists(output_raw_path) or os.path.getsize(output_raw_path) == 0:
-            raise Exception("Noise reduction failed: output.raw is missing or empty.")
+    except Exception as e:
+        logger.exception("Error in /transcribe")
+        return JSONResponse(status_code=500, content={"error": str(e)})
 
 
-        # 3. Convert back to WAV from raw
-        subprocess.run([
-            ffmpeg_path, "-y", "-f", "s16le", "-ar", "48000", "-ac", "1",
-            "-i", output_raw_path, denoised_wav_path
-        ], check=True)
+@app.get("/transcribe/cache")
+async def transcription_cache_stats():
+    # How many uploads were answered without running Whisper again
+    return transcription_cache.stats()
 
-        print(f"Temporary file path: {temp_file_path}")
-        print(f"WAV file path: {wav_file_path}")
-        print(f"Raw PCM path: {input_raw_path}")
-        print(f"Denoised output path: {output_raw_path}")
-        print(f"Denoised WAV path: {denoised_wav_path}")
-        print(f"Language: {language}")  # Log the language parameter
 
+# Streaming transcription: the client sends audio frames as they are recorded
+# (binary messages, raw s16le PCM or Opus packets) and a text message
+# {"event": "end"} once the driver stops talking. The server pushes
+# {"type": "partial", "text": ...} updates and one {"type": "final", "text": ...}.
+@app.websocket("/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket, language: str = None, format: str = "pcm16",
+                            sample_rate: int = 16000, denoise: str = DEFAULT_DENOISE_MODE,
+                            driver_id: str = None, session_id: str = None):
+    await websocket.accept()
+    language = language or language_cache.get(driver_id or session_id)
+    try:
+        session = StreamingSession(transcription_pool, websocket.send_json, language, format, sample_rate, denoise)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1003)
+        return
 
-        # Transcribe the denoised audio with language specified if provided
-        if language:
-            result = model.transcribe(denoised_wav_path, language=language)
-        else:
-            result = model.transcribe(denoised_wav_path)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                session.cancel()
+                return
+            if message.get("bytes"):
+                session.feed(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("event") == "end":
+                break
+
+        await websocket.send_json(await session.finish())
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        session.cancel()
+    except TranscriptionQueueFull:
+        await websocket.send_json({"type": "error", "error": "Transcription is busy, please retry shortly."})
+        await websocket.close(code=1013)  # "Try again later"
+    except Exception as e:
+        logger.exception("Error in /transcribe/stream")
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1011)
 
-        # Return the transcription result
-        return JSONResponse(content={"transcription": result['text']})
 
+@app.post("/chat")
+async def chat_with_bot(request: ChatRequest):
+    try:
+        history = get_chat_history(request)
+        reply = await ask_chatbot(request.message, request.driver_type, history)
+        remember_turn(request, reply)
+        return {"reply": reply}
     except Exception as e:
+        logger.exception("Error in /chat endpoint")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-    finally:
-        # Clean up the temporary files
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        if wav_file_path and os.path.exists(wav_file_path):
-            os.remove(wav_file_path)
-        if input_raw_path and os.path.exists(input_raw_path):
-            os.remove(input_raw_path)
-        if output_raw_path and os.path.exists(output_raw_path):
-            os.remove(output_raw_path)
+@app.post("/chat/stream")
+async def chat_with_bot_stream(request: ChatRequest):
+    """
+    Server-Sent Events version of /chat: "chunk" events carry the reply a
+    sentence at a time so text-to-speech can start on the first one, and a
+    final "done" event carries the full reply.
+    """
+    return sse_response(chat_events(request, get_chat_history(request)))
+
+def sse_event(event_type: str, data: Dict[str, Any]) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_events(request: ChatRequest, history: List[Dict[str, str]]) -> AsyncIterator[str]:
+    async for event in stream_chatbot(request.message, request.driver_type, history):
+        event_type = event.pop("type")
+        if event_type == "done" and event["source"] != "error":
+            # A failed answer is not part of the conversation the LLM should see next time
+            remember_turn(request, event["reply"])
+        yield sse_event(event_type, event)
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    # no-cache / X-Accel-Buffering stop proxies from holding chunks back
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/voice-chat")
+async def voice_chat(file: UploadFile = File(...), driver_type: str = Form(...),
+                     session_id: Optional[str] = Form(None), chat_history: Optional[str] = Form(None),
+                     language: str = None, denoise: str = DEFAULT_DENOISE_MODE, vad: bool = VAD_ENABLED,
+                     cascade: Optional[bool] = None, driver_id: str = None, stream: bool = False):
+    """
+    /transcribe and /chat in one round-trip: the audio is transcribed and
+    the transcript goes straight into the chatbot, local rules first.
+    driver_type, session_id and chat_history (a JSON list, as in /chat) are
+    form fields next to the audio; the other options are the /transcribe
+    query parameters. Returns the /transcribe fields plus "reply" and its
+    "source". With ?stream=true it answers with Server-Sent Events: a
+    "transcript" event as soon as Whisper is done, then the /chat/stream
+    "chunk" and "done" events.
+    """
+    if denoise not in DENOISE_MODES:
+        return invalid_denoise_response()
+    # Validate the chat fields before spending Whisper time on the audio
+    try:
+        history = json.loads(chat_history) if chat_history else None
+        request = ChatRequest(message="", driver_type=driver_type, chat_history=history, session_id=session_id)
+    except (ValueError, ValidationError) as e:
+        errors = e.errors(include_url=False) if isinstance(e, ValidationError) else str(e)
+        return JSONResponse(status_code=422, content={"error": "Invalid chat fields.", "detail": errors})
 
+    try:
+        transcription = await run_transcription(file, language, denoise, vad, cascade,
+                                                driver_id, session_id or driver_id)
+    except TranscriptionQueueFull:
+        return queue_full_response()
+    except InvalidAudioError as e:
+        return invalid_audio_response(e)
+    except Exception as e:
+        logger.exception("Error in /voice-chat transcription")
+        return JSONResponse(status_code=500, content={"error": str(e)})
 
-@app.post("/chat")
-async def chat_with_bot(request: ChatRequest):
+    transcript = transcription["transcription"].strip()
+    request = request.model_copy(update={"message": transcript})
+
+    if stream:
+        async def events():
+            yield sse_event("transcript", transcription)
+            if not transcript:
+                yield sse_event("done", {"reply": get_conversation_guideline("error"), "source": "no_speech"})
+                return
+            async for event in chat_events(request, get_chat_history(request)):
+                yield event
+        return sse_response(events())
+
+    if not transcript:
+        # Nothing was said; ask again without involving the chatbot or the session
+        return {**transcription, "reply": get_conversation_guideline("error"), "source": "no_speech"}
     try:
-        history = request.chat_history if request.chat_history is not None else []
-        reply = ask_chatbot(request.message, request.driver_type, history)
-        return {"reply": reply}
+        reply, source = await answer_chatbot(transcript, driver_type, get_chat_history(request))
+        remember_turn(request, reply)
+        return {**transcription, "reply": reply, "source": source}
     except Exception as e:
-        print(f"Error in /chat endpoint: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        logger.exception("Error in /voice-chat endpoint")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.delete("/chat/session/{session_id}")
+async def reset_chat_session(session_id: str):
+    # Called when the driver clears the conversation or ends the shift
+    session_store.reset(session_id)
+    return {"status": "ok"}
+
+@app.get("/chat/cache")
+async def chat_cache_stats():
+    # Hit rate of the LLM reply cache, i.e. how many Gemini calls it saves
+    return reply_cache.stats()
+
+
+@app.post("/kb/ingest")
+async def ingest_live_feed(request: Request):
+    """
+    Bulk upsert/expire of orders and ride requests from a live feed. The body
+    is JSON lines, one record per line: an order (order_id) or ride request
+    (ride_id), optionally with "ttl_seconds", "expires_at" (epoch seconds) or
+    "deleted": true. The body is applied as it streams in, so large feeds
+    don't hold up /chat.
+    """
+    if INGEST_API_KEY and request.headers.get("x-ingest-key") != INGEST_API_KEY:
+        return JSONResponse(status_code=401, content={"error": "Invalid or missing X-Ingest-Key."})
+    return await ingest_feed(request.stream())
+
+@app.get("/kb/ingest")
+async def ingest_stats():
+    return {"expiring": feed_ingestor.pending(), "expired_total": feed_ingestor.expired_total}
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the event loop is answering; models may still be loading
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # Readiness: 503 until the warm-up finished, so no traffic reaches a cold worker
+    body = {**startup_state, "gemini_configured": gemini_client.configured}
+    return JSONResponse(status_code=200 if startup_state["status"] == "ready" else 503, content=body)
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape target: request and per-stage latency histograms, reply sources, Gemini retries
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# --- Configuration (override with environment variables) ---
+# Turns kept per session; older ones fall off the ring buffer
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+# Longer messages are stored truncated
+SESSION_MAX_TURN_CHARS = int(os.getenv("SESSION_MAX_TURN_CHARS", "1000"))
+# Idle sessions expire after this long (a long shift)
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(12 * 60 * 60)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+# Approximate memory cap across all sessions; least recently used sessions go first
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+
+TURN_OVERHEAD_BYTES = 100  # Rough per-turn cost of the tuple and strings beyond the text
+
+
+class _Session:
+    __slots__ = ("turns", "size", "expires_at")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+        self.size = 0
+        self.expires_at = 0.0
+
+
+def _turn_size(sender: str, text: str) -> int:
+    return len(sender) + len(text) + TURN_OVERHEAD_BYTES
+
+
+class SessionStore:
+    """
+    Keeps a short chat history per session on the server, so clients in
+    session mode send only the new message. Each session is a ring buffer
+    of (sender, text) turns. Sessions expire after SESSION_TTL_SECONDS
+    idle, and least recently used sessions are evicted past the session
+    count or memory cap.
+    """
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def _get(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.expires_at < time.monotonic():
+            self._drop(session_id)
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        Returns the stored turns in the same shape clients send as chat_history.
+        """
+        session = self._get(session_id)
+        if session is None:
+            return []
+        return [{"sender": sender, "text": text} for sender, text in session.turns]
+
+    def append(self, session_id: str, sender: str, text: str) -> None:
+        session = self._get(session_id)
+        if session is None:
+            session = _Session(self.max_turns)
+            self._sessions[session_id] = session
+
+        text = text[:SESSION_MAX_TURN_CHARS]
+        if len(session.turns) == session.turns.maxlen:
+            # The ring buffer is about to drop its oldest turn
+            oldest_size = _turn_size(*session.turns[0])
+            session.size -= oldest_size
+            self._bytes -= oldest_size
+        session.turns.append((sender, text))
+        size = _turn_size(sender, text)
+        session.size += size
+        self._bytes += size
+        session.expires_at = time.monotonic() + self.ttl_seconds
+        self._evict(keep=session_id)
+
+    def _evict(self, keep: str) -> None:
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._drop(oldest)
+            self.evictions += 1
+
+    def reset(self, session_id: str) -> None:
+        self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "bytes": self._bytes, "evictions": self.evictions}
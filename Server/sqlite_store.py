@@ -0,0 +1,214 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# A ranking is a list of (column, descending) pairs, most significant first
+Ranking = List[Tuple[str, bool]]
+
+BUSY_TIMEOUT_MS = 5000
+
+
+class SQLiteDatabase:
+    """
+    One SQLite file shared by every uvicorn worker. WAL mode lets readers
+    run while another process writes. Each thread gets its own connection;
+    Python's sqlite3 keeps prepared statements per connection, so the
+    stores' fixed SQL strings are compiled once per thread.
+
+    Besides the record tables it holds a "kv" table for the dictionary
+    sections of the knowledge base and a "meta" table for its version.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (section TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (section, key))"
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement writes go through transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        BEGIN IMMEDIATE takes the write lock up front, so concurrent workers
+        queue up instead of failing on a lock upgrade.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn  # Nested: the outer transaction commits
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key: str, value: Any) -> None:
+        self.connection().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def claim_seed(self, name: str) -> bool:
+        """
+        True for the first caller ever to seed `name` in this database (call
+        inside a transaction). Later startups and other workers keep the
+        stored data instead of re-seeding over it.
+        """
+        if self.get_meta(f"seeded:{name}"):
+            return False
+        self.set_meta(f"seeded:{name}", 1)
+        return True
+
+    def load_sections(self) -> Dict[str, Dict[str, Any]]:
+        sections: Dict[str, Dict[str, Any]] = {}
+        for section, key, value in self.connection().execute("SELECT section, key, value FROM kv ORDER BY rowid"):
+            sections.setdefault(section, {})[key] = json.loads(value)
+        return sections
+
+    def set_section_key(self, section: str, key: str, value: Any) -> None:
+        self.connection().execute(
+            "INSERT INTO kv (section, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(section, key) DO UPDATE SET value = excluded.value",
+            (section, key, json.dumps(value)),
+        )
+
+
+class SQLiteRecordStore:
+    """
+    RecordStore interface over a SQLite table, so orders and rides are
+    persistent and shared by all workers. Each record is stored as JSON
+    next to its ranking columns (and computed values such as the score);
+    every ranking has a matching index, so top-k reads walk the index
+    instead of sorting. Ties rank by insertion sequence, like the
+    in-memory stores.
+
+    Expiry deadlines live in an indexed expires_at column rather than in a
+    per-process heap, so they are shared by the workers, survive restarts
+    and are enforced with a single DELETE.
+    """
+
+    # FeedIngestor hands expiry deadlines to the store instead of tracking them itself
+    tracks_expiry = True
+
+    def __init__(self, database: SQLiteDatabase, table: str, id_field: str,
+                 columns: Dict[str, Callable[[Dict[str, Any]], float]], rankings: Dict[str, Ranking],
+                 computed: Optional[Dict[str, Callable[[Dict[str, Any]], float]]] = None,
+                 records: Optional[List[Dict[str, Any]]] = None):
+        self.database = database
+        self.id_field = id_field
+        self._value_fns = {**columns, **(computed or {})}
+        names = list(self._value_fns)
+
+        # seq (the rowid) is never reused, so a re-added record ranks after existing ties
+        column_defs = "".join(f", {name} REAL" for name in names)
+        written = ["data"] + names + ["expires_at"]
+        placeholders = ", ".join("?" * (len(written) + 1))
+        updates = ", ".join(f"{name} = excluded.{name}" for name in written)
+        insert = f"INSERT INTO {table} (id, {', '.join(written)}) VALUES ({placeholders})"
+        self._upsert_sql = f"{insert} ON CONFLICT(id) DO UPDATE SET {updates}"
+        self._seed_sql = f"{insert} ON CONFLICT(id) DO NOTHING"
+        self._expire_sql = f"DELETE FROM {table} WHERE expires_at <= ?"
+        self._expiring_sql = f"SELECT COUNT(*) FROM {table} WHERE expires_at IS NOT NULL"
+        self._get_sql = f"SELECT data FROM {table} WHERE id = ?"
+        self._computed_sql = {name: f"SELECT {name} FROM {table} WHERE id = ?" for name in names}
+        self._remove_sql = f"DELETE FROM {table} WHERE id = ?"
+        self._count_sql = f"SELECT COUNT(*) FROM {table}"
+        self._iter_sql = f"SELECT data FROM {table} ORDER BY seq"
+        self._top_sql = {}
+        for name, ranking in rankings.items():
+            order = ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in ranking)
+            self._top_sql[name] = f"SELECT data FROM {table} ORDER BY {order}, seq LIMIT ?"
+
+        with database.transaction() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"(seq INTEGER PRIMARY KEY AUTOINCREMENT, id UNIQUE NOT NULL, data TEXT NOT NULL{column_defs}, "
+                f"expires_at REAL)"
+            )
+            # Databases created before the column existed
+            if "expires_at" not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+            for name, ranking in rankings.items():
+                order = ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in ranking)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({order}, seq)")
+            if records and database.claim_seed(table):
+                self._write(conn, self._seed_sql, records)
+
+    def _row(self, record: Dict[str, Any], expires_at: Optional[float] = None) -> Tuple:
+        values = (fn(record) for fn in self._value_fns.values())
+        return (record[self.id_field], json.dumps(record), *values, expires_at)
+
+    def _write(self, conn: sqlite3.Connection, sql: str, records: List[Dict[str, Any]]) -> None:
+        conn.executemany(sql, (self._row(record) for record in records))
+
+    def load(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Upserts many records in one transaction.
+        """
+        with self.database.transaction() as conn:
+            self._write(conn, self._upsert_sql, records)
+
+    def upsert(self, record: Dict[str, Any], expires_at: Optional[float] = None) -> None:
+        """
+        Inserts or replaces a record, with the epoch time it expires at
+        (None: kept until removed).
+        """
+        self.database.connection().execute(self._upsert_sql, self._row(record, expires_at))
+
+    def expire(self, now: float) -> int:
+        """
+        Deletes every record whose deadline has passed; returns how many.
+        """
+        return self.database.connection().execute(self._expire_sql, (now,)).rowcount
+
+    def expiring(self) -> int:
+        # Records with a deadline, i.e. still waiting to expire
+        return self.database.connection().execute(self._expiring_sql).fetchone()[0]
+
+    def remove(self, record_id: Any) -> bool:
+        return self.database.connection().execute(self._remove_sql, (record_id,)).rowcount > 0
+
+    def get(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        row = self.database.connection().execute(self._get_sql, (record_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def computed(self, record_id: Any, name: str) -> Any:
+        row = self.database.connection().execute(self._computed_sql[name], (record_id,)).fetchone()
+        if row is None:
+            raise KeyError(record_id)
+        return row[0]
+
+    def top(self, ranking: str, count: int) -> List[Dict[str, Any]]:
+        rows = self.database.connection().execute(self._top_sql[ranking], (max(count, 0),))
+        return [json.loads(data) for (data,) in rows]
+
+    def __len__(self) -> int:
+        # A COUNT(*) over the table: keep it off per-request paths
+        return self.database.connection().execute(self._count_sql).fetchone()[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Insertion order
+        return (json.loads(data) for (data,) in self.database.connection().execute(self._iter_sql))
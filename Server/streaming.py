@@ -0,0 +1,124 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .audio_processing import SAMPLE_RATE, StreamDecoder
+from .denoise import DEFAULT_DENOISE_MODE, DENOISE_MODES, SpectralGate
+from .transcriber import TranscriptionPool, TranscriptionQueueFull
+
+# --- Configuration (override with environment variables) ---
+# New audio needed before another partial hypothesis is decoded
+STREAM_STEP_SECONDS = float(os.getenv("STREAM_STEP_SECONDS", "1.0"))
+# Longest stretch of audio re-decoded for a partial; older audio gets committed
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "10.0"))
+# When committing, cut at the quietest 20 ms frame within this tail of the window
+STREAM_CUT_SEARCH_SECONDS = 1.0
+CUT_FRAME_SAMPLES = SAMPLE_RATE // 50
+# Leftover audio shorter than this is not worth a final decode
+MIN_FINAL_SECONDS = 0.1
+
+
+def find_quiet_cut(samples: np.ndarray, search_samples: int) -> int:
+    """
+    Returns the sample index of the lowest-energy frame in the last
+    search_samples of the buffer, so a commit does not cut through a word.
+    """
+    start = max(0, samples.size - search_samples)
+    tail = samples[start:]
+    usable = tail.size - tail.size % CUT_FRAME_SAMPLES
+    if usable == 0:
+        return samples.size
+    energy = np.square(tail[:usable].reshape(-1, CUT_FRAME_SAMPLES)).mean(axis=1)
+    quietest = int(np.argmin(energy))
+    return start + quietest * CUT_FRAME_SAMPLES + CUT_FRAME_SAMPLES // 2
+
+
+class StreamingSession:
+    """
+    Incremental transcription over a sliding window for one WebSocket.
+
+    Frames are appended to an uncommitted buffer. Every STREAM_STEP_SECONDS
+    of new audio, the whole uncommitted buffer is decoded and pushed as a
+    partial hypothesis. Once the buffer is longer than STREAM_WINDOW_SECONDS,
+    everything up to a quiet point is decoded one last time and committed, so
+    the audio re-decoded per partial stays bounded.
+
+    Frames are denoised once as they arrive, so the repeated window decodes
+    skip denoising.
+    """
+
+    def __init__(self, pool: TranscriptionPool, send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 language: Optional[str] = None, input_format: str = "pcm16", sample_rate: int = SAMPLE_RATE,
+                 denoise: str = DEFAULT_DENOISE_MODE):
+        if denoise not in DENOISE_MODES:
+            raise ValueError(f"Unsupported denoise mode: {denoise}")
+        self.pool = pool
+        self.send = send
+        self.language = language
+        self.decoder = StreamDecoder(input_format, sample_rate)
+        self.denoiser = SpectralGate(denoise) if denoise != "off" else None
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.committed: List[str] = []
+        self.samples_since_partial = 0
+        self._partial_task: Optional[asyncio.Task] = None
+
+    def text(self, hypothesis: str = "") -> str:
+        parts = [part.strip() for part in self.committed + [hypothesis]]
+        return " ".join(part for part in parts if part)
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Adds one received frame and starts a partial decode when enough new
+        audio has arrived and no decode is already running.
+        """
+        samples = self.decoder.decode(chunk)
+        if self.denoiser is not None:
+            samples = self.denoiser.process(samples)
+        if samples.size == 0:
+            return
+        self.buffer = np.concatenate([self.buffer, samples])
+        self.samples_since_partial += samples.size
+
+        busy = self._partial_task is not None and not self._partial_task.done()
+        if not busy and self.samples_since_partial >= STREAM_STEP_SECONDS * SAMPLE_RATE:
+            self.samples_since_partial = 0
+            self._partial_task = asyncio.get_running_loop().create_task(self._update())
+
+    async def _update(self) -> None:
+        try:
+            window_samples = int(STREAM_WINDOW_SECONDS * SAMPLE_RATE)
+            if self.buffer.size > window_samples:
+                # Commit everything up to a quiet point near the end of the window
+                cut = find_quiet_cut(self.buffer[:window_samples], int(STREAM_CUT_SEARCH_SECONDS * SAMPLE_RATE))
+                result = await self.pool.transcribe(self.buffer[:cut], self.language, denoise="off")
+                self.committed.append(result["text"])
+                # Frames only ever get appended, so the cut index is still valid
+                self.buffer = self.buffer[cut:]
+
+            result = await self.pool.transcribe(self.buffer, self.language, denoise="off")
+            await self.send({"type": "partial", "text": self.text(result["text"])})
+        except TranscriptionQueueFull:
+            # Skip this partial; the next step (or the final) will catch up
+            pass
+
+    async def finish(self) -> Dict[str, Any]:
+        """
+        Waits for any running partial, decodes the remaining audio and
+        returns the final hypothesis.
+        """
+        if self._partial_task is not None:
+            await self._partial_task
+        if self.denoiser is not None:
+            self.buffer = np.concatenate([self.buffer, self.denoiser.flush()])
+
+        if self.buffer.size >= MIN_FINAL_SECONDS * SAMPLE_RATE:
+            result = await self.pool.transcribe(self.buffer, self.language, denoise="off")
+            self.committed.append(result["text"])
+            self.buffer = np.zeros(0, dtype=np.float32)
+        return {"type": "final", "text": self.text()}
+
+    def cancel(self) -> None:
+        if self._partial_task is not None:
+            self._partial_task.cancel()
@@ -0,0 +1,527 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .audio_processing import SAMPLE_RATE, InvalidAudioError, decode_audio
+from .denoise import DEFAULT_DENOISE_MODE, denoise_audio
+from .vad import VAD_ENABLED, speech_chunks
+from .knowledge_base import get_voice_command_prompt
+from .observability import record_stage
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration (override with environment variables) ---
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")  # "tiny", "base", "small", ...
+# One worker per two cores by default; each worker gets its own torch threads
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+WHISPER_THREADS_PER_WORKER = int(os.getenv("WHISPER_THREADS_PER_WORKER", max(1, (os.cpu_count() or 1) // WHISPER_WORKERS)))
+# Jobs allowed to wait on top of the ones being processed before we reject with 503
+WHISPER_QUEUE_SIZE = int(os.getenv("WHISPER_QUEUE_SIZE", "8"))
+RETRY_AFTER_SECONDS = int(os.getenv("TRANSCRIBE_RETRY_AFTER", "2"))
+# Micro-batching: requests arriving within MAX_WAIT_MS of each other share one decode
+WHISPER_MAX_BATCH = int(os.getenv("WHISPER_MAX_BATCH", "8"))
+WHISPER_MAX_WAIT_MS = float(os.getenv("WHISPER_MAX_WAIT_MS", "10"))
+
+# Cascade: try a small "draft" model first, escalate to WHISPER_MODEL when it is unsure
+WHISPER_CASCADE = os.getenv("WHISPER_CASCADE", "0") == "1"
+WHISPER_DRAFT_MODEL = os.getenv("WHISPER_DRAFT_MODEL", "tiny")
+CASCADE_LOGPROB_THRESHOLD = float(os.getenv("CASCADE_LOGPROB_THRESHOLD", "-0.4"))
+CASCADE_NO_SPEECH_THRESHOLD = float(os.getenv("CASCADE_NO_SPEECH_THRESHOLD", "0.3"))
+
+# Warm-up: load the models in every worker and run one dummy inference at startup
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "1") != "0"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "300"))
+
+# Same thresholds model.transcribe uses to decide a greedy decode needs a retry
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class TranscriptionQueueFull(Exception):
+    """
+    Raised when the transcription queue is at capacity.
+    """
+
+
+class TranscriptionError(Exception):
+    """
+    Raised when a single job in a batch fails (e.g. an undecodable upload).
+    """
+
+
+# --- Worker process side ---
+
+_worker_models: Dict[str, Any] = {}
+_primary_model_name = WHISPER_MODEL
+_draft_model_name = WHISPER_DRAFT_MODEL
+# Whisper time of the batch being run, shared by all its jobs (stage -> seconds)
+_batch_timings: Dict[str, float] = {}
+# Set by _init_worker: seconds spent importing torch/whisper and loading models,
+# whether the cascade is on by default, and the pool's warm-up barrier
+_load_seconds = 0.0
+_preload_draft = False
+_warm_barrier: Optional[Any] = None
+
+
+def _add_batch_time(stage: str, start: float) -> None:
+    _batch_timings[stage] = _batch_timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _init_worker(model_name: str, draft_model_name: str, preload_draft: bool, num_threads: int,
+                 warm_barrier: Optional[Any] = None) -> None:
+    """
+    Runs once in each worker process: loads Whisper so jobs never pay for it.
+    The draft model is loaded up front only when the cascade is on by default.
+    """
+    global _primary_model_name, _draft_model_name, _load_seconds, _preload_draft, _warm_barrier
+    start = time.perf_counter()
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _primary_model_name, _draft_model_name = model_name, draft_model_name
+    _preload_draft, _warm_barrier = preload_draft, warm_barrier
+    _get_model(model_name)
+    if preload_draft:
+        _get_model(draft_model_name)
+    _load_seconds = time.perf_counter() - start
+
+
+def _warm_up_worker(timeout: float) -> Dict[str, Any]:
+    """
+    Runs one second of silence through the whole pipeline with VAD off, so
+    language detection, the encoder and the decoder (and the draft model,
+    when the cascade is on) allocate their buffers before real traffic.
+    Then waits for the other workers' warm-up jobs: a worker that is done
+    cannot take a second warm-up job and leave a cold worker behind.
+    """
+    start = time.perf_counter()
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    _run_batch([(silence, {"language": None, "denoise": "off", "vad": False, "cascade": _preload_draft})])
+    warmup_seconds = time.perf_counter() - start
+    if _warm_barrier is not None:
+        try:
+            _warm_barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass  # Another worker failed or timed out; report this one anyway
+    return {"pid": os.getpid(), "load_seconds": _load_seconds, "warmup_seconds": warmup_seconds}
+
+
+def _get_model(name: str) -> Any:
+    if name not in _worker_models:
+        import whisper
+        _worker_models[name] = whisper.load_model(name)
+    return _worker_models[name]
+
+
+def _decode_window(model: Any, audios: List[Any], language: Optional[str],
+                   prompt: Optional[str] = None) -> List[Tuple[Any, Optional[float]]]:
+    """
+    Runs clips of at most 30 s through the encoder/decoder as one log-mel
+    batch. Returns (DecodingResult, language probability) pairs; the
+    probability is only known when the language had to be detected.
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    start = time.perf_counter()
+    mel = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+        for audio in audios
+    ]).to(model.device)
+    # Encode once; decode() and detect_language() both accept the features directly
+    with torch.no_grad():
+        features = model.embed_audio(mel)
+    _add_batch_time("whisper_encode", start)
+
+    start = time.perf_counter()
+    probabilities: List[Optional[float]] = [None] * len(audios)
+    if language is None:
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+        _, language_probs = model.detect_language(features, tokenizer)
+        detected = [max(probs, key=probs.get) for probs in language_probs]
+        probabilities = [probs[lang] for probs, lang in zip(language_probs, detected)]
+        # One detection pass is enough when the whole group agrees
+        if len(set(detected)) == 1:
+            language = detected[0]
+
+    # fp16 only helps (and only works) on GPU
+    options = whisper.DecodingOptions(language=language, prompt=prompt, without_timestamps=True,
+                                      fp16=torch.cuda.is_available())
+    decoded = whisper.decode(model, features, options)
+    _add_batch_time("whisper_decode", start)
+    return list(zip(decoded, probabilities))
+
+
+def _group_by(indices: List[int], keys: List[Any]) -> Dict[Any, List[int]]:
+    groups: Dict[Any, List[int]] = {}
+    for i in indices:
+        groups.setdefault(keys[i], []).append(i)
+    return groups
+
+
+def _window_result(result: Any, probability: Optional[float], tier: str, text: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Converts a DecodingResult into the dict a job result is built from.
+    """
+    return {
+        "text": result.text if text is None else text,
+        "language": result.language,
+        "language_probability": probability,
+        "avg_logprob": result.avg_logprob,
+        "tier": tier,
+    }
+
+
+def _transcribe_batch(audios: List[Any], languages: List[Optional[str]], cascades: List[bool],
+                      prompts: Optional[List[Optional[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    Transcribes several 16 kHz buffers at once. Clips that fit in one 30 s
+    window are stacked into a single log-mel batch per language and go
+    through the encoder/decoder together; longer clips (and batched results
+    that look unreliable) fall back to model.transcribe one by one.
+
+    Clips with the cascade enabled first go through the draft model, biased
+    by their prompt toward the voice commands and current order/ride IDs
+    (built by the parent, whose knowledge base is current). Only the ones
+    it is not confident about are decoded again by the main model. Every
+    result says which model ("tier") produced it.
+    """
+    import torch
+    import whisper
+
+    model = _get_model(_primary_model_name)
+    prompts = prompts or [None] * len(audios)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(audios)
+    short = [i for i, audio in enumerate(audios) if audio.shape[0] <= whisper.audio.N_SAMPLES]
+
+    # Tier 1: the draft model, for short clips that opted into the cascade
+    cascade_short = [i for i in short if cascades[i]]
+    if cascade_short:
+        draft = _get_model(_draft_model_name)
+        for (language, prompt), indices in _group_by(cascade_short, list(zip(languages, prompts))).items():
+            decoded = _decode_window(draft, [audios[i] for i in indices], language, prompt)
+            for i, (result, probability) in zip(indices, decoded):
+                if (result.avg_logprob >= CASCADE_LOGPROB_THRESHOLD
+                        and result.no_speech_prob <= CASCADE_NO_SPEECH_THRESHOLD
+                        and result.compression_ratio <= COMPRESSION_RATIO_THRESHOLD):
+                    results[i] = _window_result(result, probability, _draft_model_name)
+
+    # Tier 2: the main model, batched per language
+    remaining = [i for i in short if results[i] is None]
+    detected: Dict[int, Dict[str, Any]] = {}
+    for language, indices in _group_by(remaining, languages).items():
+        decoded = _decode_window(model, [audios[i] for i in indices], language)
+        for i, (result, probability) in zip(indices, decoded):
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                results[i] = _window_result(result, probability, _primary_model_name, text="")
+            elif result.compression_ratio <= COMPRESSION_RATIO_THRESHOLD and result.avg_logprob >= LOGPROB_THRESHOLD:
+                results[i] = _window_result(result, probability, _primary_model_name)
+            else:
+                # Keep the language detection so the fallback does not repeat it
+                detected[i] = _window_result(result, probability, _primary_model_name)
+
+    # Long clips and low-confidence greedy decodes get the full temperature fallback
+    for i, audio in enumerate(audios):
+        if results[i] is None:
+            language = languages[i] or detected.get(i, {}).get("language")
+            options = {"fp16": torch.cuda.is_available()}
+            if language:
+                options["language"] = language
+            start = time.perf_counter()
+            result = model.transcribe(audio, **options)
+            _add_batch_time("whisper_fallback", start)
+            segments = result.get("segments") or []
+            results[i] = {
+                "text": result["text"],
+                "language": result.get("language"),
+                "language_probability": detected.get(i, {}).get("language_probability"),
+                "avg_logprob": float(np.mean([seg["avg_logprob"] for seg in segments])) if segments else None,
+                "tier": _primary_model_name,
+            }
+
+    return results
+
+
+def _run_batch(jobs: List[Tuple[Union[bytes, np.ndarray], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Decodes, denoises, VAD-trims and transcribes a batch of uploads inside a
+    worker process. Jobs may also carry an already decoded 16 kHz buffer
+    (e.g. from a stream). Each upload can turn into several speech chunks;
+    all chunks of all jobs are transcribed together and joined back per job.
+    A job with no speech never reaches the model. A job that fails comes
+    back as {"error": ...} without failing the rest of the batch
+    ("invalid_audio" marks an upload that could not be decoded).
+
+    Results carry "timings" (stage -> seconds): the job's own decode,
+    denoise and VAD time plus the Whisper time of the whole batch, and
+    "worker_seconds", the batch's total time in the worker.
+    """
+    batch_start = time.perf_counter()
+    _batch_timings.clear()
+    outputs: List[Dict[str, Any]] = [{} for _ in jobs]
+    job_timings: List[Dict[str, float]] = [{} for _ in jobs]
+    chunks, languages, cascades, prompts, owners = [], [], [], [], []
+
+    for i, (data, options) in enumerate(jobs):
+        try:
+            start = time.perf_counter()
+            audio = data if isinstance(data, np.ndarray) else decode_audio(data)
+            job_timings[i]["decode"] = time.perf_counter() - start
+            start = time.perf_counter()
+            audio = denoise_audio(audio, options["denoise"])
+            job_timings[i]["denoise"] = time.perf_counter() - start
+            start = time.perf_counter()
+            job_chunks = speech_chunks(audio) if options["vad"] else ([audio] if audio.size else [])
+            job_timings[i]["vad"] = time.perf_counter() - start
+            outputs[i] = {
+                "text": "",
+                "language": options["language"],
+                "audio_seconds": round(audio.size / SAMPLE_RATE, 2),
+                "decoded_seconds": round(sum(chunk.size for chunk in job_chunks) / SAMPLE_RATE, 2),
+                "tier": None,  # No model call at all
+                "language_probability": None,
+                "avg_logprob": None,
+            }
+            for chunk in job_chunks:
+                chunks.append(chunk)
+                languages.append(options["language"])
+                cascades.append(options["cascade"])
+                prompts.append(options.get("prompt"))
+                owners.append(i)
+        except InvalidAudioError as e:
+            outputs[i] = {"error": str(e), "invalid_audio": True}
+        except Exception as e:
+            outputs[i] = {"error": str(e)}
+
+    if chunks:
+        for i, result in zip(owners, _transcribe_batch(chunks, languages, cascades, prompts)):
+            outputs[i]["text"] = " ".join(part for part in (outputs[i]["text"], result["text"].strip()) if part)
+            if not outputs[i]["language"]:
+                # Take the detection from the first chunk that ran it
+                outputs[i]["language"] = result["language"]
+                outputs[i]["language_probability"] = result["language_probability"]
+            if result["avg_logprob"] is not None:
+                # The weakest chunk decides whether the language needs re-checking
+                previous = outputs[i]["avg_logprob"]
+                outputs[i]["avg_logprob"] = result["avg_logprob"] if previous is None else min(previous, result["avg_logprob"])
+            # If any chunk had to escalate, report the main model
+            if outputs[i]["tier"] != _primary_model_name:
+                outputs[i]["tier"] = result["tier"]
+
+    worker_seconds = time.perf_counter() - batch_start
+    transcribed = set(owners)
+    for i, output in enumerate(outputs):
+        if "error" not in output:
+            output["timings"] = {**job_timings[i], **(_batch_timings if i in transcribed else {})}
+            output["worker_seconds"] = worker_seconds
+    return outputs
+
+
+# --- Event loop side ---
+
+class TranscriptionPool:
+    """
+    A pool of Whisper worker processes behind a bounded job queue.
+    Jobs run off the event loop, so /chat keeps responding while
+    transcription is saturated. Requests that arrive close together are
+    grouped into micro-batches before being handed to a worker.
+    """
+
+    def __init__(self, model_name: str = WHISPER_MODEL, workers: int = WHISPER_WORKERS,
+                 queue_size: int = WHISPER_QUEUE_SIZE, threads_per_worker: int = WHISPER_THREADS_PER_WORKER,
+                 max_batch: int = WHISPER_MAX_BATCH, max_wait_ms: float = WHISPER_MAX_WAIT_MS,
+                 draft_model_name: str = WHISPER_DRAFT_MODEL, cascade: bool = WHISPER_CASCADE):
+        self.model_name = model_name
+        self.draft_model_name = draft_model_name
+        self.cascade = cascade
+        self.workers = max(1, workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.max_pending = self.workers + max(0, queue_size)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.pending = 0  # Only touched from the event loop thread
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warm_barrier: Optional[Any] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_slots: Optional[asyncio.Semaphore] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" avoids forking a process that already has torch threads running
+            context = multiprocessing.get_context("spawn")
+            self._warm_barrier = context.Barrier(self.workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.draft_model_name, self.cascade, self.threads_per_worker,
+                          self._warm_barrier),
+            )
+        return self._executor
+
+    async def warm_up(self, timeout: float = WARMUP_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """
+        Starts every worker process and has each load its models and run a
+        dummy inference. Returns once all of them are warm, with the slowest
+        worker's model load and dummy inference times.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        start = time.perf_counter()
+        # One job per worker; submitting them together spawns all processes at once
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _warm_up_worker, timeout) for _ in range(self.workers)
+        ))
+        return {
+            "workers": len({result["pid"] for result in results}),
+            "load_seconds": round(max(result["load_seconds"] for result in results), 3),
+            "inference_seconds": round(max(result["warmup_seconds"] for result in results), 3),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _ensure_batcher(self) -> None:
+        if self._batcher_task is None or self._batcher_task.done():
+            self._queue = asyncio.Queue()
+            self._worker_slots = asyncio.Semaphore(self.workers)
+            self._batcher_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    def is_full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    async def transcribe(self, data: Union[bytes, np.ndarray], language: Optional[str] = None,
+                         denoise: str = DEFAULT_DENOISE_MODE, vad: bool = VAD_ENABLED,
+                         cascade: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Queues one upload (or a decoded 16 kHz buffer) for transcription.
+        denoise is one of "off", "fast" or "full"; vad trims non-speech before
+        Whisper; cascade (default: the pool setting) tries the draft model
+        first. Returns the text, the model tier that answered, and the seconds
+        of audio received and actually decoded. Raises TranscriptionQueueFull
+        immediately instead of waiting when the queue is at capacity.
+        """
+        if self.is_full():
+            raise TranscriptionQueueFull()
+
+        self.pending += 1
+        try:
+            self._ensure_batcher()
+            future = asyncio.get_running_loop().create_future()
+            options = {
+                "language": language,
+                "denoise": denoise,
+                "vad": vad,
+                "cascade": self.cascade if cascade is None else cascade,
+            }
+            if options["cascade"]:
+                # Built here, not in the worker: workers only have the knowledge base they were spawned with
+                options["prompt"] = get_voice_command_prompt()
+            start = time.perf_counter()
+            self._queue.put_nowait((data, options, future))
+            result = await future
+            for stage, seconds in result["timings"].items():
+                record_stage(stage, seconds)
+            # Waiting for a worker and batching, plus the trip to and from the worker process
+            record_stage("transcribe_queue", max(0.0, time.perf_counter() - start - result["worker_seconds"]))
+            return result
+        finally:
+            self.pending -= 1
+
+    async def _batch_loop(self) -> None:
+        """
+        Waits for a free worker, then collects jobs for up to max_wait (or
+        until max_batch is reached) and ships them to that worker as one batch.
+        While every worker is busy, jobs keep queueing and form a bigger batch.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._worker_slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip jobs whose callers have already gone away
+            batch = [job for job in batch if not job[2].done()]
+            if not batch:
+                self._worker_slots.release()
+                continue
+
+            jobs = [(data, options) for data, options, _ in batch]
+            executor = None
+            try:
+                executor = self._get_executor()
+                task = loop.run_in_executor(executor, _run_batch, jobs)
+            except Exception as e:
+                # e.g. BrokenProcessPool: the batcher must outlive it, or every later request hangs
+                self._worker_slots.release()
+                self._fail_batch(batch, e, executor)
+                continue
+            task.add_done_callback(functools.partial(self._finish_batch, batch, executor))
+
+    def _fail_batch(self, batch: List[Tuple[Any, Dict[str, Any], asyncio.Future]], error: BaseException,
+                    executor: Optional[ProcessPoolExecutor]) -> None:
+        if isinstance(error, BrokenProcessPool) and executor is self._executor:
+            # A worker died; later batches go to fresh processes. Other batches that
+            # fail on the same broken pool find it already replaced.
+            logger.error("A transcription worker died (%s); restarting the worker processes.", error)
+            self.restart_workers()
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _finish_batch(self, batch: List[Tuple[Any, Dict[str, Any], asyncio.Future]],
+                      executor: Optional[ProcessPoolExecutor], task: asyncio.Future) -> None:
+        """
+        Fans the batch results back out to the waiting requests.
+        """
+        self._worker_slots.release()
+        error = task.exception() if not task.cancelled() else asyncio.CancelledError()
+        if error is not None:
+            self._fail_batch(batch, error, executor)
+            return
+        for i, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if "error" in task.result()[i]:
+                output = task.result()[i]
+                error_type = InvalidAudioError if output.get("invalid_audio") else TranscriptionError
+                future.set_exception(error_type(output["error"]))
+            else:
+                future.set_result(task.result()[i])
+
+    def restart_workers(self) -> None:
+        """
+        Replaces the worker processes (e.g. after one died loading its
+        model); queued jobs stay queued and go to the new ones.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._warm_barrier = None
+
+    def shutdown(self) -> None:
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+            self._batcher_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._warm_barrier = None
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from .lru_cache import SingleFlightLRUCache
+from .observability import TRANSCRIPTION_CACHE_LOOKUPS
+
+# --- Configuration (override with environment variables) ---
+TRANSCRIPTION_CACHE_ENABLED = os.getenv("TRANSCRIPTION_CACHE_ENABLED", "1") != "0"
+# Memory budget for cached results; a typical entry is a few hundred bytes
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+def make_transcription_key(data: bytes, language: Optional[str], denoise: str, vad: bool,
+                           cascade: bool, models: Tuple[str, ...]) -> str:
+    """
+    Hashes the uploaded bytes together with every setting that can change
+    the transcript, so a retried upload maps to the same entry.
+    """
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update("\x1f".join([language or "", denoise, str(vad), str(cascade), *models]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TranscriptionCache(SingleFlightLRUCache[Dict[str, Any]]):
+    """
+    LRU cache of transcription results bounded by a byte budget. Identical
+    uploads already being transcribed share one inference (single-flight),
+    so later callers still get the result if the first one disconnects.
+    Failures are not cached.
+    """
+
+    def __init__(self, max_bytes: int = TRANSCRIPTION_CACHE_MAX_BYTES, enabled: bool = TRANSCRIPTION_CACHE_ENABLED):
+        super().__init__(max_bytes=max_bytes, enabled=enabled)
+
+    def entry_size(self, key: str, result: Dict[str, Any]) -> int:
+        return len(key) + len(json.dumps(result, default=str))
+
+    def count(self, outcome: str) -> None:
+        super().count(outcome)
+        TRANSCRIPTION_CACHE_LOOKUPS.inc(result=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "bytes": self.bytes, "max_bytes": self.max_bytes}
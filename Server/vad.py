@@ -0,0 +1,91 @@
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+from .audio_processing import SAMPLE_RATE
+
+# --- Energy-based voice activity detection (works on 16 kHz buffers) ---
+
+VAD_FRAME_SAMPLES = SAMPLE_RATE * 30 // 1000  # 30 ms frames
+# Frames quieter than this are never speech (dBFS)
+VAD_MIN_DB = float(os.getenv("VAD_MIN_DB", "-50"))
+# Speech must stand this far above the noise floor (or within this of the peak)
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "6"))
+# Audio kept around each speech region so word edges are not clipped
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "200"))
+# Speech regions shorter than this (before padding) are treated as clicks
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "90"))
+# Speech is regrouped into chunks that fit one Whisper window
+MAX_CHUNK_SECONDS = 30
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") != "0"
+
+
+def frame_levels(samples: np.ndarray) -> np.ndarray:
+    """
+    Returns the level of every 30 ms frame in dBFS.
+    """
+    usable = samples.size - samples.size % VAD_FRAME_SAMPLES
+    frames = samples[:usable].reshape(-1, VAD_FRAME_SAMPLES)
+    return 10 * np.log10(np.mean(np.square(frames), axis=1) + 1e-10)
+
+
+def detect_speech(samples: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Finds the speech regions of a buffer as (start, end) sample offsets.
+
+    The threshold adapts to the recording: a frame counts as speech when it
+    is VAD_MARGIN_DB above the noise floor (10th percentile level) or within
+    VAD_MARGIN_DB of the loudest frame, and never below VAD_MIN_DB. This is
+    deliberately conservative: steady noise with no quiet gaps is kept
+    rather than risk dropping continuous speech.
+    """
+    levels = frame_levels(samples)
+    if levels.size == 0:
+        return []
+
+    floor, peak = np.percentile(levels, 10), levels.max()
+    threshold = max(VAD_MIN_DB, min(floor + VAD_MARGIN_DB, peak - VAD_MARGIN_DB))
+    speech = levels > threshold
+
+    # Drop regions too short to be speech, then pad (which also bridges short pauses)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], speech.astype(np.int8), [0]])))
+    min_frames = max(1, VAD_MIN_SPEECH_MS * SAMPLE_RATE // 1000 // VAD_FRAME_SAMPLES)
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < min_frames:
+            speech[start:end] = False
+
+    pad_frames = VAD_PAD_MS * SAMPLE_RATE // 1000 // VAD_FRAME_SAMPLES
+    if pad_frames:
+        speech = np.convolve(speech, np.ones(2 * pad_frames + 1), mode="same") > 0
+
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], speech.astype(np.int8), [0]])))
+    return [
+        (int(start) * VAD_FRAME_SAMPLES, min(int(end) * VAD_FRAME_SAMPLES, samples.size))
+        for start, end in zip(edges[::2], edges[1::2])
+    ]
+
+
+def speech_chunks(samples: np.ndarray) -> List[np.ndarray]:
+    """
+    Trims non-speech and packs the speech regions (without the silence
+    between them) into chunks of at most MAX_CHUNK_SECONDS, so each chunk
+    fits a single batched Whisper window. A single region longer than that
+    becomes its own chunk. Returns [] when there is no speech at all.
+    """
+    max_samples = MAX_CHUNK_SECONDS * SAMPLE_RATE
+    chunks: List[np.ndarray] = []
+    current: List[np.ndarray] = []
+    current_size = 0
+
+    for start, end in detect_speech(samples):
+        region = samples[start:end]
+        if current and current_size + region.size > max_samples:
+            chunks.append(np.concatenate(current))
+            current, current_size = [], 0
+        current.append(region)
+        current_size += region.size
+
+    if current:
+        chunks.append(np.concatenate(current))
+    return chunks
@@ -198,13 +198,16 @@ export default function App() {
       }
 
       formData.append("file", file as any);
+      // Chat fields travel with the audio so the server answers in the same round-trip
+      formData.append("driver_type", driverType);
+      formData.append("chat_history", JSON.stringify(chatHistory.slice(-4)));
 
       // Add language parameter if a language is selected
       // Extract the language code from the selected language (typically first 2 characters of the language string)
       const languageCode = selectedLanguage ? selectedLanguage.split('-')[0].toLowerCase() : null;
       const url = languageCode
-        ? "http://192.168.100.5:8000/transcribe?language=" + encodeURIComponent(languageCode)
-        : "http://192.168.100.5:8000/transcribe";
+        ? "http://192.168.100.5:8000/voice-chat?language=" + encodeURIComponent(languageCode)
+        : "http://192.168.100.5:8000/voice-chat";
 
 
       // Debugging log
@@ -232,10 +235,13 @@ export default function App() {
         const transcriptionText = response.data.transcription;
         addMessageToHistory('user', transcriptionText); // Add user message to history
   
-        // Now send that to chatbot
-        await sendToChatbot(transcriptionText);
+        // The reply comes back with the transcript, no second request needed
+        const botReply = response.data.reply;
+        addMessageToHistory('bot', botReply); // Add bot message to history
+        speakResponse(botReply); // Speak the response
   
         console.log("Transcription:", transcriptionText);
+        console.log("Chatbot Reply:", botReply);
       } catch (error: any) {
         const errorMessage = "Error during transcription. Please try again.";
         console.error('Error during transcription:', error.response ? error.response.data : error.message);
@@ -250,30 +256,6 @@ export default function App() {
   };
 
 
-  // Send transcription to chatbot backend and get a response
-  const sendToChatbot = async (message: string) => {
-    try {
-       // Include the selected driver type in the request
-       // Also include the recent chat history (e.g., last 4 messages)
-       const recentHistory = chatHistory.slice(-4);
-
-      const response = await axios.post('http://192.168.100.5:8000/chat', {
-        message: message,
-        driver_type: driverType, // Add driver type here
-        chat_history: recentHistory // Add recent history here
-      });
-  
-      const botReply = response.data.reply;
-      console.log("Chatbot Reply:", botReply);
-      addMessageToHistory('bot', botReply); // Add bot message to history
-      speakResponse(botReply); // Speak the response
-    } catch (error: any) {
-      const errorMessage = "Error contacting chatbot. Please try again.";
-      console.error("Error contacting chatbot:", error.response ? error.response.data : error.message);
-      addMessageToHistory('error', errorMessage); // Add error message to history
-    }
-  };
-  
   // Function to replay the last bot message
   const replayLastBotMessage = () => {
     const lastBotMessage = [...chatHistory].reverse().find(msg => msg.sender === 'bot');
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Server/ is imported as a package from the repository root, as uvicorn does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The chatbot refuses to start without a key; tests never reach Gemini
+os.environ.setdefault("GEMINI_API_KEY", "test")
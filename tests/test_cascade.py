@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from Server import transcriber
+from Server.transcriber import CASCADE_LOGPROB_THRESHOLD, CASCADE_NO_SPEECH_THRESHOLD, _transcribe_batch
+
+# Draft-model decode per clip: (avg_logprob, no_speech_prob, compression_ratio)
+DRAFT_SCORES = {
+    0: (CASCADE_LOGPROB_THRESHOLD + 0.01, 0.1, 1.5),   # Confident: the draft answers
+    1: (CASCADE_LOGPROB_THRESHOLD, CASCADE_NO_SPEECH_THRESHOLD, 1.5),  # Exactly at both bars: still kept
+    2: (CASCADE_LOGPROB_THRESHOLD - 0.01, 0.1, 1.5),   # Unsure of the words
+    3: (-0.1, CASCADE_NO_SPEECH_THRESHOLD + 0.01, 1.5),  # Probably not speech
+    4: (-0.1, 0.1, 3.0),                               # Repetitive output
+}
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """
+    Fake models: each decode reports the scores above for the draft model
+    and a confident result for the main one. Returns (model, clip) per decode.
+    """
+    calls = []
+
+    def decode_window(model, audios, language, prompt=None):
+        decoded = []
+        for audio in audios:
+            clip = int(audio[0])
+            calls.append((model, clip))
+            logprob, no_speech, compression = DRAFT_SCORES[clip] if model == "tiny" else (-0.2, 0.05, 1.2)
+            result = SimpleNamespace(text=f"{model} says {clip}", language="en", avg_logprob=logprob,
+                                     no_speech_prob=no_speech, compression_ratio=compression)
+            decoded.append((result, 0.9))
+        return decoded
+
+    monkeypatch.setattr(transcriber, "_get_model", lambda name: name)
+    monkeypatch.setattr(transcriber, "_decode_window", decode_window)
+    monkeypatch.setattr(transcriber, "_primary_model_name", "base")
+    monkeypatch.setattr(transcriber, "_draft_model_name", "tiny")
+    return calls
+
+
+def clips(*ids):
+    return [np.full(16000, clip, dtype=np.float32) for clip in ids]
+
+
+def test_unsure_draft_results_are_redone_by_the_main_model(decodes):
+    ids = sorted(DRAFT_SCORES)
+    results = _transcribe_batch(clips(*ids), ["en"] * len(ids), [True] * len(ids))
+    assert [(result["tier"], result["text"]) for result in results] == [
+        ("tiny", "tiny says 0"),
+        ("tiny", "tiny says 1"),
+        ("base", "base says 2"),
+        ("base", "base says 3"),
+        ("base", "base says 4"),
+    ]
+    # Every clip tried the draft once; only the escalated ones reached the main model
+    assert sorted(clip for model, clip in decodes if model == "tiny") == ids
+    assert sorted(clip for model, clip in decodes if model == "base") == [2, 3, 4]
+
+
+def test_clips_without_the_cascade_skip_the_draft(decodes):
+    results = _transcribe_batch(clips(0, 2), ["en", "en"], [False, False])
+    assert [result["tier"] for result in results] == ["base", "base"]
+    assert all(model == "base" for model, _ in decodes)
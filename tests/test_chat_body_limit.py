@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import chatbot, server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def ask_chatbot(message, driver_type, chat_history):
+        return f"echo {len(message)}"
+
+    monkeypatch.setattr(server, "ask_chatbot", ask_chatbot)
+    return TestClient(server.app)
+
+
+def chunked(body: bytes, size: int = 1024):
+    # A generator body makes httpx send Transfer-Encoding: chunked, without Content-Length
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def chat_body(message_chars: int, history_turns: int = 0) -> bytes:
+    history = [{"sender": "user", "text": "x" * 2000} for _ in range(history_turns)]
+    return json.dumps({"message": "m" * message_chars, "driver_type": "ride", "chat_history": history}).encode()
+
+
+def test_small_chunked_body_is_accepted(client):
+    response = client.post("/chat", content=chunked(chat_body(10)), headers={"content-type": "application/json"})
+    assert response.status_code == 200
+    assert response.json() == {"reply": "echo 10"}
+
+
+def test_oversized_chunked_body_is_rejected(client):
+    body = chat_body(10, history_turns=45)
+    assert len(body) > server.CHAT_MAX_BODY_BYTES
+    response = client.post("/chat", content=chunked(body), headers={"content-type": "application/json"})
+    assert response.status_code == 413
+    assert "exceeds" in response.json()["error"]
+
+
+def test_oversized_content_length_is_rejected(client):
+    body = chat_body(10, history_turns=45)
+    response = client.post("/chat/stream", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 413
+
+
+def test_other_paths_are_not_limited(client):
+    response = client.post("/kb/ingest", content=chunked(b"\\n" * (server.CHAT_MAX_BODY_BYTES + 10)))
+    assert response.status_code != 413
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import chatbot, server
+from Server.knowledge_base import get_conversation_guideline
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chatbot, "answer_locally", lambda *args: None)
+    monkeypatch.setattr(chatbot.reply_cache, "enabled", False)
+    return TestClient(server.app)
+
+
+def stream_fragments(monkeypatch, fragments):
+    async def stream_generate_content(payload):
+        for fragment in fragments:
+            yield fragment
+
+    monkeypatch.setattr(chatbot.gemini_client, "stream_generate_content", stream_generate_content)
+
+
+def test_empty_llm_stream_sends_the_error_guideline(client, monkeypatch):
+    stream_fragments(monkeypatch, ["", "  "])
+    response = client.post("/chat/stream", json={"message": "hmm", "driver_type": "ride", "session_id": "empty-1"})
+    events = parse_events(response.text)
+    error_reply = get_conversation_guideline("error")
+    assert events == [("chunk", {"text": error_reply}), ("done", {"reply": error_reply, "source": "error"})]
+    # Nothing was said, so the session does not get an empty (or error) bot turn
+    assert server.session_store.history("empty-1") == []
+
+
+def test_streamed_reply_is_chunked_and_recorded(client, monkeypatch):
+    stream_fragments(monkeypatch, ["Sure, the airport is about forty minutes away. ", "Drive safe!"])
+    response = client.post("/chat/stream", json={"message": "how far", "driver_type": "ride", "session_id": "full-1"})
+    events = parse_events(response.text)
+    assert events[-1] == ("done", {"reply": "Sure, the airport is about forty minutes away. Drive safe!",
+                                   "source": "llm"})
+    assert [data["text"] for kind, data in events if kind == "chunk"] == [
+        "Sure, the airport is about forty minutes away.", "Drive safe!"
+    ]
+    assert [turn["sender"] for turn in server.session_store.history("full-1")] == ["user", "bot"]
+    server.session_store.reset("full-1")
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from Server.denoise import SpectralGate, denoise_audio
+
+RATE = 16000
+
+
+def noisy_tone(seconds=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    tone[: RATE // 2] = 0  # Leading noise-only stretch for the profile
+    noise = 0.02 * rng.standard_normal(t.size)
+    return tone.astype(np.float32), (tone + noise).astype(np.float32)
+
+
+# The hard gate lets through noise bins that peak above its threshold
+@pytest.mark.parametrize("mode, max_ratio", [("fast", 0.8), ("full", 0.5)])
+def test_noise_is_reduced_and_the_tone_kept(mode, max_ratio):
+    tone, noisy = noisy_tone()
+    output = denoise_audio(noisy, mode)
+    assert output.shape == noisy.shape and output.dtype == np.float32
+    quiet = slice(0, RATE // 2)
+    assert np.std(output[quiet]) < max_ratio * np.std(noisy[quiet])
+    loud = slice(RATE, 2 * RATE)
+    assert np.corrcoef(output[loud], tone[loud])[0, 1] > 0.95
+
+
+def test_off_and_short_buffers_pass_through():
+    _, noisy = noisy_tone()
+    assert denoise_audio(noisy, "off") is noisy
+    short = noisy[:100]
+    assert denoise_audio(short, "fast") is short
+    with pytest.raises(ValueError):
+        denoise_audio(noisy, "loud")
+
+
+@pytest.mark.parametrize("mode", ["fast", "full"])
+def test_streaming_matches_one_pass_for_a_fixed_profile(mode):
+    _, noisy = noisy_tone(seed=1)
+    profile = np.full(257, 0.05, dtype=np.float32)
+    whole = SpectralGate(mode, noise_profile=profile)
+    expected = np.concatenate([whole.process(noisy), whole.flush()])
+
+    streamed = SpectralGate(mode, noise_profile=profile)
+    pieces = [streamed.process(noisy[i:i + 1234]) for i in range(0, noisy.size, 1234)]
+    output = np.concatenate(pieces + [streamed.flush()])
+    assert output.size == noisy.size == expected.size
+    np.testing.assert_allclose(output, expected, atol=1e-5)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from Server import gemini_client as gemini_module
+from Server.gemini_client import GeminiClient, GeminiNotConfigured
+
+REPLY = {"candidates": [{"content": {"parts": [{"text": "Hello"}]}}]}
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    """
+    Routes the client's pooled connection to a handler the test supplies,
+    and skips the backoff sleeps.
+    """
+    handlers = []
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(gemini_module.httpx, "AsyncClient",
+                        lambda **kwargs: real_client(transport=httpx.MockTransport(handlers[0]), **kwargs))
+    monkeypatch.setattr(gemini_module.random, "uniform", lambda low, high: 0)
+    return handlers
+
+
+def run(coroutine_fn):
+    return asyncio.run(coroutine_fn())
+
+
+def test_retries_429_and_5xx_then_succeeds(transport):
+    statuses = iter([429, 503, 200])
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        status = next(statuses)
+        return httpx.Response(status, json=REPLY if status == 200 else {}, headers={"Retry-After": "0"})
+
+    transport.append(handler)
+    client = GeminiClient("key", model="m", base_url="http://gemini.test/")
+
+    async def main():
+        try:
+            return await client.generate_content({"contents": []})
+        finally:
+            await client.aclose()
+
+    assert run(main) == REPLY
+    assert len(seen) == 3
+    assert seen[0].url == "http://gemini.test/models/m:generateContent"
+    assert seen[0].headers["x-goog-api-key"] == "key"
+
+
+def test_gives_up_after_max_retries(transport):
+    calls = []
+    transport.append(lambda request: calls.append(1) or httpx.Response(500))
+    client = GeminiClient("key", base_url="http://gemini.test", max_retries=2)
+
+    async def main():
+        try:
+            await client.generate_content({})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(main)
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried(transport):
+    calls = []
+    transport.append(lambda request: calls.append(1) or httpx.Response(400))
+    client = GeminiClient("key", base_url="http://gemini.test")
+
+    async def main():
+        try:
+            await client.generate_content({})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(main)
+    assert calls == [1]
+
+
+def test_concurrent_calls_are_capped(transport):
+    active, peak = [0], [0]
+
+    async def handler(request):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return httpx.Response(200, json=REPLY)
+
+    transport.append(handler)
+    client = GeminiClient("key", base_url="http://gemini.test", max_concurrency=2)
+
+    async def main():
+        try:
+            return await asyncio.gather(*(client.generate_content({}) for _ in range(6)))
+        finally:
+            await client.aclose()
+
+    assert run(main) == [REPLY] * 6
+    assert peak[0] == 2
+
+
+def test_stream_yields_text_fragments(transport):
+    events = [{"candidates": [{"content": {"parts": [{"text": text}]}}]} for text in ("Hel", "lo", "")]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+    transport.append(lambda request: httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"}))
+    client = GeminiClient("key", base_url="http://gemini.test")
+
+    async def main():
+        try:
+            return [fragment async for fragment in client.stream_generate_content({})]
+        finally:
+            await client.aclose()
+
+    assert run(main) == ["Hel", "lo"]
+
+
+def test_missing_key_fails_like_a_call_error():
+    client = GeminiClient("")
+    assert not client.configured
+    assert issubclass(GeminiNotConfigured, httpx.HTTPError)
+    with pytest.raises(GeminiNotConfigured):
+        run(lambda: client.generate_content({}))
@@ -0,0 +1,64 @@
+import logging
+
+from Server import chatbot
+from Server.chatbot import HISTORY_COMPACT_CHARS, HISTORY_RECENT_TURNS, estimate_tokens, format_history
+
+
+def turns(count, length=50):
+    return [{"sender": "user" if i % 2 == 0 else "bot", "text": f"{i:03d}" + "x" * length} for i in range(count)]
+
+
+def test_short_history_is_kept_verbatim_in_order():
+    history = turns(3, length=5)
+    assert format_history(history) == "\n".join(
+        f"{turn['sender'].capitalize()}: {turn['text']}" for turn in history
+    )
+
+
+def test_older_turns_are_compacted_and_recent_ones_kept_whole():
+    history = turns(HISTORY_RECENT_TURNS + 2, length=HISTORY_COMPACT_CHARS * 2)
+    lines = format_history(history, token_budget=10_000).split("\n")
+    assert len(lines) == len(history)
+    for line in lines[:2]:
+        assert line.endswith("...") and len(line.split(": ", 1)[1]) == HISTORY_COMPACT_CHARS + 3
+    assert all(not line.endswith("...") for line in lines[2:])
+
+
+def test_history_is_cut_to_the_token_budget_from_the_oldest_end():
+    history = turns(40)
+    formatted = format_history(history, token_budget=100)
+    lines = formatted.split("\n")
+    kept = lines[1:]
+    assert lines[0] == f"({len(history) - len(kept)} earlier messages omitted)"
+    assert kept[-1].endswith(history[-1]["text"])
+    assert sum(estimate_tokens(line) + 1 for line in kept) <= 100
+
+
+def test_prompt_size_stays_bounded_as_history_grows():
+    short = chatbot.create_prompt("hi", "ride", turns(5))
+    long = chatbot.create_prompt("hi", "ride", turns(500))
+    assert len(long) - len(short) < chatbot.HISTORY_TOKEN_BUDGET * chatbot.CHARS_PER_TOKEN
+
+
+
+def test_prompt_size_is_logged_and_exported():
+    def exported():
+        lines = [line for line in chatbot.PROMPT_TOKENS.render() if line.startswith("llm_prompt_tokens_count")]
+        return int(lines[0].rsplit(" ", 1)[1]) if lines else 0
+
+    records = []
+    handler = logging.Handler(logging.INFO)
+    handler.emit = records.append
+    logger = logging.getLogger("Server.chatbot")
+    logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    before = exported()
+    try:
+        chatbot.log_prompt_size("x" * 400, turns(3), {"promptTokenCount": 123})
+        chatbot.log_prompt_size("x" * 400, turns(3))
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+    assert [record.getMessage().split(",")[0] for record in records] == ["LLM prompt: 123 tokens", "LLM prompt: ~100 tokens"]
+    assert exported() == before + 2
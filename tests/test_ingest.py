@@ -0,0 +1,96 @@
+import asyncio
+import copy
+import logging
+
+import pytest
+
+from Server import ingest
+from Server.ingest import FeedIngestor, expire_periodically
+from Server.knowledge_base import KNOWLEDGE_BASE, ORDER_RANKINGS, create_stores
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def ingestor():
+    orders, rides = copy.deepcopy(KNOWLEDGE_BASE["orders"]), copy.deepcopy(KNOWLEDGE_BASE["ride_requests"])
+    order_store, ride_store = create_stores(orders, rides, "indexed")
+    return FeedIngestor({"order": order_store, "ride": ride_store}, default_ttl_seconds=60)
+
+
+def new_order(order_id, **fields):
+    return {"order_id": order_id, "pickup_location": "A", "delivery_location": "B", "reward": 9,
+            "time_estimate": 10, "traffic_condition": "light", "priority": "high", **fields}
+
+
+def rankings(store):
+    return {name: [record["order_id"] for record in store.top(name, len(store))] for name in ORDER_RANKINGS}
+
+
+def test_mistyped_update_is_rejected_before_the_store_changes(ingestor):
+    store = ingestor.stores["order"]
+    before = rankings(store)
+    stats = ingestor.ingest([{"order_id": 1, "reward": "12"}], now=NOW)
+    assert stats["rejected"] == 1 and stats["upserted"] == 0
+    assert "reward must be a number" in stats["errors"][0]
+    assert store.get(1)["reward"] == 10 and rankings(store) == before
+    # The record is still fully indexed: update, delete and expiry all work
+    stats = ingestor.ingest([{"order_id": 1, "reward": 12}, {"order_id": 2, "deleted": True}], now=NOW)
+    assert (stats["upserted"], stats["removed"], stats["rejected"]) == (1, 1, 0)
+    assert ingestor.expire(NOW + 61) == 1 and store.get(1) is None
+
+
+@pytest.mark.parametrize("record, error", [
+    (new_order(70, reward=True), "reward must be a number"),
+    (new_order(71, time_estimate=float("nan")), "time_estimate must be a number"),
+    (new_order(72, priority=3), "priority must be a string"),
+    ({"ride_id": 101, "passenger_rating": "5"}, "passenger_rating must be a number"),
+    ({"order_id": [1]}, "order_id must be an integer or a string"),
+    (new_order(73, ttl_seconds="soon"), "could not convert"),
+])
+def test_invalid_records_are_rejected(ingestor, record, error):
+    stats = ingestor.ingest([record], now=NOW)
+    assert stats["rejected"] == 1 and stats["upserted"] == 0
+    assert error in stats["errors"][0]
+
+
+def test_new_records_need_every_field(ingestor):
+    stats = ingestor.ingest([{"order_id": 80, "reward": 5}], now=NOW)
+    assert "missing" in stats["errors"][0]
+    assert ingestor.stores["order"].get(80) is None
+
+
+def test_ttl_expiry_and_refresh(ingestor):
+    store = ingestor.stores["order"]
+    ingestor.ingest([new_order(90, ttl_seconds=10), new_order(91), new_order(92, ttl_seconds=0)], now=NOW)
+    assert ingestor.pending() == 2  # ttl 0 never expires
+    assert ingestor.expire(NOW + 5) == 0
+    # A refresh pushes the deadline back; the old heap entry is ignored
+    ingestor.ingest([{"order_id": 90, "ttl_seconds": 100}], now=NOW + 5)
+    assert ingestor.expire(NOW + 61) == 1  # Only 91, at the default TTL
+    assert store.get(90) is not None and store.get(91) is None
+    assert ingestor.expire(NOW + 106) == 1 and store.get(90) is None
+    assert store.get(92) is not None
+    assert ingestor.expired_total == 2 and ingestor.pending() == 0
+
+
+def test_expire_periodically_survives_a_failure(ingestor, monkeypatch, caplog):
+    calls = []
+
+    def expire():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("broken entry")
+        return 0
+
+    monkeypatch.setattr(ingest.feed_ingestor, "expire", expire)
+
+    async def main():
+        task = asyncio.ensure_future(expire_periodically(interval=0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    with caplog.at_level(logging.ERROR, logger="Server.ingest"):
+        asyncio.run(main())
+    assert len(calls) > 1
+    assert "Expiring live-feed records failed" in caplog.text
@@ -0,0 +1,79 @@
+import pytest
+
+from Server.intent_classifier import IntentClassifier, load_corpus, resolve_reference
+
+RIDE_LIST = [{"sender": "user", "text": "any rides?"},
+             {"sender": "bot", "text": "Top rides:\n- Ride 101: KLCC to Mid Valley\n- Ride 205: Bangsar to KL Sentral"}]
+
+ORDER_LIST = [{"sender": "bot", "text": "Top orders:\n- Order 7: Sushi King\n- Order 12: Nando's"}]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return IntentClassifier(load_corpus())
+
+
+@pytest.mark.parametrize("message, driver_type, intent", [
+    ("got any jobs near me", "delivery", "suggest_orders"),
+    ("skip this one", "ride", "reject_ride"),
+    ("give me details on order 9", "delivery", "order_details"),
+])
+def test_paraphrases_are_routed(classifier, message, driver_type, intent):
+    route = classifier.route(message, driver_type)
+    assert route is not None and route.intent == intent
+
+
+def test_only_the_driver_types_intents_compete(classifier):
+    assert classifier.route("take the second one", "ride", RIDE_LIST).intent == "accept_ride"
+    assert classifier.route("take the second one", "delivery", ORDER_LIST).intent == "accept_order"
+    assert classifier.predict("hello", "boat") is None
+
+
+def test_other_and_unsure_messages_go_to_the_llm(classifier):
+    assert classifier.route("what's the weather like", "ride") is None
+    strict = IntentClassifier(load_corpus(), threshold=0.999)
+    assert strict.route("got any jobs near me", "delivery") is None
+
+
+def test_id_intents_without_a_resolvable_id_go_to_the_llm(classifier):
+    assert classifier.route("take the second one", "ride") is None
+    assert classifier.route("take the second one", "ride", RIDE_LIST).slots == {"id": "205"}
+
+
+def test_resolve_reference():
+    assert resolve_reference("accept ride 7", "ride", RIDE_LIST) == "7"
+    assert resolve_reference("the last one", "ride", RIDE_LIST) == "205"
+    assert resolve_reference("the fifth one", "ride", RIDE_LIST) is None
+    # "that one" needs a single candidate
+    assert resolve_reference("accept that one", "ride", RIDE_LIST) is None
+    details = [{"sender": "bot", "text": "Ride ID 101: KLCC to Mid Valley"}]
+    assert resolve_reference("accept that one", "ride", details) == "101"
+    assert resolve_reference("accept that one", "ride", None) is None
+
+
+def test_references_only_count_the_driver_types_records():
+    # A delivery driver is never handed a ride ID from the list, and the other way round
+    assert resolve_reference("the second one", "delivery", RIDE_LIST) is None
+    order_details = [{"sender": "bot", "text": "Order ID 7: Sushi King to Bangsar"}]
+    assert resolve_reference("accept that one", "ride", order_details) is None
+    assert resolve_reference("accept that one", "delivery", order_details) == "7"
+
+
+@pytest.mark.parametrize("message, driver_type", [
+    ("do not accept order 7", "delivery"),
+    ("I accepted the wrong order", "delivery"),
+    ("don't take ride 101", "ride"),
+    ("never accept that one", "ride"),
+    ("I didn't accept it", "ride"),
+    ("I took the wrong ride", "ride"),
+])
+def test_negated_or_past_accepts_are_not_routed(classifier, message, driver_type):
+    details = [{"sender": "bot", "text": "Order ID 7: Sushi King to Bangsar\nRide ID 101: KLCC to Mid Valley"}]
+    assert classifier.route(message, driver_type, details) is None
+
+
+def test_accepting_needs_the_higher_threshold(classifier):
+    # Sure enough for the general bar, not for accepting
+    assert classifier.predict("go for order 12", "delivery").intent == "accept_order"
+    assert classifier.route("go for order 12", "delivery") is None
+    assert classifier.route("i'll take ride 101", "ride") == ("accept_ride", {"id": "101"})
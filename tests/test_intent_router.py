@@ -0,0 +1,30 @@
+from Server.benchmarks.intent_router_benchmark import CORPUS, check_parity, fuzz_parity
+from Server.intent_router import IntentRouter, Route, asked_for_preference
+
+router = IntentRouter()
+
+
+def test_router_matches_the_legacy_chain_on_the_corpus():
+    assert check_parity(router) == []
+
+
+def test_router_matches_the_legacy_chain_on_random_messages():
+    assert fuzz_parity(router, 3000, seed=7) == []
+
+
+def test_slots_and_preferences():
+    assert router.route("Accept ride ID: 104", "ride") == Route("accept_ride", {"id": "104"})
+    assert router.route("any good rides with the highest fare?", "ride") == Route(
+        "suggest_rides", {"preference": "fare"}
+    )
+    history = [{"sender": "bot", "text": "What's most important to you for delivery orders: high reward, shortest time or light traffic?"}]
+    assert asked_for_preference("delivery", history)
+    assert router.route("minimal traffic", "delivery", True) == Route("order_preference", {"preference": "traffic"})
+    # Preference intents only apply right after the bot asked
+    assert router.route("minimal traffic", "delivery", False) is None
+
+
+def test_chatter_goes_to_the_llm():
+    for message, driver_type, _ in CORPUS:
+        if message in ("tell me a joke", "hello", "thanks a lot"):
+            assert router.route(message, driver_type) is None
@@ -0,0 +1,39 @@
+from Server import language_cache as language_cache_module
+from Server.language_cache import LanguageCache
+
+
+def detected(language="es", probability=0.95):
+    return {"language": language, "language_probability": probability, "avg_logprob": -0.3}
+
+
+def test_confident_detection_is_reused_per_key():
+    cache = LanguageCache()
+    cache.record("driver-1", detected(), used_cached=False)
+    assert cache.get("driver-1") == "es"
+    assert cache.get("driver-2") is None and cache.get(None) is None
+
+
+def test_uncertain_detection_is_not_remembered():
+    cache = LanguageCache(min_probability=0.7)
+    cache.record("driver-1", detected(probability=0.5), used_cached=False)
+    assert cache.get("driver-1") is None
+
+
+def test_poor_decode_with_the_cached_language_forces_redetection():
+    cache = LanguageCache(redetect_logprob=-1.0)
+    cache.record("driver-1", detected(), used_cached=False)
+    cache.record("driver-1", {"avg_logprob": -0.5}, used_cached=True)
+    assert cache.get("driver-1") == "es"
+    cache.record("driver-1", {"avg_logprob": -2.0}, used_cached=True)
+    assert cache.get("driver-1") is None
+
+
+def test_entries_expire_and_oldest_are_evicted(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(language_cache_module.time, "monotonic", lambda: clock[0])
+    cache = LanguageCache(ttl_seconds=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.record(key, detected(), used_cached=False)
+    assert cache.get("a") is None and cache.get("b") == "es"
+    clock[0] += 61
+    assert cache.get("b") is None and cache.get("c") is None
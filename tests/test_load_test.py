@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+
+from Server.audio_processing import SAMPLE_RATE, decode_audio
+from Server.benchmarks import load_test
+
+
+def test_summary_percentiles():
+    latencies = [i / 1000 for i in range(1, 101)]  # 1..100 ms
+    summary = load_test.summarize(latencies, errors=2, wall_seconds=2.0)
+    assert summary == {"requests": 100, "errors": 2, "throughput_rps": 50.0,
+                       "p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0, "mean_ms": 50.5}
+    assert load_test.summarize([], errors=3, wall_seconds=1.0) == {"requests": 0, "errors": 3}
+
+
+def test_fixture_clips_decode_at_their_length():
+    clips = load_test.make_audio_fixtures(None)
+    assert [label for label, _, _ in clips] == [label for label, _, _ in load_test.AUDIO_FIXTURES]
+    for (label, seconds, _), (_, name, data) in zip(load_test.AUDIO_FIXTURES, clips):
+        samples = decode_audio(data)
+        assert name == f"{label}.wav" and abs(samples.size - seconds * SAMPLE_RATE) <= SAMPLE_RATE // 100
+        assert np.abs(samples).max() > 0.01
+
+
+def test_drive_respects_concurrency_and_counts_errors_per_route():
+    active, peak = [0], [0]
+
+    async def send(client, i):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.001)
+        active[0] -= 1
+        if i % 5 == 0:
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200 if i % 2 else 500)
+
+    result = asyncio.run(load_test.drive(20, 3, send, lambda i: "odd" if i % 2 else "even", timeout=1.0))
+    assert peak[0] == 3
+    assert result["all"]["requests"] + result["all"]["errors"] == 20
+    assert result["by_route"]["even"]["requests"] == 0 and result["by_route"]["even"]["errors"] == 10
+    assert result["by_route"]["odd"] == {**result["by_route"]["odd"], "requests": 8, "errors": 2}
+
+
+def test_compare_prints_ratios_of_latency_figures(tmp_path, capsys):
+    baseline, current = tmp_path / "baseline.json", tmp_path / "current.json"
+    baseline.write_text(json.dumps({"results": {"chat": {"all": {"p50_ms": 10.0, "requests": 5}}, "micro": {"route_us": 4}}}))
+    current.write_text(json.dumps({"results": {"chat": {"all": {"p50_ms": 5.0, "requests": 9}}, "micro": {"route_us": 8}}}))
+    load_test.compare(str(baseline), str(current))
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("chat.all.p50_ms") and lines[0].endswith("x0.50")
+    assert lines[1].startswith("micro.route_us") and lines[1].endswith("x2.00")
@@ -0,0 +1,83 @@
+import io
+import json
+import logging
+import threading
+
+from fastapi.testclient import TestClient
+
+from Server import observability, server
+
+
+def test_request_log_lines_are_written_off_the_event_loop():
+    observability.configure_logging()
+    listener = observability._log_listener
+    assert listener is not None
+    (stream_handler,) = listener.handlers
+    queue_handlers = [h for h in logging.getLogger("Server").handlers if isinstance(h, logging.handlers.QueueHandler)]
+    assert len(queue_handlers) == 1
+
+    written = io.StringIO()
+    writer_threads = []
+    original_emit = stream_handler.emit
+
+    def emit(record):
+        writer_threads.append(threading.current_thread())
+        original_emit(record)
+
+    previous_stream = stream_handler.setStream(written)
+    stream_handler.emit = emit
+    try:
+        response = TestClient(server.app).get("/healthz", headers={"X-Request-ID": "req-123"})
+        assert response.status_code == 200
+        # stop() drains the queue; start it again for the other tests
+        listener.stop()
+        listener.start()
+    finally:
+        del stream_handler.emit
+        stream_handler.setStream(previous_stream)
+
+    lines = [line for line in written.getvalue().splitlines() if "/healthz" in line]
+    assert lines, written.getvalue()
+    # The request ID was captured on the request's side, before the record was queued
+    assert "[req-123]" in lines[-1]
+    assert json.loads(lines[-1].split("] ", 1)[1])["route"] == "/healthz"
+    assert all(thread is not threading.main_thread() for thread in writer_threads)
+
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    histogram = observability.Histogram("demo_seconds", "Demo.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, stage='a"b')
+    assert histogram.render() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+        'demo_seconds_bucket{stage="a\\"b",le="1"} 3',
+        'demo_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+        'demo_seconds_sum{stage="a\\"b"} 6.05',
+        'demo_seconds_count{stage="a\\"b"} 4',
+    ]
+
+
+def test_stages_are_timed_per_request_and_exported():
+    def sample(text, prefix):
+        return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+    client = TestClient(server.app)
+    route = 'http_request_duration_seconds_count{method="GET",route="/healthz",status="200"}'
+    before = sample(client.get("/metrics").text, route)
+    response = client.get("/healthz")
+    assert len(response.headers["x-request-id"]) == 32
+    assert sample(client.get("/metrics").text, route) == before + 1
+
+    timings = {}
+    token = observability._stage_timings_var.set(timings)
+    try:
+        with observability.stage("kb_lookup"):
+            pass
+        with observability.stage("kb_lookup"):
+            pass
+    finally:
+        observability._stage_timings_var.reset(token)
+    assert list(timings) == ["kb_lookup"] and timings["kb_lookup"] >= 0
+    assert 'stage_duration_seconds_count{stage="kb_lookup"}' in client.get("/metrics").text
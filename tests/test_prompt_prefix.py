@@ -0,0 +1,34 @@
+from Server import chatbot
+from Server.knowledge_base import bump_knowledge_base_version
+
+
+def test_prefix_is_built_once_per_knowledge_base_version(monkeypatch):
+    builds = []
+    build = chatbot.build_prompt_prefix
+    monkeypatch.setattr(chatbot, "build_prompt_prefix", lambda driver_type: builds.append(driver_type) or build(driver_type))
+    monkeypatch.setattr(chatbot, "_prompt_prefixes", {})
+
+    first = chatbot.get_prompt_prefix("ride")
+    assert chatbot.get_prompt_prefix("ride") is first
+    chatbot.get_prompt_prefix("delivery")
+    assert builds == ["ride", "delivery"]
+
+    bump_knowledge_base_version()
+    assert chatbot.get_prompt_prefix("ride") == first
+    assert builds == ["ride", "delivery", "ride"]
+
+
+def test_unknown_driver_types_are_not_cached(monkeypatch):
+    monkeypatch.setattr(chatbot, "_prompt_prefixes", {})
+    prefix = chatbot.get_prompt_prefix("boat")
+    assert "(boat)" in prefix and chatbot._prompt_prefixes == {}
+
+
+def test_requests_share_the_prefix_and_differ_only_after_it():
+    history = [{"sender": "user", "text": "hi"}, {"sender": "bot", "text": "Hello!"}]
+    first = chatbot.create_prompt("show me rides", "ride", history)
+    second = chatbot.create_prompt("accept ride 2", "ride", [])
+    prefix = chatbot.get_prompt_prefix("ride")
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert "User: hi\nBot: Hello!" in first and "(No history provided)" in second
+    assert first.rstrip().endswith("driver message:") and "Driver Message: show me rides" in first
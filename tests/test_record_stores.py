@@ -0,0 +1,109 @@
+import copy
+import random
+
+import pytest
+
+from Server.knowledge_base import (
+    KNOWLEDGE_BASE, ORDER_RANKINGS, RIDE_RANKINGS, calculate_order_score, create_stores,
+)
+from Server.record_store import RecordStore
+from Server.sqlite_store import SQLiteDatabase
+
+BACKENDS = ("indexed", "columnar", "sqlite")
+
+
+def seed():
+    return copy.deepcopy(KNOWLEDGE_BASE["orders"]), copy.deepcopy(KNOWLEDGE_BASE["ride_requests"])
+
+
+@pytest.fixture
+def stores(tmp_path):
+    built = {}
+    for backend in BACKENDS:
+        orders, rides = seed()
+        database = SQLiteDatabase(str(tmp_path / "kb.db")) if backend == "sqlite" else None
+        built[backend] = create_stores(orders, rides, backend, database=database)
+    return built
+
+
+def snapshot(store, rankings):
+    return {
+        "len": len(store),
+        "ids": [record[store.id_field] for record in store],
+        "top": {name: [record[store.id_field] for record in store.top(name, 6)] for name in rankings},
+    }
+
+
+def order(order_id, reward, time_estimate, traffic="moderate", priority="medium"):
+    return {"order_id": order_id, "pickup_location": "A", "delivery_location": "B", "reward": reward,
+            "time_estimate": time_estimate, "traffic_condition": traffic, "priority": priority, "score": 0}
+
+
+def test_backends_rank_the_same_after_the_same_changes(stores):
+    for order_store, ride_store in stores.values():
+        order_store.upsert(order(50, 15, 5, "light", "high"))
+        order_store.upsert(order(3, 14, 9))  # Update in place
+        order_store.remove(6)
+        order_store.upsert(order(6, 10, 12))  # Re-added: ranks after existing ties
+        ride_store.upsert({"ride_id": 106, "pickup_location": "A", "destination": "B", "estimated_fare": 22,
+                           "time_estimate": 12, "passenger_rating": 4.9, "traffic_condition": "light"})
+        ride_store.remove(104)
+
+    expected_orders = snapshot(stores["indexed"][0], ORDER_RANKINGS)
+    expected_rides = snapshot(stores["indexed"][1], RIDE_RANKINGS)
+    for backend in BACKENDS[1:]:
+        order_store, ride_store = stores[backend]
+        assert snapshot(order_store, ORDER_RANKINGS) == expected_orders, backend
+        assert snapshot(ride_store, RIDE_RANKINGS) == expected_rides, backend
+        assert order_store.computed(50, "score") == pytest.approx(stores["indexed"][0].computed(50, "score"))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_a_bad_update_leaves_the_store_unchanged(stores, backend):
+    order_store, _ = stores[backend]
+    before = snapshot(order_store, ORDER_RANKINGS)
+    old_record = order_store.get(1)
+
+    with pytest.raises((TypeError, ValueError)):
+        order_store.upsert({**old_record, "reward": "twelve"})
+    with pytest.raises((TypeError, ValueError)):
+        order_store.upsert(order(99, None, 5))
+
+    assert snapshot(order_store, ORDER_RANKINGS) == before
+    assert order_store.get(1) == old_record and order_store.get(99) is None
+    # The indexes still agree with the records: later changes work
+    assert order_store.remove(1)
+    order_store.upsert(order(1, 10, 12, priority="high"))
+    assert len(order_store) == before["len"]
+
+
+def test_record_store_mistyped_reward_keeps_index_consistent():
+    orders, _ = seed()
+    store = RecordStore("order_id", ORDER_RANKINGS, computed={"score": calculate_order_score}, records=orders)
+    with pytest.raises(TypeError):
+        store.upsert({**store.get(1), "reward": "12"})
+    assert all(len(index) == len(store) for index in store._indexes.values())
+    assert store.remove(1)
+    assert all(len(index) == len(store) for index in store._indexes.values())
+    assert 1 not in [record["order_id"] for record in store.top("reward", len(store))]
+
+
+def test_columnar_top_k_matches_the_indexed_store_under_churn():
+    # Few distinct values, so every ranking is full of ties; enough removals to trigger compaction
+    rng = random.Random(17)
+    traffic, priority = ("light", "moderate", "heavy"), ("low", "medium", "high")
+    indexed, columnar = create_stores([], [], "indexed")[0], create_stores([], [], "columnar")[0]
+    for step in range(3000):
+        order_id = rng.randrange(400)
+        if rng.random() < 0.3:
+            assert indexed.remove(order_id) == columnar.remove(order_id)
+        else:
+            record = order(order_id, rng.randrange(5, 10), rng.randrange(5, 8), rng.choice(traffic), rng.choice(priority))
+            indexed.upsert(record)
+            columnar.upsert(record)
+        if step % 250 == 0:
+            for name in ORDER_RANKINGS:
+                for count in (1, 5, 50, 1000):
+                    assert [r["order_id"] for r in columnar.top(name, count)] == \
+                        [r["order_id"] for r in indexed.top(name, count)], (step, name, count)
+    assert [r["order_id"] for r in columnar] == [r["order_id"] for r in indexed]
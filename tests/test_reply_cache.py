@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from Server import lru_cache
+from Server.reply_cache import ReplyCache
+
+
+def make_cache() -> ReplyCache:
+    return ReplyCache(max_entries=10, ttl_seconds=60, path="", enabled=True)
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "reply"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "reply"
+    assert calls == [1]
+    # The call still finished and was cached
+    assert cache.get("k") == "reply"
+    assert (cache.misses, cache.coalesced) == (1, 1)
+
+
+def test_concurrent_callers_share_one_call():
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def main():
+        first = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        return first, await cache.get_or_compute("k", compute)
+
+    replies, again = asyncio.run(main())
+    assert replies == ["reply"] * 5 and again == "reply"
+    assert calls == [1]
+    assert cache.stats()["hit_rate"] == round(5 / 6, 4)
+
+
+def test_failures_reach_every_caller_and_are_not_cached():
+    cache = make_cache()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("k") is None and not cache._in_flight
+
+
+def test_none_reply_is_not_cached():
+    cache = make_cache()
+
+    async def compute():
+        return None
+
+    assert asyncio.run(cache.get_or_compute("k", compute)) is None
+    assert cache.get("k") is None
+
+
+def test_entries_expire_and_survive_a_restart(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(lru_cache.time, "time", lambda: clock[0])
+    path = str(tmp_path / "replies.json")
+    cache = ReplyCache(max_entries=2, ttl_seconds=60, path=path, enabled=True)
+    cache.put("a", "old")
+    clock[0] += 30
+    cache.put("b", "newer")
+    cache.put("c", "newest")  # Evicts "a"
+    cache.save()
+
+    restored = ReplyCache(max_entries=10, ttl_seconds=60, path=path, enabled=True)
+    assert (restored.get("a"), restored.get("b"), restored.get("c")) == (None, "newer", "newest")
+    clock[0] += 61
+    assert restored.get("b") is None and restored.get("c") is None
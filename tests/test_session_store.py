@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import server, session_store as session_store_module
+from Server.session_store import SessionStore
+
+
+def test_history_is_a_bounded_ring_buffer():
+    store = SessionStore(max_turns=3)
+    for i in range(5):
+        store.append("s", "user", f"m{i}")
+    assert store.history("s") == [{"sender": "user", "text": f"m{i}"} for i in (2, 3, 4)]
+    # Byte accounting follows the turns that fell off
+    assert store.stats()["bytes"] == sum(len("user") + len(f"m{i}") + 100 for i in (2, 3, 4))
+
+
+def test_idle_sessions_expire(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(session_store_module.time, "monotonic", lambda: clock[0])
+    store = SessionStore(ttl_seconds=10)
+    store.append("s", "user", "hi")
+    clock[0] += 11
+    assert store.history("s") == [] and store.stats() == {"sessions": 0, "bytes": 0, "evictions": 0}
+
+
+def test_least_recently_used_sessions_are_evicted_past_the_caps():
+    store = SessionStore(max_sessions=2)
+    for session_id in ("a", "b"):
+        store.append(session_id, "user", "hi")
+    store.history("a")  # "b" is now the least recently used
+    store.append("c", "user", "hi")
+    assert store.history("b") == [] and store.history("a") and store.history("c")
+
+    small = SessionStore(max_bytes=300)
+    small.append("a", "user", "x" * 100)
+    small.append("b", "user", "x" * 100)
+    assert small.history("a") == [] and small.stats()["bytes"] <= 300 and small.evictions == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "session_store", SessionStore())
+    return TestClient(server.app)
+
+
+def test_chat_keeps_the_history_for_session_clients(client, monkeypatch):
+    seen = []
+
+    async def ask_chatbot(message, driver_type, history):
+        seen.append(list(history))
+        return f"reply to {message}"
+
+    monkeypatch.setattr(server, "ask_chatbot", ask_chatbot)
+    for message in ("one", "two"):
+        assert client.post("/chat", json={"message": message, "driver_type": "ride", "session_id": "s1"}).status_code == 200
+    assert seen == [[], [{"sender": "user", "text": "one"}, {"sender": "bot", "text": "reply to one"}]]
+
+    assert client.delete("/chat/session/s1").status_code == 200
+    assert server.session_store.history("s1") == []
@@ -0,0 +1,76 @@
+import copy
+import sqlite3
+
+import pytest
+
+from Server import knowledge_base
+from Server.ingest import FeedIngestor
+from Server.knowledge_base import (
+    KNOWLEDGE_BASE, RIDE_COLUMN_RANKINGS, RIDE_COLUMNS, create_stores, get_suggested_orders, get_suggested_rides,
+)
+from Server.sqlite_store import SQLiteDatabase, SQLiteRecordStore
+
+NOW = 1_000_000.0
+
+
+def sqlite_ingestor(path):
+    orders, rides = copy.deepcopy(KNOWLEDGE_BASE["orders"]), copy.deepcopy(KNOWLEDGE_BASE["ride_requests"])
+    order_store, ride_store = create_stores(orders, rides, "sqlite", database=SQLiteDatabase(path))
+    return FeedIngestor({"order": order_store, "ride": ride_store}, default_ttl_seconds=60)
+
+
+def new_order(order_id, **fields):
+    return {"order_id": order_id, "pickup_location": "A", "delivery_location": "B", "reward": 9,
+            "time_estimate": 10, "traffic_condition": "light", "priority": "high", **fields}
+
+
+def test_deadlines_are_stored_and_expired_with_one_delete(tmp_path):
+    ingestor = sqlite_ingestor(str(tmp_path / "kb.db"))
+    store = ingestor.stores["order"]
+    seeded = len(store)
+    ingestor.ingest([new_order(90, ttl_seconds=10), new_order(91), new_order(92, ttl_seconds=0)], now=NOW)
+    assert ingestor.pending() == 2
+    # Refreshing a record moves its deadline; making it permanent clears it
+    ingestor.ingest([{"order_id": 90, "ttl_seconds": 100}, {"order_id": 91, "ttl_seconds": 0}], now=NOW + 5)
+    assert ingestor.expire(NOW + 61) == 0
+    assert ingestor.expire(NOW + 106) == 1
+    assert store.get(90) is None and store.get(91) is not None and store.get(92) is not None
+    assert len(store) == seeded + 2 and ingestor.pending() == 0
+    assert not ingestor._heap
+
+
+def test_deadlines_survive_a_restart_and_are_shared(tmp_path):
+    path = str(tmp_path / "kb.db")
+    first = sqlite_ingestor(path)
+    first.ingest([new_order(90, ttl_seconds=10)], now=NOW)
+    # Another worker, or the same one after a restart: no heap, same database
+    second = sqlite_ingestor(path)
+    assert second.pending() == 1
+    assert second.expire(NOW + 11) == 1
+    assert first.stores["order"].get(90) is None and first.pending() == 0
+
+
+def test_existing_tables_get_the_expires_at_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE ride_requests (seq INTEGER PRIMARY KEY AUTOINCREMENT, id UNIQUE NOT NULL, "
+                 "data TEXT NOT NULL, estimated_fare REAL, time_estimate REAL, passenger_rating REAL)")
+    conn.execute("INSERT INTO ride_requests (id, data, estimated_fare, time_estimate, passenger_rating) "
+                 "VALUES (1, '{\"ride_id\": 1}', 10, 5, 4.5)")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteRecordStore(SQLiteDatabase(path), "ride_requests", "ride_id", RIDE_COLUMNS, RIDE_COLUMN_RANKINGS)
+    assert store.get(1) == {"ride_id": 1} and store.expiring() == 0
+    store.upsert({"ride_id": 2, "estimated_fare": 12, "time_estimate": 6, "passenger_rating": 4.8}, expires_at=NOW)
+    assert store.expire(NOW) == 1 and len(store) == 1
+
+
+@pytest.mark.parametrize("backend", ["indexed", "columnar", "sqlite"])
+def test_suggestions_from_empty_stores(monkeypatch, tmp_path, backend):
+    database = SQLiteDatabase(str(tmp_path / "empty.db")) if backend == "sqlite" else None
+    order_store, ride_store = create_stores([], [], backend, database=database)
+    monkeypatch.setattr(knowledge_base, "order_store", order_store)
+    monkeypatch.setattr(knowledge_base, "ride_store", ride_store)
+    assert get_suggested_orders("reward") == "No orders available right now."
+    assert get_suggested_rides("fare") == "No ride requests available right now."
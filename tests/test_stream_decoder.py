@@ -0,0 +1,31 @@
+import numpy as np
+
+from Server.audio_processing import SAMPLE_RATE, StreamDecoder
+
+
+def test_pcm16_samples_split_across_frames_are_kept():
+    samples = (np.arange(-500, 500, dtype=np.int16) * 37).astype("<i2")
+    data = samples.tobytes()
+    decoder = StreamDecoder("pcm16", SAMPLE_RATE)
+    # Odd-sized frames cut samples in half
+    decoded = [decoder.decode(data[start:start + 333]) for start in range(0, len(data), 333)]
+    np.testing.assert_array_equal(np.concatenate(decoded), samples.astype(np.float32) / 32768.0)
+
+
+def test_pcm16_single_byte_frames():
+    samples = np.array([1, -2, 300, -32768, 32767], dtype="<i2")
+    decoder = StreamDecoder("pcm16", SAMPLE_RATE)
+    decoded = [decoder.decode(bytes([byte])) for byte in samples.tobytes()]
+    assert [chunk.size for chunk in decoded] == [0, 1] * 5
+    np.testing.assert_array_equal(np.concatenate(decoded), samples.astype(np.float32) / 32768.0)
+
+
+def test_pcm16_resampled_stream_feeds_every_sample():
+    rate = 8000
+    samples = (np.sin(np.arange(rate) / 5) * 10000).astype("<i2")
+    data = samples.tobytes()
+    decoder = StreamDecoder("pcm16", rate)
+    for start in range(0, len(data), 501):
+        decoder.decode(data[start:start + 501])
+    # Every input sample reached the resampler, none was dropped at a frame edge
+    assert decoder._pts == samples.size
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import server, streaming
+from Server.audio_processing import SAMPLE_RATE
+from Server.streaming import StreamingSession, find_quiet_cut
+
+FRAME_SAMPLES = SAMPLE_RATE // 50  # 20 ms frames, as a client would send them
+GAP_AT = int(1.5 * SAMPLE_RATE)
+
+
+class FakePool:
+    """
+    Stands in for the Whisper pool: the "transcript" of a buffer is its sample count.
+    """
+
+    def __init__(self):
+        self.decoded = []
+
+    async def transcribe(self, samples, language=None, denoise="off", **kwargs):
+        self.decoded.append(samples.size)
+        return {"text": f"[{samples.size}]", "timings": {}, "worker_seconds": 0.0}
+
+
+def speech_with_gap(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    samples = 0.3 * np.sin(2 * np.pi * 220 * t)
+    samples[GAP_AT - 400:GAP_AT + 400] = 0  # The only pause, inside the commit search range
+    return (samples * 32767).astype("<i2")
+
+
+@pytest.fixture(autouse=True)
+def short_windows(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_STEP_SECONDS", 0.5)
+    monkeypatch.setattr(streaming, "STREAM_WINDOW_SECONDS", 2.0)
+
+
+def test_quiet_cut_lands_in_the_pause():
+    samples = speech_with_gap(2.0).astype(np.float32) / 32768
+    cut = find_quiet_cut(samples, SAMPLE_RATE)
+    assert abs(cut - GAP_AT) <= FRAME_SAMPLES
+    assert find_quiet_cut(samples[:10], SAMPLE_RATE) == 10
+
+
+def test_partials_commit_at_the_pause_and_the_final_covers_all_audio():
+    pool, sent = FakePool(), []
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        session = StreamingSession(pool, send, denoise="off")
+        data = speech_with_gap(3.0).tobytes()
+        for start in range(0, len(data), FRAME_SAMPLES * 2):
+            session.feed(data[start:start + FRAME_SAMPLES * 2])
+            await asyncio.sleep(0)
+        return session, await session.finish()
+
+    session, final = asyncio.run(main())
+    partials = [message["text"] for message in sent]
+    assert partials and all(message["type"] == "partial" for message in sent)
+    # Partials re-decode the growing window until it passes 2 s, then the audio up to the pause is committed
+    first_commit = int(session.committed[0][1:-1])
+    assert abs(first_commit - GAP_AT) <= FRAME_SAMPLES
+    assert max(size for size in pool.decoded) <= 2.5 * SAMPLE_RATE
+    assert any(text.startswith(session.committed[0] + " ") for text in partials)
+    # The final text is every committed piece in order, and together they cover every sample once
+    assert final == {"type": "final", "text": " ".join(session.committed)}
+    assert sum(int(piece[1:-1]) for piece in session.committed) == 3 * SAMPLE_RATE
+
+
+def test_a_short_tail_is_not_decoded_on_its_own():
+    pool = FakePool()
+
+    async def main():
+        session = StreamingSession(pool, lambda message: asyncio.sleep(0), denoise="off")
+        session.feed(speech_with_gap(0.05).tobytes())
+        return await session.finish()
+
+    assert asyncio.run(main()) == {"type": "final", "text": ""}
+    assert pool.decoded == []
+
+
+def test_websocket_round_trip(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(server.transcription_pool, "transcribe", pool.transcribe)
+    data = speech_with_gap(1.2).tobytes()
+
+    with TestClient(server.app).websocket_connect("/transcribe/stream?denoise=off") as websocket:
+        for start in range(0, len(data), FRAME_SAMPLES * 2):
+            websocket.send_bytes(data[start:start + FRAME_SAMPLES * 2])
+        websocket.send_text(json.dumps({"event": "end"}))
+        messages = []
+        while not messages or messages[-1]["type"] != "final":
+            messages.append(websocket.receive_json())
+
+    assert {message["type"] for message in messages[:-1]} <= {"partial"}
+    assert messages[-1] == {"type": "final", "text": f"[{int(1.2 * SAMPLE_RATE)}]"}
+
+
+def test_websocket_rejects_an_unknown_denoise_mode():
+    with TestClient(server.app).websocket_connect("/transcribe/stream?denoise=loud") as websocket:
+        assert websocket.receive_json()["type"] == "error"
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import server
+from Server.audio_processing import InvalidAudioError, decode_audio
+from Server.transcriber import _run_batch
+
+GARBAGE = b"this is not an audio file" * 20
+
+
+def test_decode_audio_rejects_garbage():
+    with pytest.raises(InvalidAudioError, match="Could not decode"):
+        decode_audio(GARBAGE)
+
+
+def test_run_batch_flags_undecodable_jobs():
+    options = {"language": None, "denoise": "off", "vad": False, "cascade": False}
+    (output,) = _run_batch([(GARBAGE, options)])
+    assert output["invalid_audio"] is True
+    assert "Could not decode" in output["error"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def transcribe(data, *args, **kwargs):
+        # What the pool raises for a job whose upload failed to decode in the worker
+        decode_audio(data)
+
+    monkeypatch.setattr(server.transcription_pool, "transcribe", transcribe)
+    # No startup events: the Whisper workers are never spawned
+    return TestClient(server.app)
+
+
+def test_transcribe_returns_400_for_undecodable_upload(client):
+    response = client.post("/transcribe", files={"file": ("clip.wav", GARBAGE, "audio/wav")})
+    assert response.status_code == 400
+    assert "Could not decode" in response.json()["error"]
+
+
+def test_voice_chat_returns_400_for_undecodable_upload(client):
+    response = client.post("/voice-chat", files={"file": ("clip.wav", GARBAGE + b"!", "audio/wav")},
+                           data={"driver_type": "delivery"})
+    assert response.status_code == 400
+    assert "Could not decode" in response.json()["error"]
+
+
+def test_pool_raises_invalid_audio_error():
+    pool = server.TranscriptionPool(workers=1)
+    loop = asyncio.new_event_loop()
+    try:
+        future = loop.create_future()
+        done = loop.create_future()
+        done.set_result([{"error": "Could not decode the uploaded audio: bad", "invalid_audio": True}])
+        pool._worker_slots = asyncio.Semaphore(0)
+        pool._finish_batch([(GARBAGE, {}, future)], None, done)
+        with pytest.raises(InvalidAudioError):
+            future.result()
+    finally:
+        loop.close()
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from Server.transcription_cache import TranscriptionCache, make_transcription_key
+
+
+def result(text="hello"):
+    return {"text": text, "tier": "base", "language": "en"}
+
+
+def test_key_covers_the_bytes_and_every_setting():
+    base = make_transcription_key(b"clip", "en", "fast", True, False, ("base", ""))
+    assert base == make_transcription_key(b"clip", "en", "fast", True, False, ("base", ""))
+    variants = [
+        make_transcription_key(b"clip2", "en", "fast", True, False, ("base", "")),
+        make_transcription_key(b"clip", None, "fast", True, False, ("base", "")),
+        make_transcription_key(b"clip", "en", "off", True, False, ("base", "")),
+        make_transcription_key(b"clip", "en", "fast", False, False, ("base", "")),
+        make_transcription_key(b"clip", "en", "fast", True, True, ("base", "tiny")),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+
+def test_identical_uploads_share_one_inference_and_later_ones_hit():
+    cache = TranscriptionCache(max_bytes=10_000)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return result()
+
+    async def main():
+        together = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(4)))
+        return together, await cache.get_or_compute("k", compute)
+
+    together, later = asyncio.run(main())
+    assert calls == [1] and all(r == result() for r in together) and later == result()
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"], stats["in_flight"]) == (1, 3, 1, 0)
+
+
+def test_first_caller_leaving_does_not_cancel_the_others():
+    cache = TranscriptionCache(max_bytes=10_000)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return result()
+
+    async def main():
+        first = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == result()
+    assert cache.get("k") == result()
+
+
+def test_failures_are_not_cached():
+    cache = TranscriptionCache(max_bytes=10_000)
+
+    async def fail():
+        raise ValueError("bad audio")
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_compute("k", fail))
+    assert cache.get("k") is None and cache.stats()["in_flight"] == 0
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = TranscriptionCache(max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put(key, result("x" * 30))
+    cache.get("a")  # Now most recently used
+    cache.put("d", result("x" * 30))
+    assert cache.bytes <= cache.max_bytes and cache.evictions >= 1
+    assert cache.get("a") is not None and cache.get("b") is None
+    # An entry bigger than the whole budget is never stored
+    cache.put("huge", result("x" * 1000))
+    assert cache.get("huge") is None
+
+
+def test_disabled_cache_always_computes():
+    cache = TranscriptionCache(enabled=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return result()
+
+    async def main():
+        for _ in range(2):
+            await cache.get_or_compute("k", compute)
+
+    asyncio.run(main())
+    assert calls == [1, 1] and cache.get("k") is None
@@ -0,0 +1,177 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from Server import transcriber
+from Server.transcriber import TranscriptionError, TranscriptionPool, TranscriptionQueueFull
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """
+    Replaces the worker processes with a thread running a fake _run_batch
+    that records the size of every batch it gets.
+    """
+    sizes = []
+    release = threading.Event()
+    release.set()
+
+    def run_batch(jobs):
+        release.wait(5)
+        sizes.append(len(jobs))
+        return [
+            {"error": "boom"} if isinstance(data, bytes) and data == b"bad" else
+            {"text": f"clip {len(data)}", "timings": {}, "worker_seconds": 0.0}
+            for data, _ in jobs
+        ]
+
+    monkeypatch.setattr(transcriber, "_run_batch", run_batch)
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(TranscriptionPool, "_get_executor", lambda self: executor)
+    yield sizes, release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def test_close_requests_share_one_batch(batches):
+    sizes, _ = batches
+
+    async def main():
+        pool = TranscriptionPool(workers=1, max_batch=8, max_wait_ms=50)
+        clips = [np.zeros(n, dtype=np.float32) for n in (1, 2, 3)]
+        results = await asyncio.gather(*(pool.transcribe(clip, denoise="off") for clip in clips))
+        pool.shutdown()
+        return results
+
+    results = asyncio.run(main())
+    assert [result["text"] for result in results] == ["clip 1", "clip 2", "clip 3"]
+    assert sizes == [3]
+
+
+def test_batches_are_capped_at_max_batch(batches):
+    sizes, _ = batches
+
+    async def main():
+        pool = TranscriptionPool(workers=1, max_batch=2, max_wait_ms=50, queue_size=8)
+        await asyncio.gather(*(pool.transcribe(np.zeros(1, dtype=np.float32)) for _ in range(5)))
+        pool.shutdown()
+
+    asyncio.run(main())
+    assert sum(sizes) == 5
+    assert max(sizes) == 2
+
+
+def test_full_queue_rejects_without_waiting(batches):
+    _, release = batches
+    release.clear()
+
+    async def main():
+        pool = TranscriptionPool(workers=1, queue_size=1, max_wait_ms=0)
+        assert pool.max_pending == 2
+        running = [asyncio.ensure_future(pool.transcribe(np.zeros(1, dtype=np.float32))) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.is_full()
+        with pytest.raises(TranscriptionQueueFull):
+            await pool.transcribe(np.zeros(1, dtype=np.float32))
+        release.set()
+        await asyncio.gather(*running)
+        # Capacity comes back once the jobs are done
+        assert pool.pending == 0 and not pool.is_full()
+        pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_failed_job_does_not_fail_its_batch(batches):
+    async def main():
+        pool = TranscriptionPool(workers=1, max_wait_ms=50)
+        good, bad = await asyncio.gather(
+            pool.transcribe(np.zeros(4, dtype=np.float32)), pool.transcribe(b"bad"), return_exceptions=True
+        )
+        pool.shutdown()
+        return good, bad
+
+    good, bad = asyncio.run(main())
+    assert good["text"] == "clip 4"
+    assert isinstance(bad, TranscriptionError)
+
+
+def test_event_loop_keeps_running_while_a_batch_is_in_a_worker(batches):
+    sizes, release = batches
+    release.clear()
+
+    async def main():
+        pool = TranscriptionPool(workers=1, max_batch=1, max_wait_ms=0, queue_size=8)
+        jobs = [asyncio.ensure_future(pool.transcribe(np.zeros(n, dtype=np.float32))) for n in (1, 2)]
+        ticks = 0
+        while ticks < 20:
+            await asyncio.sleep(0.001)
+            ticks += 1
+        # The loop kept ticking while the worker was stuck on the first batch
+        blocked = (sizes == [], not any(job.done() for job in jobs))
+        release.set()
+        results = await asyncio.gather(*jobs)
+        pool.shutdown()
+        return blocked, results
+
+    blocked, results = asyncio.run(main())
+    assert blocked == (True, True)
+    assert [result["text"] for result in results] == ["clip 1", "clip 2"] and sizes == [1, 1]
+
+
+def crash_or_echo(jobs):
+    # Runs in a real worker process; b"crash" kills it like a segfault in Whisper would
+    if any(isinstance(data, bytes) and data == b"crash" for data, _ in jobs):
+        os._exit(1)
+    return [{"text": f"clip {len(data)}", "timings": {}, "worker_seconds": 0.0} for data, _ in jobs]
+
+
+@pytest.fixture
+def process_workers(monkeypatch):
+    """
+    Real worker processes (without Whisper) running crash_or_echo.
+    """
+    def get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    monkeypatch.setattr(transcriber, "_run_batch", crash_or_echo)
+    monkeypatch.setattr(TranscriptionPool, "_get_executor", get_executor)
+
+
+def test_requests_still_finish_after_a_worker_dies(process_workers):
+    async def main():
+        pool = TranscriptionPool(workers=1, max_wait_ms=0)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await pool.transcribe(b"crash")
+            return await asyncio.wait_for(pool.transcribe(np.zeros(3, dtype=np.float32)), 60)
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main())["text"] == "clip 3"
+
+
+def test_batcher_survives_a_pool_that_refuses_jobs(process_workers):
+    async def main():
+        pool = TranscriptionPool(workers=1, max_wait_ms=0)
+        # Already broken when the batch is submitted, so submit itself raises
+        broken = pool._get_executor()
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(crash_or_echo, [(b"crash", {})]).result(60)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.wait_for(pool.transcribe(np.zeros(1, dtype=np.float32)), 60)
+            assert pool._executor is not broken
+            return await asyncio.wait_for(pool.transcribe(np.zeros(2, dtype=np.float32)), 60)
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main())["text"] == "clip 2"
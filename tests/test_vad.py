@@ -0,0 +1,40 @@
+import numpy as np
+
+from Server.vad import MAX_CHUNK_SECONDS, detect_speech, speech_chunks
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 300 * t)).astype(np.float32)
+
+
+def silence(seconds, level=1e-4, seed=0):
+    return (level * np.random.default_rng(seed).standard_normal(int(seconds * RATE))).astype(np.float32)
+
+
+def test_leading_and_trailing_silence_is_trimmed_with_padding():
+    samples = np.concatenate([silence(2), tone(1), silence(2, seed=1)])
+    regions = detect_speech(samples)
+    assert len(regions) == 1
+    start, end = regions[0]
+    # The tone spans 2 s..3 s; about 200 ms of padding is kept on each side
+    assert 1.7 * RATE <= start <= 2 * RATE and 3 * RATE <= end <= 3.3 * RATE
+
+
+def test_silence_and_clicks_are_not_speech():
+    assert detect_speech(silence(3)) == [] and speech_chunks(silence(3)) == []
+    click = np.concatenate([silence(1), tone(0.03, amplitude=0.9), silence(1, seed=1)])
+    assert detect_speech(click) == []
+    assert speech_chunks(np.zeros(100, dtype=np.float32)) == []
+
+
+def test_regions_are_packed_into_whisper_sized_chunks():
+    words = [np.concatenate([tone(8), silence(3, seed=i)]) for i in range(6)]
+    samples = np.concatenate([silence(1)] + words)
+    chunks = speech_chunks(samples)
+    assert len(chunks) > 1
+    assert all(chunk.size <= MAX_CHUNK_SECONDS * RATE for chunk in chunks)
+    # Only speech (plus padding) is kept, not the pauses between the words
+    assert sum(chunk.size for chunk in chunks) < samples.size * 0.85
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import server
+from Server.knowledge_base import get_conversation_guideline
+from Server.session_store import SessionStore
+from Server.transcription_cache import TranscriptionCache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    transcripts = {b"hi": "show me rides", b"silence": "  "}
+    calls = []
+
+    async def transcribe(data, *args, **kwargs):
+        calls.append(data)
+        return {"text": transcripts[data], "tier": "base", "language": "en", "language_probability": 0.99,
+                "audio_seconds": 1.0, "decoded_seconds": 0.5}
+
+    async def answer_chatbot(message, driver_type, history):
+        return f"{driver_type}: {message} ({len(history)} turns before)", "rule"
+
+    monkeypatch.setattr(server.transcription_pool, "transcribe", transcribe)
+    monkeypatch.setattr(server, "transcription_cache", TranscriptionCache(enabled=False))
+    monkeypatch.setattr(server, "session_store", SessionStore())
+    monkeypatch.setattr(server, "answer_chatbot", answer_chatbot)
+    test_client = TestClient(server.app)
+    test_client.calls = calls
+    return test_client
+
+
+def post(client, audio, params=None, **fields):
+    return client.post("/voice-chat", params=params, files={"file": ("clip.wav", audio, "audio/wav")}, data=fields)
+
+
+def test_transcribes_and_answers_in_one_request(client):
+    body = post(client, b"hi", driver_type="ride", session_id="s1").json()
+    assert body["transcription"] == "show me rides" and body["tier"] == "base"
+    assert (body["reply"], body["source"]) == ("ride: show me rides (0 turns before)", "rule")
+    # The transcript and reply became a session turn, so the next request sees them
+    assert post(client, b"hi", driver_type="ride", session_id="s1").json()["reply"].endswith("(2 turns before)")
+
+
+def test_silence_asks_again_without_the_chatbot(client):
+    body = post(client, b"silence", driver_type="ride", session_id="s1").json()
+    assert (body["reply"], body["source"]) == (get_conversation_guideline("error"), "no_speech")
+    assert server.session_store.history("s1") == []
+
+
+def test_invalid_chat_fields_are_rejected_before_transcribing(client):
+    response = post(client, b"hi", driver_type="ride", chat_history="not json")
+    assert response.status_code == 422 and client.calls == []
+    response = post(client, b"hi", driver_type="ride", chat_history=json.dumps([{"sender": "user", "text": "x"}] * 1000))
+    assert response.status_code == 422 and client.calls == []
+
+
+def test_stream_sends_the_transcript_first(client, monkeypatch):
+    async def stream_chatbot(message, driver_type, history):
+        yield {"type": "chunk", "text": "Here are rides."}
+        yield {"type": "done", "reply": "Here are rides.", "source": "rule"}
+
+    monkeypatch.setattr(server, "stream_chatbot", stream_chatbot)
+    response = post(client, b"hi", params={"stream": "true"}, driver_type="ride")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: transcript", "event: chunk", "event: done"]
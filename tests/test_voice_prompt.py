@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Server import knowledge_base, transcriber
+from Server.transcriber import TranscriptionPool, _run_batch
+
+NEW_ORDER = {
+    "order_id": 4242, "pickup_location": "Komtar", "delivery_location": "Gurney Plaza", "reward": 9,
+    "time_estimate": 11, "traffic_condition": "light", "priority": "high", "score": 0,
+}
+
+
+def test_jobs_carry_the_current_prompt(monkeypatch):
+    jobs_seen = []
+
+    def run_batch(jobs):
+        jobs_seen.extend(jobs)
+        return [{"text": "", "timings": {}, "worker_seconds": 0.0} for _ in jobs]
+
+    monkeypatch.setattr(transcriber, "_run_batch", run_batch)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(TranscriptionPool, "_get_executor", lambda self: executor)
+    # Keep the new order within the IDs the prompt lists
+    monkeypatch.setattr(knowledge_base, "MAX_PROMPT_IDS", 1000)
+
+    async def main():
+        pool = TranscriptionPool(workers=1, max_wait_ms=0, cascade=True)
+        await pool.transcribe(np.zeros(1, dtype=np.float32))
+        knowledge_base.order_store.upsert(dict(NEW_ORDER))
+        try:
+            await pool.transcribe(np.zeros(1, dtype=np.float32))
+            await pool.transcribe(np.zeros(1, dtype=np.float32), cascade=False)
+        finally:
+            knowledge_base.order_store.remove(NEW_ORDER["order_id"])
+            pool.shutdown()
+
+    asyncio.run(main())
+    executor.shutdown()
+    prompts = [options.get("prompt") for _, options in jobs_seen]
+    assert "4242" not in prompts[0]
+    assert "4242" in prompts[1]
+    # Only the draft model uses a prompt
+    assert prompts[2] is None
+
+
+def test_worker_decodes_with_the_prompt_of_each_job(monkeypatch):
+    calls = []
+
+    def transcribe_batch(audios, languages, cascades, prompts=None):
+        calls.append(prompts)
+        return [{"text": "ok", "language": "en", "language_probability": None, "avg_logprob": None,
+                 "tier": "tiny"} for _ in audios]
+
+    monkeypatch.setattr(transcriber, "_transcribe_batch", transcribe_batch)
+    audio = np.zeros(1600, dtype=np.float32)
+    options = {"language": "en", "denoise": "off", "vad": False, "cascade": True}
+    _run_batch([(audio, {**options, "prompt": "Order 1."}), (audio, {**options, "prompt": "Order 2."})])
+    assert calls == [["Order 1.", "Order 2."]]
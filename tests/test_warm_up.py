@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Server import intent_classifier, server
+
+restarts = []
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(server, "startup_state", {"status": "warming_up", "import_seconds": 0.1})
+    monkeypatch.setattr(server, "WHISPER_WARMUP", True)
+    monkeypatch.setattr(server, "WARMUP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(server, "get_intent_classifier", lambda: None)
+    monkeypatch.setattr(server.transcription_pool, "restart_workers", lambda: restarts.append(1))
+    restarts.clear()
+
+
+def test_failed_warm_up_is_retried_until_ready(fresh_state, monkeypatch):
+    states = []
+    client = TestClient(server.app)
+
+    async def warm_up_pool():
+        states.append(server.startup_state.copy())
+        if len(states) < 3:
+            raise RuntimeError("worker died")
+        return {"workers": 1}
+
+    monkeypatch.setattr(server.transcription_pool, "warm_up", warm_up_pool)
+    asyncio.run(server.warm_up())
+
+    assert len(states) == 3 and len(restarts) == 2
+    # Between attempts it is still warming up, with the reason
+    assert states[2]["status"] == "warming_up" and states[2]["error"] == "worker died"
+    assert client.get("/readyz").status_code == 200
+    assert server.startup_state["status"] == "ready" and "error" not in server.startup_state
+    assert server.startup_state["attempts"] == 2
+
+
+def test_readyz_reports_the_last_error_while_retrying(fresh_state, monkeypatch):
+    async def warm_up_pool():
+        raise RuntimeError("model download failed")
+
+    monkeypatch.setattr(server.transcription_pool, "warm_up", warm_up_pool)
+    client = TestClient(server.app)
+
+    async def main():
+        task = asyncio.ensure_future(server.warm_up())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(main())
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    body = response.json()
+    assert body["status"] == "warming_up" and body["error"] == "model download failed"
+    assert body["attempts"] >= 2
+
+
+def test_classifier_failure_does_not_restart_warm_workers(fresh_state, monkeypatch):
+    pool_warm_ups, classifier_calls = [], []
+
+    async def warm_up_pool():
+        pool_warm_ups.append(1)
+        return {"workers": 1}
+
+    def build_classifier():
+        classifier_calls.append(1)
+        if len(classifier_calls) == 1:
+            raise OSError("corpus missing")
+
+    monkeypatch.setattr(server.transcription_pool, "warm_up", warm_up_pool)
+    monkeypatch.setattr(server, "get_intent_classifier", build_classifier)
+    asyncio.run(server.warm_up())
+    assert pool_warm_ups == [1] and classifier_calls == [1, 1] and restarts == []
+    assert server.startup_state["status"] == "ready"
+
+
+@pytest.fixture
+def untrained_classifier(monkeypatch):
+    builds = []
+
+    class SlowClassifier:
+        def __init__(self, corpus):
+            builds.append(threading.current_thread().name)
+            time.sleep(0.1)
+
+    monkeypatch.setattr(intent_classifier, "_intent_classifier", None)
+    monkeypatch.setattr(intent_classifier, "IntentClassifier", SlowClassifier)
+    monkeypatch.setattr(intent_classifier, "INTENT_CLASSIFIER_ENABLED", True)
+    return builds
+
+
+def test_classifier_trains_once_under_concurrent_calls(untrained_classifier):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(intent_classifier.get_intent_classifier()))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(untrained_classifier) == 1
+    assert len({id(result) for result in results}) == 1 and results[0] is not None
+
+
+def test_request_path_never_waits_for_training(untrained_classifier):
+    start = time.perf_counter()
+    assert intent_classifier.get_intent_classifier(wait=False) is None
+    assert intent_classifier.get_intent_classifier(wait=False) is None
+    assert time.perf_counter() - start < 0.05
+    # Training went to a background thread, once; later calls get the classifier
+    assert intent_classifier.get_intent_classifier() is not None
+    assert untrained_classifier == ["intent-classifier"]